@@ -0,0 +1,205 @@
+"""
+Priority-aware admission control for the API's workloads
+
+Requests fall into workload classes with very different costs: a summary
+takes milliseconds, subjective generation takes minutes. Each class has its
+own concurrency limit and bounded queue, so quick calls never wait behind
+heavy ones and heavy generation only saturates its own slots:
+
+    result = await admission.run("summarize", function, *args, cancel_token=token)
+
+The classes also share ADMISSION_TOTAL_SLOTS. By default that is the sum of
+the class limits, so classes never compete. When it is set lower, a freed
+slot goes to the oldest request of the highest-priority class that is still
+under its own limit.
+
+Environment variables:
+    ADMISSION_CONCURRENCY: Per-class limit overrides, e.g.
+        "subjective=2,summarize=16"
+    ADMISSION_QUEUE: Per-class queue length overrides in the same format.
+        Requests that find their class's queue full are rejected (503)
+    ADMISSION_TOTAL_SLOTS: Slots shared by all classes (default: the sum of
+        the class limits)
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from cancellation import CancellationToken, check_cancelled
+
+# How often queued requests check whether they have been cancelled
+CANCEL_POLL_SECONDS = 0.5
+
+ADMISSION_WAIT_SECONDS = metrics.histogram(
+    "study_admission_wait_seconds", "Time requests spent queued for admission", ["workload"]
+)
+ADMISSION_REQUESTS = metrics.counter(
+    "study_admission_requests_total", "Admission decisions by workload class", ["workload", "result"]
+)
+ADMISSION_RUNNING = metrics.gauge(
+    "study_admission_running", "Computations running in each workload class", ["workload"]
+)
+
+
+class AdmissionRejected(Exception):
+    """The workload class's queue is full"""
+
+
+class WorkloadClass:
+    def __init__(self, name: str, priority: int, concurrency: int, queue_limit: int) -> None:
+        """
+        Args:
+            name: Class name, used in the metrics
+            priority: Lower values are admitted first when the shared slots
+                are contended
+            concurrency: Computations of this class that may run at once
+            queue_limit: Requests that may wait for a slot
+        """
+        self.name = name
+        self.priority = priority
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.running = 0
+        self.waiting = deque()  # futures resolved when admitted, oldest first
+        self.wait_seconds = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        admitted = ADMISSION_REQUESTS.value(workload=self.name, result="admitted")
+        return {
+            "priority": self.priority,
+            "concurrency": self.concurrency,
+            "queue_limit": self.queue_limit,
+            "running": self.running,
+            "queued": len(self.waiting),
+            "admitted": admitted,
+            "rejected": ADMISSION_REQUESTS.value(workload=self.name, result="rejected"),
+            "mean_wait_seconds": round(self.wait_seconds / admitted, 4) if admitted else 0.0,
+        }
+
+
+# name, priority, concurrency, queue limit
+DEFAULT_WORKLOADS = [
+    ("summarize", 0, 8, 64),
+    ("transcribe-doc", 1, 4, 32),
+    ("transcribe-image", 2, 2, 16),
+    ("objective", 3, 1, 16),
+    ("subjective", 4, 1, 16),
+]
+
+
+class AdmissionController:
+    def __init__(self, workloads: List[WorkloadClass], total_slots: Optional[int] = None) -> None:
+        """
+        Args:
+            workloads: The workload classes
+            total_slots: Computations of all classes that may run at once
+                (None: the sum of the class limits)
+        """
+        self.workloads = {workload.name: workload for workload in workloads}
+        self.total_slots = total_slots or sum(workload.concurrency for workload in workloads)
+        self.running = 0
+        for workload in workloads:
+            metrics.QUEUE_DEPTH.set_function(lambda w=workload: len(w.waiting), queue=f"admission_{workload.name}")
+            ADMISSION_RUNNING.set_function(lambda w=workload: w.running, workload=workload.name)
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        concurrency = _parse_overrides(os.environ.get("ADMISSION_CONCURRENCY", ""))
+        queue_limits = _parse_overrides(os.environ.get("ADMISSION_QUEUE", ""))
+        workloads = [
+            WorkloadClass(name, priority, max(1, concurrency.get(name, limit)), queue_limits.get(name, queue_limit))
+            for name, priority, limit, queue_limit in DEFAULT_WORKLOADS
+        ]
+        total_slots = int(os.environ.get("ADMISSION_TOTAL_SLOTS", "0")) or None
+        return cls(workloads, total_slots)
+
+    async def run(self, name: str, function: Callable[..., Any], *args: Any,
+                  cancel_token: Optional[CancellationToken] = None) -> Any:
+        """
+        Wait for a slot in the named workload class, then run function(*args)
+        in the threadpool
+
+        Raises:
+            AdmissionRejected: The class's queue is full
+            Cancelled: cancel_token was cancelled while queued
+        """
+        async with self.slot(name, cancel_token):
+            return await run_in_threadpool(function, *args)
+
+    @asynccontextmanager
+    async def slot(self, name: str, cancel_token: Optional[CancellationToken] = None):
+        """Hold a slot of the named workload class, e.g. for a streaming response"""
+        workload = self.workloads[name]
+        await self._acquire(workload, cancel_token)
+        try:
+            yield
+        finally:
+            self._release(workload)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total_slots": self.total_slots,
+            "running": self.running,
+            "workloads": {name: workload.stats() for name, workload in self.workloads.items()},
+        }
+
+    async def _acquire(self, workload: WorkloadClass, cancel_token: Optional[CancellationToken]) -> None:
+        start = time.perf_counter()
+        waiter = asyncio.get_event_loop().create_future()
+        workload.waiting.append(waiter)
+        self._dispatch()
+        if not waiter.done() and len(workload.waiting) > workload.queue_limit:
+            workload.waiting.remove(waiter)
+            ADMISSION_REQUESTS.inc(workload=workload.name, result="rejected")
+            raise AdmissionRejected(f"Too many queued {workload.name} requests, try again later")
+
+        try:
+            while not waiter.done():
+                await asyncio.wait({waiter}, timeout=CANCEL_POLL_SECONDS)
+                if not waiter.done():
+                    check_cancelled(cancel_token)
+        except BaseException:
+            if waiter.done():
+                self._release(workload)
+            else:
+                workload.waiting.remove(waiter)
+            raise
+
+        waited = time.perf_counter() - start
+        workload.wait_seconds += waited
+        ADMISSION_WAIT_SECONDS.observe(waited, workload=workload.name)
+        ADMISSION_REQUESTS.inc(workload=workload.name, result="admitted")
+
+    def _release(self, workload: WorkloadClass) -> None:
+        workload.running -= 1
+        self.running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Admit queued requests, highest priority first, while slots are free
+        by_priority = sorted(self.workloads.values(), key=lambda w: w.priority)
+        while self.running < self.total_slots:
+            workload = next((w for w in by_priority if w.waiting and w.running < w.concurrency), None)
+            if workload is None:
+                return
+            workload.running += 1
+            self.running += 1
+            workload.waiting.popleft().set_result(None)
+
+
+def _parse_overrides(spec: str) -> Dict[str, int]:
+    overrides = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip():
+            overrides[name.strip()] = int(value)
+    return overrides
+
+
+admission = AdmissionController.from_env()
@@ -0,0 +1,187 @@
+"""
+Fixed, deterministic benchmark corpora
+
+Every size is generated from the same seed, so two runs (or two machines)
+benchmark exactly the same text, PDF, PPTX and image inputs.
+"""
+import os
+import random
+from typing import Dict, List
+
+SIZES = {
+    # paragraphs per document, paragraphs per page/slide, images to OCR
+    "small": {"paragraphs": 2, "per_page": 2, "images": 1},
+    "medium": {"paragraphs": 12, "per_page": 3, "images": 2},
+    "large": {"paragraphs": 60, "per_page": 3, "images": 4},
+}
+
+BASE_PARAGRAPHS = [
+    "Photosynthesis is the process by which plants convert sunlight, carbon dioxide, and water into glucose and oxygen. "
+    "This process occurs in the chloroplasts of plant cells. Chloroplasts contain chlorophyll, which is the green pigment "
+    "that captures light energy. The light-dependent reactions occur in the thylakoids, while the light-independent "
+    "reactions (Calvin cycle) occur in the stroma.",
+    "The French Revolution began in 1789 and ended in 1799. It was a period of radical political and societal change in France. "
+    "The storming of the Bastille on 14 July 1789 became a symbol of the uprising. Napoleon Bonaparte rose to power "
+    "in the aftermath of the revolution and crowned himself Emperor in 1804.",
+    "Newton's first law states that an object remains at rest or in uniform motion unless acted upon by a force. "
+    "The second law relates force, mass and acceleration. The third law states that for every action there is an "
+    "equal and opposite reaction. Isaac Newton published these laws in 1687 in the Principia.",
+    "The mitochondrion is the site of cellular respiration in eukaryotic cells. Glucose is broken down in glycolysis, "
+    "the Krebs cycle and the electron transport chain to produce ATP. Mitochondria have their own DNA, which supports "
+    "the theory that they descended from free-living bacteria.",
+]
+
+SUBJECTS = ["The Roman Empire", "Marie Curie", "The Amazon River", "Alan Turing", "The Industrial Revolution",
+            "The Pacific Ocean", "Charles Darwin", "The Ming Dynasty", "Ada Lovelace", "The Silk Road",
+            "Albert Einstein", "The Nile Delta", "Gregor Mendel", "The Renaissance", "Dmitri Mendeleev"]
+VERBS = ["transformed", "described", "influenced", "connected", "challenged", "measured", "explained", "shaped"]
+OBJECTS = ["the structure of matter", "trade between distant regions", "the theory of evolution", "modern computing",
+           "the distribution of rainfall", "the periodic table", "European art and science", "agricultural practice",
+           "the laws of inheritance", "the study of radioactivity"]
+PLACES = ["Europe", "Asia", "South America", "Africa", "North America", "the Mediterranean"]
+
+
+def _synthetic_paragraph(rng: random.Random) -> str:
+    sentences = []
+    for _ in range(rng.randint(4, 7)):
+        year = rng.randint(1200, 1990)
+        sentences.append(
+            f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} in {rng.choice(PLACES)} around {year}."
+        )
+    return " ".join(sentences)
+
+
+def paragraphs(size: str, seed: int = 0) -> List[str]:
+    rng = random.Random(f"{seed}-{size}")
+    count = SIZES[size]["paragraphs"]
+    result = []
+    for i in range(count):
+        if i < len(BASE_PARAGRAPHS):
+            result.append(BASE_PARAGRAPHS[i])
+        else:
+            result.append(_synthetic_paragraph(rng))
+    return result
+
+
+def text(size: str) -> str:
+    return "\n".join(paragraphs(size))
+
+
+def pages(size: str) -> List[str]:
+    per_page = SIZES[size]["per_page"]
+    paras = paragraphs(size)
+    return ["\n".join(paras[i:i + per_page]) for i in range(0, len(paras), per_page)]
+
+
+def _wrap(text: str, width: int) -> List[str]:
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+        lines.append("")
+    return lines
+
+
+def _pdf_escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, page_texts: List[str]) -> str:
+    """Write a minimal text PDF (Helvetica, one page per entry) without extra dependencies"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for page_text in page_texts:
+        lines = _wrap(page_text, 90)
+        stream = "BT /F1 11 Tf 14 TL 50 790 Td " + " ".join(f"({_pdf_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode("latin-1")
+
+    with open(path, "wb") as f:
+        f.write(out)
+    return path
+
+
+def write_pptx(path: str, slide_texts: List[str]) -> str:
+    from pptx import Presentation
+    from pptx.util import Inches, Pt
+
+    prs = Presentation()
+    layout = prs.slide_layouts[6]  # blank
+    for slide_text in slide_texts:
+        slide = prs.slides.add_slide(layout)
+        box = slide.shapes.add_textbox(Inches(0.5), Inches(0.5), Inches(9), Inches(6.5))
+        frame = box.text_frame
+        frame.word_wrap = True
+        for i, paragraph in enumerate(slide_text.split("\n")):
+            p = frame.paragraphs[0] if i == 0 else frame.add_paragraph()
+            p.text = paragraph
+            p.font.size = Pt(14)
+    prs.save(path)
+    return path
+
+
+def write_image(path: str, page_text: str) -> str:
+    from PIL import Image, ImageDraw, ImageFont
+
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 22)
+    except OSError:
+        font = ImageFont.load_default()
+    image = Image.new("RGB", (1240, 1754), "white")
+    draw = ImageDraw.Draw(image)
+    y = 60
+    for line in _wrap(page_text, 80):
+        draw.text((60, y), line, fill="black", font=font)
+        y += 30
+    image.save(path)
+    return path
+
+
+def build(size: str, directory: str) -> Dict[str, List[str]]:
+    """
+    Generate every input format for a size into directory
+
+    Returns:
+        Dict of format -> list of file paths (text, pdf, pptx, image)
+    """
+    os.makedirs(directory, exist_ok=True)
+    page_texts = pages(size)
+
+    text_path = os.path.join(directory, f"{size}.txt")
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write(text(size))
+
+    files = {
+        "text": [text_path],
+        "pdf": [write_pdf(os.path.join(directory, f"{size}.pdf"), page_texts)],
+        "pptx": [write_pptx(os.path.join(directory, f"{size}.pptx"), page_texts)],
+        "image": [
+            write_image(os.path.join(directory, f"{size}-{i}.png"), page_texts[i % len(page_texts)])
+            for i in range(SIZES[size]["images"])
+        ],
+    }
+    return files
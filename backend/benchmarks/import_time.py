@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Measure how long importing the API takes, per module
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter and
+reports the slowest modules by cumulative import time. torch, transformers,
+spaCy, gensim, scikit-learn, nltk and the document parsers must only be
+imported on first use, so the API can accept traffic within a second of
+starting. Exits with status 1 when any of them is imported eagerly or the
+total is over --budget.
+
+Usage (from backend/):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module main --budget 1.0 --top 20
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily by transcript, summarize, obj_q_gen and sub_q_gen
+HEAVY_MODULES = ("torch", "transformers", "spacy", "gensim", "sklearn", "nltk",
+                 "PIL", "pytesseract", "pptx", "PyPDF2")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", type=str, default="main", help="Module to import")
+    parser.add_argument("--budget", type=float, default=1.0, help="Maximum import time in seconds")
+    parser.add_argument("--top", type=int, default=15, help="Number of modules to list")
+    return parser.parse_args()
+
+
+def import_times(module: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Returns:
+        (module, depth, self µs, cumulative µs) of every import, in the order
+        -X importtime reports them
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  <self> | <cumulative> | <indented name>"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main() -> None:
+    args = parse_args()
+    rows = import_times(args.module)
+
+    total = sum(cumulative for _, depth, _, cumulative in rows if depth == 0) / 1e6
+    print(f"import {args.module}: {total:.3f}s\n")
+    print(f"{'module':<50} {'self (s)':>10} {'cumulative (s)':>15}")
+    for name, depth, self_us, cumulative in sorted(rows, key=lambda row: row[3], reverse=True)[:args.top]:
+        print(f"{'  ' * depth + name:<50} {self_us / 1e6:>10.3f} {cumulative / 1e6:>15.3f}")
+
+    imported = {name.split(".")[0] for name, _, _, _ in rows}
+    eager = [name for name in HEAVY_MODULES if name in imported]
+    failed = False
+    if eager:
+        print(f"\nImported eagerly: {', '.join(eager)}")
+        failed = True
+    if total > args.budget:
+        print(f"\nImport time {total:.3f}s is over the {args.budget:.3f}s budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Load generator for the FastAPI service
+
+Drives the real app with a weighted mix of /transcribe, /summarize,
+/generate-subjective-questions and /generate-questions at increasing
+concurrency levels, and reports throughput, p50/p95/p99 latency and error
+rate per level plus the concurrency at which the service saturates.
+
+Any response outside 2xx counts as an error. When an endpoint's error rate
+at a level exceeds --max_error_rate, its status codes are printed, the
+remaining levels are skipped and the command exits with status 1: latencies
+of rejected requests say nothing about throughput.
+
+Usage (from backend/):
+    # in-process uvicorn with stand-in models: fast and deterministic
+    python -m benchmarks.loadtest --stub --concurrency 1 2 4 8 --duration 15
+
+    # against a running instance
+    python -m benchmarks.loadtest --url http://localhost:8000 --mix summarize=5,objective=1
+"""
+import argparse
+import json
+import math
+import os
+import random
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import corpora
+
+DEFAULT_MIX = {"transcribe": 2, "summarize": 4, "subjective": 1, "objective": 1}
+DEFAULT_MAX_ERROR_RATE = 0.05
+
+# A level counts as saturated when adding workers improves throughput by less
+# than this, or when p95 latency grows past P95_GROWTH times the first level's
+SATURATION_GAIN = 0.1
+P95_GROWTH = 3.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # nearest-rank percentile
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Workload:
+    def __init__(self, base_url: str, size: str, mix: Dict[str, float], use_bank: bool = False) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.mix = mix
+        # Every request sends the same text, so without refresh the question
+        # bank would answer all but the first
+        self.refresh = not use_bank
+        self.text = corpora.text(size)
+        workdir = tempfile.mkdtemp(prefix="study-load-")
+        pdf_path = corpora.write_pdf(os.path.join(workdir, f"{size}.pdf"), corpora.pages(size))
+        with open(pdf_path, "rb") as f:
+            self.pdf_bytes = f.read()
+
+    def pick(self, rng: random.Random) -> str:
+        names = list(self.mix)
+        return rng.choices(names, weights=[self.mix[n] for n in names])[0]
+
+    def send(self, session: requests.Session, name: str) -> int:
+        if name == "transcribe":
+            files = {"file": ("load.pdf", self.pdf_bytes, "application/pdf")}
+            response = session.post(f"{self.base_url}/transcribe", files=files)
+        elif name == "summarize":
+            response = session.post(f"{self.base_url}/summarize", json={"text": self.text, "refresh": self.refresh})
+        elif name == "subjective":
+            response = session.post(f"{self.base_url}/generate-subjective-questions",
+                                    json={"text": self.text, "num_questions": 5, "refresh": self.refresh})
+        elif name == "objective":
+            response = session.post(f"{self.base_url}/generate-questions",
+                                    json={"text": self.text, "num_questions": 5, "num_options": 4,
+                                          "refresh": self.refresh})
+        else:
+            raise ValueError(f"Unknown workload {name}")
+        return response.status_code
+
+
+def run_level(workload: Workload, concurrency: int, duration: float, seed: int) -> Dict[str, Any]:
+    samples = []  # (endpoint, latency, status code or None when the request failed)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id: int) -> None:
+        rng = random.Random(f"{seed}-{concurrency}-{worker_id}")
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            name = workload.pick(rng)
+            start = time.perf_counter()
+            try:
+                status = workload.send(session, name)
+            except requests.RequestException:
+                status = None
+            latency = time.perf_counter() - start
+            with lock:
+                samples.append((name, latency, status))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return summarize_samples(samples, elapsed, concurrency)
+
+
+def _latency_stats(latencies: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+
+def _ok(status: Optional[int]) -> bool:
+    return status is not None and 200 <= status < 300
+
+
+def summarize_samples(samples: List[Tuple[str, float, Optional[int]]], elapsed: float,
+                      concurrency: int) -> Dict[str, Any]:
+    latencies = [latency for _, latency, _ in samples]
+    errors = sum(1 for _, _, status in samples if not _ok(status))
+    per_endpoint = {}
+    for name in sorted({name for name, _, _ in samples}):
+        endpoint_samples = [(latency, status) for n, latency, status in samples if n == name]
+        stats = _latency_stats([latency for latency, _ in endpoint_samples])
+        stats["requests"] = len(endpoint_samples)
+        stats["error_rate"] = round(sum(1 for _, status in endpoint_samples if not _ok(status))
+                                    / len(endpoint_samples), 4)
+        stats["status_codes"] = dict(Counter(str(status or "failed") for _, status in endpoint_samples))
+        per_endpoint[name] = stats
+
+    result = {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "endpoints": per_endpoint,
+    }
+    result.update(_latency_stats(latencies))
+    return result
+
+
+def failing_endpoints(level: Dict[str, Any], max_error_rate: float) -> Dict[str, Dict[str, int]]:
+    """Status codes of the endpoints whose error rate is above max_error_rate"""
+    return {name: stats["status_codes"] for name, stats in level["endpoints"].items()
+            if stats["error_rate"] > max_error_rate}
+
+
+def find_saturation(levels: List[Dict[str, Any]]) -> Any:
+    """Return the first concurrency level past which throughput stops scaling"""
+    for previous, current in zip(levels, levels[1:]):
+        gain = (current["throughput_rps"] - previous["throughput_rps"]) / max(previous["throughput_rps"], 1e-9)
+        if gain < SATURATION_GAIN or current["p95_ms"] > P95_GROWTH * max(levels[0]["p95_ms"], 1e-9):
+            return previous["concurrency"]
+    return None
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_in_process_server():
+    """Run the real app in a uvicorn server on a background thread"""
+    import uvicorn
+    from main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("In-process server failed to start")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown workload {name}. Choose from {list(DEFAULT_MIX)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", type=str, default=None, help="Target a running server instead of an in-process one")
+    parser.add_argument("--stub", action="store_true", help="Use stand-in models for the in-process server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds per concurrency level")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                       help="Weighted workload mix, e.g. transcribe=2,summarize=4,subjective=1,objective=1")
+    parser.add_argument("--size", type=str, default="small", choices=list(corpora.SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--use_bank", action="store_true",
+                       help="Let the question bank answer repeat requests instead of regenerating")
+    parser.add_argument("--max_error_rate", type=float, default=DEFAULT_MAX_ERROR_RATE,
+                       help="Fail when any endpoint's share of non-2xx responses at a level exceeds this")
+    parser.add_argument("--output", type=str, default="loadtest_results.json")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+
+    server = thread = None
+    base_url = args.url
+    if base_url is None:
+        if args.stub:
+            from benchmarks.stubs import install_stub_models
+            install_stub_models()
+        server, thread, base_url = start_in_process_server()
+        print(f"Started in-process server at {base_url}")
+
+    workload = Workload(base_url, args.size, args.mix, args.use_bank)
+    levels = []
+    failed = {}
+    try:
+        for concurrency in args.concurrency:
+            level = run_level(workload, concurrency, args.duration, args.seed)
+            levels.append(level)
+            print(f"concurrency {concurrency:>3}: {level['throughput_rps']:8.2f} req/s  "
+                  f"p50 {level['p50_ms']:9.1f} ms  p95 {level['p95_ms']:9.1f} ms  "
+                  f"p99 {level['p99_ms']:9.1f} ms  errors {level['error_rate']:.1%}")
+            failed = failing_endpoints(level, args.max_error_rate)
+            if failed:
+                for name, status_codes in failed.items():
+                    print(f"FAILED {name}: error rate {level['endpoints'][name]['error_rate']:.1%} "
+                          f"above {args.max_error_rate:.1%}, status codes {status_codes}")
+                print("Stopping: the latencies would measure failed requests, not throughput")
+                break
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    saturation = None
+    if not failed:
+        saturation = find_saturation(levels)
+        if saturation is not None:
+            print(f"Throughput stops scaling beyond concurrency {saturation}")
+        else:
+            print("No saturation point within the tested concurrency levels")
+
+    report = {
+        "target": args.url or "in-process",
+        "stub_models": args.stub and args.url is None,
+        "mix": args.mix,
+        "size": args.size,
+        "use_bank": args.use_bank,
+        "duration_per_level": args.duration,
+        "levels": levels,
+        "saturation_concurrency": saturation,
+        "failed_endpoints": failed,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
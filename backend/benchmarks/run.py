@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Benchmark every pipeline stage on fixed corpora
+
+Times the Transcriber methods, get_keywords, QuestionExtractor,
+IncorrectAnswerGenerator, QuestionGenerator and QAEvaluator separately and
+end to end, saves the results as JSON and compares them against a stored
+baseline.
+
+Usage (from backend/):
+    python -m benchmarks.run --stub --sizes small medium --output results.json
+    python -m benchmarks.run --stub --save_baseline benchmarks/baseline-stub.json
+    python -m benchmarks.run --stub --baseline benchmarks/baseline-stub.json
+
+With --stub every model is replaced by a deterministic stand-in (see
+stubs.py), so the suite runs offline in seconds and measures the code around
+the models. Exits with status 1 when any benchmark is slower than the
+baseline by more than --tolerance, fails, or is in the baseline but
+missing from a run that selected it.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import corpora
+
+NUM_QUESTIONS = 5
+NUM_OPTIONS = 4
+
+
+def time_call(function: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, float]:
+    """Run function `repeat` times (setup is run untimed before each call)"""
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "repeat": repeat,
+    }
+
+
+class StageBenchmarks:
+    def __init__(self, size: str, files: Dict[str, List[str]], workdir: str) -> None:
+        self.size = size
+        self.files = files
+        self.workdir = workdir
+        with open(files["text"][0], encoding="utf-8") as f:
+            self.text = f.read()
+
+    def _transcribe(self, kind: str, method: str):
+        from transcript import Transcriber
+
+        # Transcriber deletes its input, so each run gets a fresh copy
+        copies = []
+
+        def setup():
+            copies.clear()
+            for path in self.files[kind]:
+                copy = os.path.join(self.workdir, f"run-{os.path.basename(path)}")
+                shutil.copyfile(path, copy)
+                copies.append(copy)
+
+        def run():
+            for copy in copies:
+                getattr(Transcriber(copy), method)()
+
+        return run, setup
+
+    def benchmarks(self) -> Dict[str, Any]:
+        import models
+        from summarize import get_keywords
+        from obj_q_gen.question_extraction import QuestionExtractor
+        from obj_q_gen.incorrect_answer_generation import IncorrectAnswerGenerator
+        from obj_q_gen.question_generation_main import QuestionGeneration
+
+        text = self.text
+        objective_text = QuestionGeneration(NUM_QUESTIONS, NUM_OPTIONS, models.get_ner_tagger(),
+                                            models.get_glove()).clean_text(text)
+        answers = [q["answer"] for q in QuestionExtractor(NUM_QUESTIONS, models.get_ner_tagger())
+                   .get_questions_dict(objective_text).values()]
+        qg = models.get_question_generator()
+        qg.segment_cache = None  # time the models, not cached results
+        qa_evaluator = qg.qa_evaluator
+        qg_inputs, qg_answers = qg.generate_qg_inputs(text, "all")
+        qg_inputs, qg_answers = qg.prerank_qg_inputs(qg_inputs, qg_answers, NUM_QUESTIONS * 3)
+        questions = qg.generate_questions_from_inputs(qg_inputs)
+
+        def incorrect_answers():
+            generator = IncorrectAnswerGenerator(objective_text, models.get_glove())
+            for answer in answers:
+                generator.get_all_options_dict(answer, NUM_OPTIONS)
+
+        def end_to_end():
+            from transcript import Transcriber
+            copy = os.path.join(self.workdir, "e2e.pdf")
+            shutil.copyfile(self.files["pdf"][0], copy)
+            transcript = Transcriber(copy).pdf_transcribe()
+            get_keywords(transcript)
+            qg.generate(transcript, num_questions=NUM_QUESTIONS)
+            QuestionGeneration(NUM_QUESTIONS, NUM_OPTIONS, models.get_ner_tagger(),
+                               models.get_glove()).generate_questions_dict(transcript)
+
+        benchmarks = {
+            "transcribe_pdf": self._transcribe("pdf", "pdf_transcribe"),
+            "transcribe_pptx": self._transcribe("pptx", "ppt_transcribe"),
+            "transcribe_image": self._transcribe("image", "image_transcribe"),
+            "get_keywords": (lambda: get_keywords(text), None),
+            "question_extractor": (
+                lambda: QuestionExtractor(NUM_QUESTIONS, models.get_ner_tagger()).get_questions_dict(objective_text),
+                None,
+            ),
+            "incorrect_answer_generator": (incorrect_answers, None),
+            "qg_prepare_inputs": (lambda: qg.generate_qg_inputs(text, "all"), None),
+            "qg_generate_questions": (lambda: qg.generate_questions_from_inputs(qg_inputs), None),
+            "qa_evaluator": (
+                lambda: qa_evaluator.get_scores(qa_evaluator.encode_qa_pairs(questions, qg_answers)),
+                None,
+            ),
+            "question_generator": (lambda: qg.generate(text, num_questions=NUM_QUESTIONS), None),
+            "end_to_end_pdf": (end_to_end, None),
+        }
+        return benchmarks
+
+
+def run(sizes: List[str], repeat: int, only: Optional[List[str]], workdir: str) -> Dict[str, Any]:
+    results = {}
+    for size in sizes:
+        files = corpora.build(size, os.path.join(workdir, size))
+        stage_benchmarks = StageBenchmarks(size, files, workdir).benchmarks()
+        for name, (function, setup) in stage_benchmarks.items():
+            if only and name not in only:
+                continue
+            key = f"{size}/{name}"
+            try:
+                time_call(function, 1, setup)  # warm-up
+                results[key] = time_call(function, repeat, setup)
+                print(f"{key:<45} median {results[key]['median'] * 1000:10.2f} ms")
+            except Exception as e:
+                results[key] = {"error": str(e)}
+                print(f"{key:<45} failed: {e}")
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+            selected: Optional[Callable[[str], bool]] = None) -> List[Dict[str, Any]]:
+    """
+    Return benchmarks whose median is slower than the baseline by more than
+    tolerance, that failed, or that are in the baseline but were not run
+
+    Args:
+        selected: Whether a baseline key was part of this run (--sizes,
+            --only); unselected keys are never reported missing
+    """
+    regressions = []
+    for key, base in baseline.get("results", {}).items():
+        if key not in results and "median" in base and (selected is None or selected(key)):
+            regressions.append({"benchmark": key, "baseline": base["median"], "current": None,
+                                "error": "missing from the results"})
+    for key, result in results.items():
+        if "error" in result:
+            regressions.append({"benchmark": key, "baseline": baseline.get("results", {}).get(key, {}).get("median"),
+                                "current": None, "error": result["error"]})
+            continue
+        base = baseline.get("results", {}).get(key)
+        if not base or "median" not in base:
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else 1.0
+        if ratio > 1 + tolerance:
+            regressions.append({"benchmark": key, "baseline": base["median"], "current": result["median"],
+                                "ratio": round(ratio, 2)})
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(corpora.SIZES))
+    parser.add_argument("--only", nargs="+", default=None, help="Run only these benchmark names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stub", action="store_true", help="Use stand-in models (offline, deterministic)")
+    parser.add_argument("--output", type=str, default="bench_results.json")
+    parser.add_argument("--baseline", type=str, default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging, e.g. 0.25 = 25%%")
+    parser.add_argument("--save_baseline", type=str, default=None, help="Also write the results as a new baseline")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+
+    if args.stub:
+        from benchmarks.stubs import install_stub_models
+        install_stub_models()
+
+    workdir = tempfile.mkdtemp(prefix="study-bench-")
+    try:
+        results = run(args.sizes, args.repeat, args.only, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "stub_models": args.stub,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.time(),
+        },
+        "results": results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("stub_models") != args.stub:
+            print("Warning: baseline was recorded with a different --stub setting")
+        def selected(key: str) -> bool:
+            size, _, name = key.partition("/")
+            return size in args.sizes and (not args.only or name in args.only)
+
+        regressions = compare(results, baseline, args.tolerance, selected)
+        report["regressions"] = regressions
+        for regression in regressions:
+            if "error" in regression:
+                print(f"REGRESSION {regression['benchmark']}: {regression['error']}")
+            else:
+                print(f"REGRESSION {regression['benchmark']}: {regression['baseline'] * 1000:.2f} ms -> "
+                      f"{regression['current'] * 1000:.2f} ms ({regression['ratio']}x)")
+        if regressions:
+            exit_code = 1
+        else:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
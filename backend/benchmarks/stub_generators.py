@@ -0,0 +1,73 @@
+"""
+Stand-in T5 generator and BERT evaluator for stub runs (see stubs.py)
+
+They subclass the real QuestionGenerator and QAEvaluator, so importing this
+module needs torch and transformers; stubs.py only imports it when a stub
+generator or evaluator is loaded.
+"""
+import hashlib
+from types import SimpleNamespace
+from typing import Any
+
+import torch
+
+from benchmarks.stubs import StubTokenizer
+from sub_q_gen.questiongenerator import QAEvaluator, QuestionGenerator
+
+
+def _stable_hash(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+class StubSeq2SeqModel(torch.nn.Module):
+    """Turns the answer part of a generation input into a templated question"""
+
+    def __init__(self, tokenizer: StubTokenizer) -> None:
+        super().__init__()
+        self.tokenizer = tokenizer
+
+    @torch.no_grad()
+    def generate(self, input_ids=None, max_length: int = 64, **kwargs) -> torch.Tensor:
+        outputs = []
+        for row in input_ids:
+            words = [w for w in self.tokenizer.decode(row).split() if w.isalnum()]
+            if words[:2] == ["generate", "question"]:
+                words = words[2:]
+            # skip the "answer" (or "hl") marker word
+            question = "What is " + " ".join(words[1:7]) + " ?"
+            outputs.append(self.tokenizer.encode(question, max_length))
+        width = max(len(ids) for ids in outputs)
+        return torch.tensor([ids + [0] * (width - len(ids)) for ids in outputs])
+
+
+class StubClassifier(torch.nn.Module):
+    """Returns a deterministic pseudo-score per QA pair"""
+
+    def forward(self, input_ids=None, attention_mask=None, **kwargs) -> Any:
+        scores = []
+        for row in input_ids:
+            score = (_stable_hash(",".join(map(str, row.tolist()))) % 1000) / 100 - 5
+            scores.append([-score, score])
+        return SimpleNamespace(logits=torch.tensor(scores))
+
+
+class StubQuestionGenerator(QuestionGenerator):
+    def _model_version(self, model_name: str) -> str:
+        return "stub-question-generator-small" if self.highlight_inputs else "stub-question-generator"
+
+    def _load_qg_tokenizer(self, model_name: str) -> Any:
+        return StubTokenizer()
+
+    def _load_qg_model(self, model_name: str) -> torch.nn.Module:
+        return StubSeq2SeqModel(self.qg_tokenizer)
+
+
+class StubQAEvaluator(QAEvaluator):
+    def _model_version(self, model_name: str) -> str:
+        return "stub-qa-evaluator"
+
+    def _load_qae_tokenizer(self, model_name: str) -> Any:
+        return StubTokenizer()
+
+    def _load_qae_model(self, model_name: str) -> torch.nn.Module:
+        return StubClassifier()
@@ -0,0 +1,154 @@
+"""
+Lightweight stand-in models for offline, deterministic runs
+
+The stubs keep the interfaces the pipeline uses (tokenizer calls, generate(),
+classifier logits, spaCy Doc entities, GloVe similarity) but need no
+downloads and run in microseconds, so benchmarks and load tests in stub mode
+measure the code around the models rather than the models themselves.
+
+    from benchmarks.stubs import install_stub_models
+    install_stub_models()  # every model the API loads from now on is a stub
+
+The spaCy and GloVe stubs and the tokenizer need neither torch nor
+transformers, so stub runs that only transcribe, summarize and generate
+objective questions work without them. The generator and evaluator stubs
+(stub_generators.py) subclass the real pipeline classes and are imported
+when those models are first loaded, so subjective generation in stub mode
+still needs torch and transformers installed.
+"""
+import re
+import threading
+from typing import Any, List
+
+from sub_q_gen.profiles import SMALL_GENERATOR_MODEL
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class StubTokenizer:
+    """Word-level tokenizer with a vocabulary that grows as text is seen"""
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def __init__(self) -> None:
+        self._ids = {}
+        self._tokens = {0: "", 1: ""}
+        self._lock = threading.Lock()
+
+    def _token_id(self, token: str) -> int:
+        token_id = self._ids.get(token)
+        if token_id is None:
+            with self._lock:
+                token_id = self._ids.setdefault(token, len(self._ids) + 2)
+                self._tokens[token_id] = token
+        return token_id
+
+    def encode(self, text: str, max_length: int = None, add_special_tokens: bool = True) -> List[int]:
+        ids = [self._token_id(token) for token in TOKEN_PATTERN.findall(text or "")]
+        if add_special_tokens:
+            ids = self.build_inputs_with_special_tokens(ids)
+        return ids[:max_length] if max_length else ids
+
+    def build_inputs_with_special_tokens(self, ids: List[int]) -> List[int]:
+        return ids + [self.eos_token_id]
+
+    @staticmethod
+    def num_special_tokens_to_add() -> int:
+        return 1
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        if hasattr(ids, "tolist"):
+            ids = ids.tolist()
+        return " ".join(self._tokens.get(i, "") for i in ids if i > 1).strip()
+
+    is_fast = False
+
+    def __call__(self, text=None, text_pair=None, padding=False, max_length=None, truncation=False,
+                 return_tensors=None, add_special_tokens=True, **kwargs):
+        if isinstance(text, (list, tuple)):
+            pairs = text_pair if text_pair is not None else [None] * len(text)
+            rows = [self._encode_row(t, p, padding, max_length, truncation, add_special_tokens)
+                    for t, p in zip(text, pairs)]
+            if padding in (True, "longest"):
+                longest = max((len(row["input_ids"]) for row in rows), default=0)
+                for row in rows:
+                    row["attention_mask"] += [0] * (longest - len(row["input_ids"]))
+                    row["input_ids"] += [self.pad_token_id] * (longest - len(row["input_ids"]))
+            if return_tensors == "pt":
+                import torch
+                return {key: torch.tensor([row[key] for row in rows]) for key in ("input_ids", "attention_mask")}
+            return {key: [row[key] for row in rows] for key in ("input_ids", "attention_mask")}
+
+        row = self._encode_row(text, text_pair, padding, max_length, truncation, add_special_tokens)
+        if return_tensors == "pt":
+            import torch
+            return {key: torch.tensor([value]) for key, value in row.items()}
+        return row
+
+    def _encode_row(self, text, text_pair, padding, max_length, truncation, add_special_tokens=True) -> dict:
+        ids = self.encode(text, max_length if truncation else None, add_special_tokens)
+        if text_pair is not None:
+            ids = ids + self.encode(text_pair, add_special_tokens=add_special_tokens)
+            if truncation and max_length:
+                ids = ids[:max_length]
+        mask = [1] * len(ids)
+        if padding == "max_length" and max_length:
+            mask += [0] * (max_length - len(ids))
+            ids += [self.pad_token_id] * (max_length - len(ids))
+        return {"input_ids": ids, "attention_mask": mask}
+
+
+def stub_spacy() -> Any:
+    """Blank English pipeline whose NER marks title-case spans and numbers"""
+    import spacy
+
+    nlp = spacy.blank("en")
+    ruler = nlp.add_pipe("entity_ruler")
+    ruler.add_patterns([
+        {"label": "ORG", "pattern": [{"IS_TITLE": True, "IS_SENT_START": False, "OP": "+"}]},
+        {"label": "DATE", "pattern": [{"LIKE_NUM": True, "LENGTH": 4}]},
+        {"label": "CARDINAL", "pattern": [{"LIKE_NUM": True}]},
+    ])
+    return nlp
+
+
+def stub_glove() -> Any:
+    """Small random word vectors over the benchmark vocabulary"""
+    import numpy as np
+    from gensim.models import KeyedVectors
+
+    from benchmarks import corpora
+
+    words = sorted({w.lower() for w in TOKEN_PATTERN.findall(corpora.text("large")) if w.isalpha()})
+    vectors = np.random.RandomState(0).standard_normal((len(words), 50)).astype("float32")
+    model = KeyedVectors(vector_size=50)
+    model.add_vectors(words, vectors)
+    return model
+
+
+def install_stub_models(manager=None) -> None:
+    """Register stub loaders for every model in the model manager"""
+    if manager is None:
+        from models import manager
+
+    def question_generator(**kwargs) -> Any:
+        from benchmarks.stub_generators import StubQuestionGenerator
+        return StubQuestionGenerator(
+            qa_evaluator=lambda: manager.get("qa_evaluator"),
+            spacy_nlp=lambda: manager.get("spacy_sm"),
+            **kwargs,
+        )
+
+    def qa_evaluator() -> Any:
+        from benchmarks.stub_generators import StubQAEvaluator
+        return StubQAEvaluator()
+
+    manager.register("question_generator", question_generator, "stub-question-generator")
+    manager.register("question_generator_small", lambda: question_generator(
+        model_name=SMALL_GENERATOR_MODEL,
+        refiner=lambda: manager.use("question_generator"),
+    ), "stub-question-generator-small")
+    manager.register("qa_evaluator", qa_evaluator, "stub-qa-evaluator")
+    manager.register("spacy_sm", stub_spacy, "stub-spacy")
+    manager.register("ner_tagger", stub_spacy, "stub-spacy")
+    manager.register("glove", stub_glove, "stub-glove")
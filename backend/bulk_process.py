@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Offline bulk processor for precomputing question banks
+
+Takes a directory (scanned recursively) or a manifest of PDF, PPTX, image and
+text files, shards them across worker processes that each load the models
+once, runs the transcription / summarize / question stages and appends one
+JSON record per file to the output JSONL.
+
+The output file doubles as the checkpoint: every record carries the digest of
+the file and the run parameters, and a restarted run skips every file that
+already has a successful record. Failed files are retried on the next run.
+When a worker process dies (OOM kill, segfault in a model), the files it may
+have been processing are recorded as failed and a fresh pool carries on with
+the rest.
+
+Usage:
+    python bulk_process.py --input course_docs/ --output bank.jsonl --workers 4
+    python bulk_process.py --manifest files.txt --output bank.jsonl --stages transcribe summarize
+    python bulk_process.py --input docs/ --output bank-0.jsonl --shard 0/2   # one of two machines
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+SUPPORTED_EXTENSIONS = {".pdf", ".pptx", ".png", ".jpg", ".jpeg", ".txt"}
+STAGES = ["transcribe", "summarize", "subjective", "objective"]
+STAGE_MODELS = {
+    "subjective": ["question_generator", "qa_evaluator", "spacy_sm"],
+    "objective": ["ner_tagger", "glove"],
+}
+
+
+def find_files(input_dir: Optional[str], manifest: Optional[str]) -> List[str]:
+    files = []
+    if input_dir:
+        for root, _, names in os.walk(input_dir):
+            for name in names:
+                if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                    files.append(os.path.join(root, name))
+    if manifest:
+        with open(manifest, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                files.append(json.loads(line)["path"] if line.startswith("{") else line)
+    return sorted(set(files))
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def params_digest(params: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def completed_keys(output: str) -> Set[str]:
+    """Keys of successful records already in the output; drops a torn last line"""
+    keys = set()
+    if not os.path.exists(output):
+        return keys
+    valid_bytes = 0
+    with open(output, "rb") as f:
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            try:
+                record = json.loads(raw)
+            except ValueError:
+                break
+            valid_bytes += len(raw)
+            if not record.get("error"):
+                keys.add(record["key"])
+    if valid_bytes != os.path.getsize(output):
+        with open(output, "r+b") as f:
+            f.truncate(valid_bytes)
+    return keys
+
+
+# Worker process state, set once per process by _init_worker
+_worker = {}
+
+
+def _init_worker(params: Dict[str, Any], stub: bool, threads: int) -> None:
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    import models
+    if stub:
+        from benchmarks.stubs import install_stub_models
+        install_stub_models()
+    for stage in params["stages"]:
+        for name in STAGE_MODELS.get(stage, []):
+            if name == "qa_evaluator" and not params["use_evaluator"]:
+                continue
+            models.manager.get(name)
+    _worker["params"] = params
+
+
+def _transcribe(path: str) -> str:
+    if path.lower().endswith(".txt"):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return f.read()
+
+    from segment_cache import segment_cache
+    from transcript import Transcriber, media_type_for_path, runner
+    transcriber = Transcriber(path, cleanup=False, page_cache=segment_cache.namespace("transcripts"))
+    transcript = runner(transcriber, media_type_for_path(path))
+    if isinstance(transcript, list):
+        transcript = ' '.join(transcript)
+    return transcript
+
+
+def process_file(task: Dict[str, str]) -> Dict[str, Any]:
+    import models
+    from summarize import get_keywords
+    from obj_q_gen.workers import text_to_questions
+
+    params = _worker["params"]
+    stages = params["stages"]
+    record = {"path": task["path"], "digest": task["digest"], "key": task["key"], "params": params}
+    start = time.perf_counter()
+    try:
+        text = _transcribe(task["path"])
+        record["transcript_chars"] = len(text)
+        if params["include_transcript"]:
+            record["transcript"] = text
+
+        if "summarize" in stages:
+            important_words, summary = get_keywords(text)
+            record["important_words"] = important_words
+            record["summary"] = summary
+
+        if "subjective" in stages:
+            record["subjective_questions"] = models.get_question_generator().generate(
+                text,
+                use_evaluator=params["use_evaluator"],
+                num_questions=params["num_questions"],
+                answer_style=params["answer_style"],
+            )
+
+        if "objective" in stages:
+            record["objective_questions"] = text_to_questions(
+                text, params["num_questions"], params["num_options"],
+                ner_tagger=models.get_ner_tagger(), glove_model=models.get_glove(),
+                entity_cache=models.get_entity_cache()
+            )
+    except Exception as e:
+        record["error"] = str(e)
+        record["traceback"] = traceback.format_exc()
+
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def failed_record(task: Dict[str, str], params: Dict[str, Any], error: str) -> Dict[str, Any]:
+    return {"path": task["path"], "digest": task["digest"], "key": task["key"], "params": params,
+            "error": error, "seconds": None}
+
+
+def run_tasks(tasks: List[Dict[str, str]], workers: int, params: Dict[str, Any], stub: bool, threads: int,
+              function: Callable[[Dict[str, str]], Dict[str, Any]] = process_file) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one record per task, in completion order
+
+    At most `workers` tasks are in flight, so when a worker process dies the
+    suspects are known: the tasks in flight are recorded as failed and the
+    remaining ones continue in a new pool.
+    """
+    context = multiprocessing.get_context("spawn")
+    pending = deque(tasks)
+    while pending:
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(params, stub, threads)) as pool:
+            running = {}
+            broken = False
+            while (pending or running) and not broken:
+                while pending and len(running) < workers:
+                    task = pending.popleft()
+                    running[pool.submit(function, task)] = task
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    try:
+                        yield future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        yield failed_record(task, params, "Worker process died while processing this file")
+            for task in running.values():
+                yield failed_record(task, params, "Worker process died while this file was in flight")
+            if broken and pending:
+                print(f"A worker process died, restarting the pool for the {len(pending)} remaining files")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", type=str, default=None, help="Directory scanned recursively for documents")
+    parser.add_argument("--manifest", type=str, default=None,
+                       help="File with one path per line (or JSON lines with a 'path' key)")
+    parser.add_argument("--output", type=str, required=True, help="JSONL results file, also used to resume")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--threads_per_worker", type=int, default=None)
+    parser.add_argument("--shard", type=str, default=None, help="Process only shard i of n, e.g. 0/4")
+    parser.add_argument("--num_questions", type=int, default=10)
+    parser.add_argument("--num_options", type=int, default=4)
+    parser.add_argument("--answer_style", type=str, default="all")
+    parser.add_argument("--no_evaluator", dest="use_evaluator", action="store_false", default=True)
+    parser.add_argument("--include_transcript", action="store_true")
+    parser.add_argument("--stub", action="store_true", help="Use stand-in models (for testing the pipeline)")
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.input and not args.manifest:
+        print("Error: pass --input and/or --manifest")
+        return 2
+
+    params = {
+        "stages": sorted(args.stages, key=STAGES.index),
+        "num_questions": args.num_questions,
+        "num_options": args.num_options,
+        "answer_style": args.answer_style,
+        "use_evaluator": args.use_evaluator,
+        "include_transcript": args.include_transcript,
+    }
+    run_params = params_digest(params)
+
+    files = find_files(args.input, args.manifest)
+    if args.shard:
+        index, count = (int(x) for x in args.shard.split("/"))
+        files = [f for f in files if int(hashlib.md5(f.encode("utf-8")).hexdigest(), 16) % count == index]
+
+    done = completed_keys(args.output)
+    tasks = []
+    for path in files:
+        digest = file_digest(path)
+        key = f"{digest}:{run_params}"
+        if key not in done:
+            tasks.append({"path": path, "digest": digest, "key": key})
+            done.add(key)  # identical files are processed once per run
+
+    print(f"{len(files)} files, {len(files) - len(tasks)} already done, {len(tasks)} to process")
+    if not tasks:
+        return 0
+
+    workers = min(args.workers, len(tasks))
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+    failed = 0
+    start = time.perf_counter()
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        for i, record in enumerate(run_tasks(tasks, workers, params, args.stub, threads), 1):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+            if record.get("error"):
+                failed += 1
+                print(f"[{i}/{len(tasks)}] FAILED {record['path']}: {record['error']}")
+            else:
+                print(f"[{i}/{len(tasks)}] {record['path']} ({record['seconds']}s)")
+
+    print(f"Processed {len(tasks)} files in {time.perf_counter() - start:.1f}s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Deadlines and cooperative cancellation
+
+Every computation gets a CancellationToken that is passed down the pipeline.
+Long loops (T5 generation, evaluator scoring, distractors, PDF/slide/OCR
+pages) call check_cancelled(token) between items. Once the token is
+cancelled, because every client waiting for the result went away or its
+deadline passed, the next check raises, so workers stop on results nobody
+will read.
+
+Pipeline functions take cancel_token=None; check_cancelled(None) does
+nothing, so callers without a deadline (bulk processing, benchmarks) are
+unaffected.
+
+Environment variables:
+    REQUEST_TIMEOUT_SECONDS: Default deadline for API computations
+        (default 600). 0 disables it. Clients can ask for a shorter one
+        with the X-Request-Timeout header.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+
+class Cancelled(Exception):
+    """The computation was cancelled before it finished"""
+
+
+class DeadlineExceeded(Cancelled):
+    """The computation ran past its deadline"""
+
+
+class CancellationToken:
+    def __init__(self, deadline: Optional[float] = None) -> None:
+        """
+        Args:
+            deadline: time.monotonic() value after which the token counts as
+                cancelled, or None for no deadline
+        """
+        self.deadline = deadline
+        self.reason = None
+        self._event = threading.Event()
+
+    @classmethod
+    def with_timeout(cls, seconds: Optional[float]) -> "CancellationToken":
+        return cls(deadline_after(seconds))
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if self.reason is None:
+            self.reason = reason
+        self._event.set()
+
+    def extend(self, deadline: Optional[float]) -> None:
+        """Move the deadline to the later of the two (None: no deadline)"""
+        if self.deadline is not None:
+            self.deadline = None if deadline is None else max(self.deadline, deadline)
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline, or None without one"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether check() would raise"""
+        return self._event.is_set() or (self.deadline is not None and time.monotonic() >= self.deadline)
+
+    def check(self) -> None:
+        """Raise Cancelled (DeadlineExceeded past the deadline) once cancelled"""
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceeded("deadline exceeded")
+
+
+def check_cancelled(token: Optional[CancellationToken]) -> None:
+    if token is not None:
+        token.check()
+
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    return time.monotonic() + seconds if seconds else None
+
+
+def timeout_from_env() -> Optional[float]:
+    seconds = float(os.environ.get("REQUEST_TIMEOUT_SECONDS", "600"))
+    return seconds if seconds > 0 else None
+
+
+DEFAULT_TIMEOUT = timeout_from_env()
@@ -1,12 +1,35 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from contextlib import AsyncExitStack
+import hashlib
+import json
 import os
+import sqlite3
 import tempfile
-from typing import Dict, Any
-from transcript import Transcriber, runner
-from summarize import get_keywords
-from sub_q_gen.questiongenerator import QuestionGenerator
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from transcript import Transcriber, PageRangeError, IMAGE_TYPES
+from summarize import get_keywords, SUMMARIZER_VERSION
+from sub_q_gen.profiles import (
+    DECODING_PROFILES, DEFAULT_GENERATOR_TIER, DEFAULT_REFINE_MULTIPLE, DEFAULT_STREAM_CANDIDATES_PER_SEGMENT,
+    GENERATOR_TIERS, VALID_ANSWER_STYLES, validate_context_window,
+)
 from obj_q_gen.workers import text_to_questions
+from memory_stats import process_memory
+from tracing import tracer
+from question_bank import question_bank, document_digest, params_key, InvalidQuery, MAX_PAGE_SIZE
+from segment_cache import segment_cache
+from singleflight import SingleFlight
+from admission import admission, AdmissionRejected
+from cancellation import Cancelled, CancellationToken, DeadlineExceeded, DEFAULT_TIMEOUT, deadline_after
+from near_duplicates import DEFAULT_THRESHOLD as DEFAULT_DEDUP_THRESHOLD
+from warmup import warmup
+from profiling import profiler, Profile, ProfilerBusy, ARTIFACTS, PROFILE_HEADER, PROFILE_ID_HEADER
+import metrics
+import models
 
 app = FastAPI(title="Study Material Processor", version="1.0.0")
 
@@ -18,25 +41,57 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-os.makedirs('debug', exist_ok=True)
+metrics.QUEUE_DEPTH.set_function(tracer.queue_depth, queue="trace_writer")
 
-def save_debug_file(filename: str, content: str):
-    with open(f'debug/{filename}', 'w', encoding='utf-8') as f:
-        f.write(content)
+# Concurrent identical requests share one computation (see singleflight.py)
+transcribe_flight = SingleFlight("transcribe")
+summarize_flight = SingleFlight("summarize")
+subjective_flight = SingleFlight("subjective")
+subjective_file_flight = SingleFlight("subjective_file")
+objective_flight = SingleFlight("objective")
 
-@app.get("/")
-async def root():
-    return {"message": "Study Material Processor API"}
+FLAG_STRINGS = {"true": True, "1": True, "yes": True, "false": False, "0": False, "no": False}
 
-@app.post("/transcribe")
-async def transcribe_file(file: UploadFile = File(...)) -> Dict[str, Any]:
-    allowed_types = [
-        "application/pdf",
-        "application/vnd.openxmlformats-officedocument.presentationml.presentation",
-        "image/jpeg", "image/png", "image/jpg"
-    ]
-    
-    if file.content_type not in allowed_types:
+def route_template(request: Request) -> str:
+    """
+    Path template of the route a request matches (e.g. /profiles/{profile_id}/{artifact}),
+    so metrics get one series per route rather than one per URL
+    """
+    partial = None
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            # Right path, wrong method (405)
+            partial = route.path
+    return partial or "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    endpoint = route_template(request)
+    start = time.perf_counter()
+    status = 500
+    with metrics.REQUESTS_IN_FLIGHT.track_inprogress(endpoint=endpoint):
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+
+ALLOWED_UPLOAD_TYPES = [
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    "image/jpeg", "image/png", "image/jpg"
+]
+
+# Uploads are copied to disk this many bytes at a time
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+def upload_media_type(file: UploadFile) -> Tuple[List[str], str]:
+    """Split media type and temp file extension of an upload"""
+    if file.content_type not in ALLOWED_UPLOAD_TYPES:
         raise HTTPException(
             status_code=400, 
             detail=f"File type {file.content_type} not supported. Supported: PDF, PPT, Images"
@@ -44,29 +99,323 @@ async def transcribe_file(file: UploadFile = File(...)) -> Dict[str, Any]:
     
     media_type = file.content_type.split("/")
     file_extension = media_type[1] if media_type[1] != "vnd.openxmlformats-officedocument.presentationml.presentation" else "pptx"
+    return media_type, file_extension
+
+async def save_upload(file: UploadFile, suffix: str) -> Tuple[str, str]:
+    """
+    Copy an upload to a temp file in chunks, so large files are never held in memory
+
+    Returns:
+        The temp file path and the SHA-256 of the content
+    """
+    size = 0
+    sha = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        try:
+            with metrics.stage("upload_read"):
+                while True:
+                    chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    temp_file.write(chunk)
+                    sha.update(chunk)
+                    size += len(chunk)
+        except Exception:
+            temp_file.close()
+            remove_temp_file(temp_file.name)
+            raise
+    metrics.count_items("upload_read", "bytes", size)
+    return temp_file.name, sha.hexdigest()
+
+def remove_temp_file(temp_file_path: Optional[str]) -> None:
+    # Safely clean up the temporary file
+    if temp_file_path and os.path.exists(temp_file_path):
+        try:
+            os.unlink(temp_file_path)
+        except OSError as e:
+            print(f"Warning: Could not delete temporary file {temp_file_path}: {e}")
+
+def format_subjective_questions(qa_list: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    formatted_questions = {}
+    for i, qa_pair in enumerate(qa_list, 1):
+        question = qa_pair['question']
+        answer = qa_pair['answer']
+        
+        if isinstance(answer, list):
+            options = [option['answer'] for option in answer]
+            correct_answer = next((opt['answer'] for opt in answer if opt['correct']), options[0])
+            
+            formatted_questions[i] = {
+                "question": question,
+                "answer": correct_answer,
+                "options": options,
+                "type": "multiple_choice"
+            }
+        else:
+            formatted_questions[i] = {
+                "question": question,
+                "answer": answer,
+                "options": [],
+                "type": "subjective"
+            }
+    return formatted_questions
+
+def trace_subjective_questions(trace: Any, formatted_questions: Dict[int, Dict[str, Any]]) -> None:
+    debug_content = f"Generated {len(formatted_questions)} questions:\n{'='*50}\n"
+    for i, q_data in formatted_questions.items():
+        debug_content += f"Q{i} ({q_data['type']}): {q_data['question']}\nA: {q_data['answer']}\n"
+        if q_data['options']:
+            debug_content += f"Options: {q_data['options']}\n"
+        debug_content += "-" * 30 + "\n"
+    trace.write('subjective_questions.txt', debug_content)
+
+def request_deadline(request: Request) -> Optional[float]:
+    """
+    Deadline for a request's computation: REQUEST_TIMEOUT_SECONDS from now,
+    or sooner if the client sends a shorter X-Request-Timeout (in seconds)
+    """
+    timeout = DEFAULT_TIMEOUT
+    header = request.headers.get("x-request-timeout")
+    if header is not None:
+        try:
+            requested = float(header)
+        except ValueError:
+            requested = 0
+        if requested <= 0:
+            raise HTTPException(status_code=400, detail="X-Request-Timeout must be a positive number of seconds")
+        timeout = requested if timeout is None else min(timeout, requested)
+    return deadline_after(timeout)
+
+def cancelled_error(e: Cancelled) -> HTTPException:
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail=f"Request timed out: {str(e)}")
+    # 499 (client closed request) never reaches the client, but shows up in the request metrics
+    return HTTPException(status_code=499, detail=str(e))
+
+def validate_decoding(decoding_profile: str, time_budget: Any) -> None:
+    if decoding_profile not in DECODING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown decoding profile {decoding_profile}. Supported: {', '.join(DECODING_PROFILES)}"
+        )
+    if time_budget is not None and (not isinstance(time_budget, (int, float)) or time_budget <= 0):
+        raise HTTPException(status_code=400, detail="time_budget must be a positive number of seconds")
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def is_count(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+def validate_generation(num_questions: Any, answer_style: Any, max_candidates: Any) -> None:
+    if num_questions is not None and not is_count(num_questions):
+        raise HTTPException(status_code=400, detail="num_questions must be a positive integer or null")
+    if answer_style not in VALID_ANSWER_STYLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown answer style {answer_style}. Supported: {', '.join(VALID_ANSWER_STYLES)}"
+        )
+    if max_candidates is not None and not is_count(max_candidates):
+        raise HTTPException(status_code=400, detail="max_candidates must be a positive integer or null")
+
+def validate_candidate_selection(candidate_multiple: Any, score_threshold: Any) -> None:
+    if candidate_multiple is not None and (not is_number(candidate_multiple) or candidate_multiple < 0):
+        raise HTTPException(status_code=400, detail="candidate_multiple must be a non-negative number or null")
+    if not is_number(score_threshold):
+        raise HTTPException(status_code=400, detail="score_threshold must be a number")
+
+def parse_flag(data: Dict[str, Any], name: str, default: bool = False) -> bool:
+    """A boolean body field, also accepting the strings true/false, 1/0 and yes/no"""
+    value = data.get(name, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in FLAG_STRINGS:
+        return FLAG_STRINGS[value.strip().lower()]
+    raise HTTPException(status_code=400, detail=f"{name} must be true or false")
+
+def validate_dedup_threshold(dedup_threshold: Any) -> None:
+    if dedup_threshold is not None and (not isinstance(dedup_threshold, (int, float))
+                                        or not 0 < dedup_threshold <= 1):
+        raise HTTPException(status_code=400, detail="dedup_threshold must be a number in (0, 1] or null")
+
+
+def generator_models(generator_tier: str, use_evaluator: bool) -> Tuple[str, List[str], Optional[float]]:
+    """
+    Returns:
+        (model generating every candidate, models behind the result,
+        refine_multiple) for a generator tier
+    """
+    tier = GENERATOR_TIERS.get(generator_tier)
+    if tier is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown generator tier {generator_tier}. Supported: {', '.join(GENERATOR_TIERS)}"
+        )
+    # Refinement picks the drafts to regenerate with the evaluator
+    refine = tier["refine"] and use_evaluator
+    model_names = [tier["model"]] + (["question_generator"] if refine else [])
+    if use_evaluator:
+        model_names.append("qa_evaluator")
+    return tier["model"], model_names, DEFAULT_REFINE_MULTIPLE if refine else None
+
+
+def require_profile_token(request: Request) -> None:
+    if not profiler.authorized(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=403, detail="Invalid profiling token, or profiling is disabled")
+
+
+def profiler_busy_error(e: ProfilerBusy) -> HTTPException:
+    # torch.profiler is process-wide, so profiled requests run one at a time
+    return HTTPException(status_code=409, detail=str(e))
+
+
+def request_profile(request: Request, response: Response, name: str) -> Optional[Profile]:
+    """Profile for a request sent with the X-Profile header (see profiling.py), otherwise None"""
+    if PROFILE_HEADER not in request.headers:
+        return None
+    require_profile_token(request)
+    try:
+        profile = profiler.start(name)
+    except ProfilerBusy as e:
+        raise profiler_busy_error(e)
+    response.headers[PROFILE_ID_HEADER] = profile.id
+    return profile
+
+
+def profile_key(flight_key: str, profile: Optional[Profile]) -> str:
+    # A profiled request runs its own computation rather than joining another
+    return flight_key if profile is None else f"{flight_key}:profile:{profile.id}"
+
+
+def profiled(function: Callable[..., Any], profile: Optional[Profile]) -> Callable[..., Any]:
+    return function if profile is None else profile.wrap(function)
+
+
+def validate_context(context_window: Any, context_tokens: Any) -> None:
+    try:
+        validate_context_window(context_window, context_tokens)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.on_event("startup")
+def start_warmup():
+    warmup.start()
+
+@app.on_event("shutdown")
+def flush_traces():
+    tracer.flush()
+
+@app.get("/")
+async def root():
+    return {"message": "Study Material Processor API"}
+
+@app.get("/healthz")
+async def healthz() -> Dict[str, str]:
+    """Liveness: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz(response: Response) -> Dict[str, Any]:
+    """Readiness: 503 until the background warm-up (WARMUP_MODELS) has loaded and run its models"""
+    status = warmup.status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> str:
+    """Prometheus text exposition of stage latencies, item counts, queue depths and cache hits"""
+    return metrics.render()
+
+@app.get("/memory")
+async def memory() -> Dict[str, Any]:
+    """Memory of the worker serving this request, split into shared and unique pages"""
+    return {
+        "worker": process_memory(),
+        "loaded_models": models.loaded_models()
+    }
+
+@app.get("/models")
+async def model_status() -> Dict[str, Any]:
+    """Loaded models, their resident sizes, the memory budget and recent load/evict events"""
+    return models.manager.status()
+
+@app.get("/admission")
+async def admission_status() -> Dict[str, Any]:
+    """Limits, running and queued computations, and mean queue wait of each workload class"""
+    return admission.stats()
+
+@app.get("/profiles")
+async def list_profiles(request: Request) -> Dict[str, Any]:
+    """Stored request profiles, newest first (needs the X-Profile token)"""
+    require_profile_token(request)
+    return {"profiles": profiler.list()}
+
+@app.get("/profiles/{profile_id}/{artifact}")
+async def download_profile(profile_id: str, artifact: str, request: Request) -> FileResponse:
+    """One artifact of a stored profile: stacks.folded, torch_trace.json, torch_ops.txt or profile.json"""
+    require_profile_token(request)
+    path = profiler.artifact_path(profile_id, artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile or artifact not found")
+    return FileResponse(path, media_type=ARTIFACTS[artifact], filename=f"{profile_id}_{artifact}")
+
+@app.post("/transcribe")
+async def transcribe_file(request: Request, response: Response, file: UploadFile = File(...),
+                          pages: Optional[str] = Form(None)) -> Dict[str, Any]:
+    """
+    Transcribe an uploaded file, or only the pages/slides in `pages` (e.g.
+    "1-20" or "21-40,45"). The response gives the page count and where each
+    page starts and ends in the transcript.
+    """
+    _, file_extension = upload_media_type(file)
+    deadline = request_deadline(request)
+    profile = request_profile(request, response, "transcribe")
     
     temp_file_path = None
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}") as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        temp_file_path, file_digest = await save_upload(file, f".{file_extension}")
+        flight_key = profile_key(f"{file_digest}:{file_extension}:{pages}", profile)
+        source_path = temp_file_path
         
-        transcriber = Transcriber(temp_file_path)
-        transcript = runner(transcriber, media_type)
+        def transcribe(cancel_token) -> Dict[str, Any]:
+            transcriber = Transcriber(source_path, page_cache=segment_cache.namespace("transcripts"),
+                                      page_range=pages, cancel_token=cancel_token)
+            return transcriber.transcribe_pages()
         
-        if isinstance(transcript, list):
-            transcript = ' '.join(transcript)
+        workload = "transcribe-image" if file_extension in IMAGE_TYPES else "transcribe-doc"
+        # The flight owns the upload from here: the transcriber removes it when
+        # it is done, even if this request has gone away by then, on_abandon if
+        # the computation never starts, and on_join if this request joins one
+        temp_file_path = None
+        result = await transcribe_flight.do(flight_key, profiled(transcribe, profile), deadline=deadline,
+                                            is_disconnected=request.is_disconnected, workload=workload,
+                                            on_abandon=lambda: remove_temp_file(source_path),
+                                            on_join=lambda: remove_temp_file(source_path))
+        transcript = result["transcript"]
         
-        save_debug_file('latest_transcript.txt', transcript)
+        trace = tracer.start_trace("transcribe")
+        if trace:
+            trace.write('transcript.txt', transcript)
         
         return {
             "success": True,
             "transcript": transcript,
             "file_type": file.content_type,
+            "page_count": result["page_count"],
+            "page_range": pages,
+            "pages": result["pages"],
             "message": "File transcribed successfully"
         }
     
+    except PageRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Cancelled as e:
+        raise cancelled_error(e)
+    except ProfilerBusy as e:
+        raise profiler_busy_error(e)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         # Log the actual error for debugging
         print(f"Error during transcription: {str(e)}")
@@ -76,28 +425,126 @@ async def transcribe_file(file: UploadFile = File(...)) -> Dict[str, Any]:
         )
     
     finally:
-        # Safely clean up the temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except OSError as e:
-                print(f"Warning: Could not delete temporary file {temp_file_path}: {e}")
+        remove_temp_file(temp_file_path)
+
+def ndjson_line(record: Dict[str, Any]) -> str:
+    return json.dumps(record) + "\n"
+
+@app.post("/transcribe/stream")
+async def transcribe_file_stream(request: Request, file: UploadFile = File(...),
+                                 pages: Optional[str] = Form(None)) -> StreamingResponse:
+    """
+    Transcribe an upload as NDJSON: one record per page, slide or image as
+    soon as it is extracted, then a summary record. Errors before the first
+    record get a status code; later ones end the stream with an error record.
+    """
+    _, file_extension = upload_media_type(file)
+    cancel_token = CancellationToken(request_deadline(request))
+    workload = "transcribe-image" if file_extension in IMAGE_TYPES else "transcribe-doc"
+    start = time.perf_counter()
+    
+    temp_file_path, _ = await save_upload(file, f".{file_extension}")
+    transcriber = Transcriber(temp_file_path, page_cache=segment_cache.namespace("transcripts"),
+                              page_range=pages, cancel_token=cancel_token)
+    records = transcriber.iter_page_records()
+    # Closed when the stream ends: the slot is released, then the records
+    # generator (in a thread, it stores the extracted pages) and the temp file
+    resources = AsyncExitStack()
+    resources.callback(remove_temp_file, temp_file_path)
+    resources.push_async_callback(run_in_threadpool, records.close)
+    
+    try:
+        try:
+            await resources.enter_async_context(admission.slot(workload, cancel_token))
+            # Extract the first page before responding, so a bad page range
+            # or unreadable file still gets an error status
+            first = await run_in_threadpool(next, records, None)
+        except BaseException:
+            await resources.aclose()
+            raise
+    except PageRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Cancelled as e:
+        raise cancelled_error(e)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        print(f"Error during transcription: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
+    
+    async def stream():
+        record = first
+        count = ocr_pages = cached_pages = 0
+        try:
+            while record is not None:
+                yield ndjson_line(dict(type="page", index=count, **record))
+                count += 1
+                ocr_pages += record["ocr"]
+                cached_pages += record["cached"]
+                record = await run_in_threadpool(next, records, None)
+            yield ndjson_line({
+                "type": "summary",
+                "file_type": file.content_type,
+                "page_count": transcriber.page_count,
+                "page_range": pages,
+                "pages": count,
+                "ocr_pages": ocr_pages,
+                "cached_pages": cached_pages,
+                "seconds": round(time.perf_counter() - start, 4)
+            })
+        except Cancelled as e:
+            yield ndjson_line({"type": "error", "status": cancelled_error(e).status_code, "detail": str(e)})
+        except Exception as e:
+            print(f"Error during transcription: {str(e)}")
+            yield ndjson_line({"type": "error", "status": 500, "detail": f"Error processing file: {str(e)}"})
+        finally:
+            await resources.aclose()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 @app.post("/summarize")
-async def summarize_text(data: Dict[str, str]) -> Dict[str, Any]:
+async def summarize_text(data: Dict[str, Any], request: Request, response: Response) -> Dict[str, Any]:
     text = data.get("text", "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="No text provided for summarization")
+    refresh = parse_flag(data, "refresh")
+    deadline = request_deadline(request)
+    profile = request_profile(request, response, "summarize")
     
-    try:
-        important_words, summary_paragraph = get_keywords(text, save_debug_files=True)
+    digest = document_digest(text)
+    if not refresh and profile is None:
+        stored = await run_in_threadpool(question_bank.get, digest, "summary", {}, SUMMARIZER_VERSION)
+        if stored:
+            return dict(stored, cached=True, document_id=digest)
+    
+    def summarize(cancel_token) -> Dict[str, Any]:
+        important_words, summary_paragraph = get_keywords(text)
         
-        return {
+        trace = tracer.start_trace("summarize")
+        if trace:
+            trace.write('trans.txt', text)
+            trace.write('summ.txt', summary_paragraph)
+        
+        response = {
             "success": True,
             "important_words": important_words,
             "summary": summary_paragraph,
             "message": "Text summarized successfully"
         }
+        question_bank.put(text, "summary", {}, SUMMARIZER_VERSION, response)
+        return response
+    
+    try:
+        result = await summarize_flight.do(profile_key(f"{digest}:{SUMMARIZER_VERSION}", profile),
+                                           profiled(summarize, profile), deadline=deadline,
+                                           is_disconnected=request.is_disconnected, workload="summarize")
+        return dict(result, cached=False, document_id=digest)
+    except Cancelled as e:
+        raise cancelled_error(e)
+    except ProfilerBusy as e:
+        raise profiler_busy_error(e)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error during summarization: {str(e)}")
         raise HTTPException(
@@ -106,69 +553,120 @@ async def summarize_text(data: Dict[str, str]) -> Dict[str, Any]:
         )
 
 @app.post("/generate-subjective-questions")
-async def generate_subjective_questions(data: Dict[str, Any]) -> Dict[str, Any]:
+async def generate_subjective_questions(data: Dict[str, Any], request: Request,
+                                        response: Response) -> Dict[str, Any]:
     text = data.get("text", "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="No text provided for question generation")
     
     num_questions = data.get("num_questions", 10)
     answer_style = data.get("answer_style", "all")
-    use_evaluator = data.get("use_evaluator", True)
+    use_evaluator = parse_flag(data, "use_evaluator", default=True)
+    decoding_profile = data.get("decoding_profile", "quality")
+    time_budget = data.get("time_budget")
+    candidate_multiple = data.get("candidate_multiple", 3)
+    incremental = parse_flag(data, "incremental")
+    score_threshold = data.get("score_threshold", 0.0)
+    max_candidates = data.get("max_candidates")
+    dedup_threshold = data.get("dedup_threshold", DEFAULT_DEDUP_THRESHOLD)
+    context_window = data.get("context_window")
+    context_tokens = data.get("context_tokens")
+    generator_tier = data.get("generator_tier", DEFAULT_GENERATOR_TIER)
+    refresh = parse_flag(data, "refresh")
     
-    try:
-        save_debug_file('subjective_input.txt', 
-                       f"Questions: {num_questions}\nStyle: {answer_style}\nEvaluator: {use_evaluator}\n"
-                       f"{'='*50}\n{text}")
-        
-        qg = QuestionGenerator()
-        qa_list = qg.generate(
-            article=text,
-            use_evaluator=use_evaluator,
-            num_questions=num_questions,
-            answer_style=answer_style
-        )
+    validate_generation(num_questions, answer_style, max_candidates)
+    validate_candidate_selection(candidate_multiple, score_threshold)
+    validate_decoding(decoding_profile, time_budget)
+    validate_dedup_threshold(dedup_threshold)
+    validate_context(context_window, context_tokens)
+    generator, model_names, refine_multiple = generator_models(generator_tier, use_evaluator)
+    deadline = request_deadline(request)
+    profile = request_profile(request, response, "subjective")
+    
+    # Everything except time_budget: only complete runs are stored, so the
+    # budget never changes a stored result
+    bank_params = {
+        "num_questions": num_questions,
+        "answer_style": answer_style,
+        "use_evaluator": use_evaluator,
+        "decoding_profile": decoding_profile,
+        "candidate_multiple": candidate_multiple,
+        "incremental": incremental,
+        "score_threshold": score_threshold,
+        "max_candidates": max_candidates,
+        "dedup_threshold": dedup_threshold,
+        "context_window": context_window,
+        "context_tokens": context_tokens,
+        "generator_tier": generator_tier,
+    }
+    model_version = models.model_version(*model_names)
+    digest = document_digest(text)
+    if not refresh and profile is None:
+        stored = await run_in_threadpool(question_bank.get, digest, "subjective", bank_params, model_version)
+        if stored:
+            return dict(stored, cached=True, document_id=digest)
+    
+    def generate(cancel_token) -> Dict[str, Any]:
+        trace = tracer.start_trace("subjective")
+        if trace:
+            trace.write('subjective_input.txt',
+                        f"Questions: {num_questions}\nStyle: {answer_style}\nEvaluator: {use_evaluator}\n"
+                        f"{'='*50}\n{text}")
         
-        formatted_questions = {}
-        for i, qa_pair in enumerate(qa_list, 1):
-            question = qa_pair['question']
-            answer = qa_pair['answer']
-            
-            if isinstance(answer, list):
-                options = [option['answer'] for option in answer]
-                correct_answer = next((opt['answer'] for opt in answer if opt['correct']), options[0])
-                
-                formatted_questions[i] = {
-                    "question": question,
-                    "answer": correct_answer,
-                    "options": options,
-                    "type": "multiple_choice"
-                }
-            else:
-                formatted_questions[i] = {
-                    "question": question,
-                    "answer": answer,
-                    "options": [],
-                    "type": "subjective"
-                }
-        
-        debug_content = f"Generated {len(formatted_questions)} questions:\n{'='*50}\n"
-        for i, q_data in formatted_questions.items():
-            debug_content += f"Q{i} ({q_data['type']}): {q_data['question']}\nA: {q_data['answer']}\n"
-            if q_data['options']:
-                debug_content += f"Options: {q_data['options']}\n"
-            debug_content += "-" * 30 + "\n"
-        
-        save_debug_file('subjective_questions.txt', debug_content)
+        with models.manager.use(generator) as qg:
+            qa_list, decoding_info = qg.generate(
+                article=text,
+                use_evaluator=use_evaluator,
+                num_questions=num_questions,
+                answer_style=answer_style,
+                decoding_profile=decoding_profile,
+                time_budget=time_budget,
+                candidate_multiple=candidate_multiple,
+                incremental=incremental,
+                score_threshold=score_threshold,
+                max_candidates=max_candidates,
+                dedup_threshold=dedup_threshold,
+                context_window=context_window,
+                context_tokens=context_tokens,
+                refine_multiple=refine_multiple,
+                with_info=True,
+                cancel_token=cancel_token
+            )
         
-        return {
+        formatted_questions = format_subjective_questions(qa_list)
+        
+        if trace:
+            trace_subjective_questions(trace, formatted_questions)
+        
+        response = {
             "success": True,
             "questions": formatted_questions,
             "total_questions": len(formatted_questions),
             "answer_style": answer_style,
             "used_evaluator": use_evaluator,
+            "generator_tier": generator_tier,
+            "decoding": decoding_info,
+            "model_version": model_version,
             "message": f"Generated {len(formatted_questions)} subjective questions"
         }
+        if not decoding_info["stopped_early"]:
+            question_bank.put(text, "subjective", bank_params, model_version, response,
+                              list(formatted_questions.values()))
+        return response
     
+    try:
+        # time_budget is part of the key: a shorter budget can cut the run short
+        flight_key = profile_key(f"{digest}:{params_key(bank_params)}:{time_budget}:{model_version}", profile)
+        result = await subjective_flight.do(flight_key, profiled(generate, profile), deadline=deadline,
+                                            is_disconnected=request.is_disconnected, workload="subjective")
+        return dict(result, cached=False, document_id=digest)
+    
+    except Cancelled as e:
+        raise cancelled_error(e)
+    except ProfilerBusy as e:
+        raise profiler_busy_error(e)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error generating subjective questions: {str(e)}")
         raise HTTPException(
@@ -176,38 +674,212 @@ async def generate_subjective_questions(data: Dict[str, Any]) -> Dict[str, Any]:
             detail=f"Error generating questions: {str(e)}"
         )
 
+@app.post("/generate-subjective-questions/file")
+async def generate_subjective_questions_from_file(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    num_questions: int = Form(10),
+    answer_style: str = Form("all"),
+    use_evaluator: bool = Form(True),
+    decoding_profile: str = Form("quality"),
+    time_budget: Optional[float] = Form(None),
+    candidates_per_segment: int = Form(DEFAULT_STREAM_CANDIDATES_PER_SEGMENT),
+    max_candidates: Optional[int] = Form(None),
+    dedup_threshold: float = Form(DEFAULT_DEDUP_THRESHOLD),
+    context_window: Optional[int] = Form(None),
+    context_tokens: Optional[int] = Form(None),
+    generator_tier: str = Form(DEFAULT_GENERATOR_TIER),
+    pages: Optional[str] = Form(None),
+) -> Dict[str, Any]:
+    """
+    Generate subjective questions straight from an uploaded file. Pages are
+    streamed through segmentation, generation and scoring, so the transcript
+    is never materialized and memory does not grow with the document length.
+    `pages` restricts generation to a page range, e.g. one chapter.
+    """
+    _, file_extension = upload_media_type(file)
+    validate_generation(num_questions, answer_style, max_candidates)
+    validate_decoding(decoding_profile, time_budget)
+    # Form fields cannot be null, so 0 turns deduplication off
+    dedup_threshold = dedup_threshold or None
+    validate_dedup_threshold(dedup_threshold)
+    validate_context(context_window, context_tokens)
+    generator, model_names, refine_multiple = generator_models(generator_tier, use_evaluator)
+    deadline = request_deadline(request)
+    profile = request_profile(request, response, "subjective_file")
+    model_version = models.model_version(*model_names)
+    stream_params = {
+        "num_questions": num_questions,
+        "answer_style": answer_style,
+        "use_evaluator": use_evaluator,
+        "decoding_profile": decoding_profile,
+        "time_budget": time_budget,
+        "candidates_per_segment": candidates_per_segment,
+        "max_candidates": max_candidates,
+        "dedup_threshold": dedup_threshold,
+        "context_window": context_window,
+        "context_tokens": context_tokens,
+        "generator_tier": generator_tier,
+        "pages": pages,
+    }
+    
+    temp_file_path = None
+    try:
+        temp_file_path, file_digest = await save_upload(file, f".{file_extension}")
+        flight_key = profile_key(f"{file_digest}:{file_extension}:{params_key(stream_params)}:{model_version}",
+                                 profile)
+        source_path = temp_file_path
+        
+        def generate(cancel_token) -> Dict[str, Any]:
+            trace = tracer.start_trace("subjective_file")
+            if trace:
+                trace.write('subjective_input.txt',
+                            f"File: {file.filename} ({file.content_type})\nQuestions: {num_questions}\n"
+                            f"Style: {answer_style}\nEvaluator: {use_evaluator}\n")
+            
+            page_texts = Transcriber(
+                source_path, page_cache=segment_cache.namespace("transcripts"), page_range=pages,
+                cancel_token=cancel_token
+            ).iter_pages()
+            try:
+                with models.manager.use(generator) as qg:
+                    qa_list, decoding_info = qg.generate_stream(
+                        page_texts,
+                        use_evaluator=use_evaluator,
+                        num_questions=num_questions,
+                        answer_style=answer_style,
+                        decoding_profile=decoding_profile,
+                        time_budget=time_budget,
+                        candidates_per_segment=candidates_per_segment or None,
+                        max_candidates=max_candidates,
+                        dedup_threshold=dedup_threshold,
+                        context_window=context_window,
+                        context_tokens=context_tokens,
+                        refine_multiple=refine_multiple,
+                        with_info=True,
+                        cancel_token=cancel_token
+                    )
+            finally:
+                page_texts.close()
+                remove_temp_file(source_path)
+            
+            formatted_questions = format_subjective_questions(qa_list)
+            if trace:
+                trace_subjective_questions(trace, formatted_questions)
+            
+            return {
+                "success": True,
+                "questions": formatted_questions,
+                "total_questions": len(formatted_questions),
+                "answer_style": answer_style,
+                "used_evaluator": use_evaluator,
+                "generator_tier": generator_tier,
+                "file_type": file.content_type,
+                "page_range": pages,
+                "decoding": decoding_info,
+                "model_version": model_version,
+                "message": f"Generated {len(formatted_questions)} subjective questions"
+            }
+        
+        # The flight owns the upload from here: the generation removes it when
+        # it is done, even if this request has gone away by then, on_abandon if
+        # the computation never starts, and on_join if this request joins one
+        temp_file_path = None
+        return await subjective_file_flight.do(flight_key, profiled(generate, profile), deadline=deadline,
+                                               is_disconnected=request.is_disconnected, workload="subjective",
+                                               on_abandon=lambda: remove_temp_file(source_path),
+                                               on_join=lambda: remove_temp_file(source_path))
+    
+    except Cancelled as e:
+        raise cancelled_error(e)
+    except ProfilerBusy as e:
+        raise profiler_busy_error(e)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error generating subjective questions from file: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating questions: {str(e)}"
+        )
+    
+    finally:
+        remove_temp_file(temp_file_path)
+
 @app.post("/generate-questions")
-async def generate_questions(data: Dict[str, Any]) -> Dict[str, Any]:
+async def generate_questions(data: Dict[str, Any], request: Request, response: Response) -> Dict[str, Any]:
     text = data.get("text", "").strip()
     if not text:
         raise HTTPException(status_code=400, detail="No text provided for question generation")
     
     num_questions = data.get("num_questions", 5)
     num_options = data.get("num_options", 4)
+    dedup_threshold = data.get("dedup_threshold", DEFAULT_DEDUP_THRESHOLD)
+    refresh = parse_flag(data, "refresh")
+    validate_dedup_threshold(dedup_threshold)
+    deadline = request_deadline(request)
+    profile = request_profile(request, response, "objective")
     
-    try:
-        save_debug_file('objective_input.txt', 
-                       f"Questions: {num_questions}\nOptions: {num_options}\n"
-                       f"{'='*50}\n{text}")
-        
-        questions_dict = text_to_questions(text, num_questions, num_options)
+    bank_params = {"num_questions": num_questions, "num_options": num_options, "dedup_threshold": dedup_threshold}
+    model_version = models.model_version("ner_tagger", "glove")
+    digest = document_digest(text)
+    if not refresh and profile is None:
+        stored = await run_in_threadpool(question_bank.get, digest, "objective", bank_params, model_version)
+        if stored:
+            return dict(stored, cached=True, document_id=digest)
+    
+    def generate(cancel_token) -> Dict[str, Any]:
+        trace = tracer.start_trace("objective")
+        if trace:
+            trace.write('objective_input.txt',
+                        f"Questions: {num_questions}\nOptions: {num_options}\n"
+                        f"{'='*50}\n{text}")
         
-        debug_content = f"Generated {len(questions_dict)} questions:\n{'='*50}\n"
-        for i, q_data in questions_dict.items():
-            debug_content += f"Q{i}: {q_data.get('question', 'N/A')}\n"
-            debug_content += f"A: {q_data.get('answer', 'N/A')}\n"
-            debug_content += f"Options: {q_data.get('options', [])}\n"
-            debug_content += "-" * 30 + "\n"
+        with models.manager.use("ner_tagger") as ner_tagger, models.manager.use("glove") as glove_model:
+            questions_dict = text_to_questions(
+                text, num_questions, num_options,
+                ner_tagger=ner_tagger,
+                glove_model=glove_model,
+                entity_cache=models.get_entity_cache(),
+                dedup_threshold=dedup_threshold,
+                cancel_token=cancel_token
+            )
         
-        save_debug_file('objective_questions.txt', debug_content)
+        if trace:
+            debug_content = f"Generated {len(questions_dict)} questions:\n{'='*50}\n"
+            for i, q_data in questions_dict.items():
+                debug_content += f"Q{i}: {q_data.get('question', 'N/A')}\n"
+                debug_content += f"A: {q_data.get('answer', 'N/A')}\n"
+                debug_content += f"Options: {q_data.get('options', [])}\n"
+                debug_content += "-" * 30 + "\n"
+            trace.write('objective_questions.txt', debug_content)
         
-        return {
+        response = {
             "success": True,
             "questions": questions_dict,
             "total_questions": len(questions_dict),
+            "model_version": model_version,
             "message": f"Generated {len(questions_dict)} objective questions"
         }
+        question_bank.put(text, "objective", bank_params, model_version, response,
+                          [dict(q, type="multiple_choice") for q in questions_dict.values()])
+        return response
+    
+    try:
+        result = await objective_flight.do(profile_key(f"{digest}:{params_key(bank_params)}:{model_version}", profile),
+                                           profiled(generate, profile), deadline=deadline,
+                                           is_disconnected=request.is_disconnected, workload="objective")
+        return dict(result, cached=False, document_id=digest)
     
+    except Cancelled as e:
+        raise cancelled_error(e)
+    except ProfilerBusy as e:
+        raise profiler_busy_error(e)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"Error generating objective questions: {str(e)}")
         raise HTTPException(
@@ -215,6 +887,50 @@ async def generate_questions(data: Dict[str, Any]) -> Dict[str, Any]:
             detail=f"Error generating questions: {str(e)}"
         )
 
+def bank_unavailable(e: sqlite3.Error) -> HTTPException:
+    print(f"Error reading question bank: {str(e)}")
+    return HTTPException(status_code=503, detail=f"Question bank unavailable: {str(e)}")
+
+@app.get("/question-bank/documents")
+async def list_bank_documents(limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                              offset: int = Query(0, ge=0)) -> Dict[str, Any]:
+    """Stored documents, newest first, with their question counts"""
+    try:
+        return await run_in_threadpool(question_bank.documents, limit=limit, offset=offset)
+    except sqlite3.Error as e:
+        raise bank_unavailable(e)
+
+@app.get("/question-bank/documents/{document_id}")
+async def get_bank_document(document_id: str) -> Dict[str, Any]:
+    """A stored document and the summaries/question sets recorded for it"""
+    try:
+        document = await run_in_threadpool(question_bank.document, document_id)
+    except sqlite3.Error as e:
+        raise bank_unavailable(e)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found in the question bank")
+    return document
+
+@app.get("/question-bank/questions")
+async def search_bank_questions(document_id: Optional[str] = None,
+                                topic: Optional[str] = None,
+                                kind: Optional[str] = None,
+                                question_type: Optional[str] = Query(None, alias="type"),
+                                limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+                                offset: int = Query(0, ge=0)) -> Dict[str, Any]:
+    """Filter stored questions by document, topic words, kind and type, one page at a time"""
+    try:
+        page = await run_in_threadpool(
+            question_bank.search_questions,
+            digest=document_id, topic=topic, kind=kind, question_type=question_type, limit=limit, offset=offset
+        )
+    except InvalidQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.Error as e:
+        raise bank_unavailable(e)
+    page.update({"limit": limit, "offset": offset})
+    return page
+
 
 if __name__ == "__main__":
     import uvicorn
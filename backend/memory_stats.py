@@ -0,0 +1,56 @@
+"""
+Per-process memory breakdown from /proc (Linux only)
+"""
+import os
+from typing import Dict, Iterable, List, Union
+
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty", "Swap")
+
+
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, float]:
+    """
+    Return the memory of a process in MB, split into pages it shares with
+    other processes and pages that are unique to it
+
+    Args:
+        pid: Process id, or "self" for the current process
+
+    Returns:
+        Dict with rss, pss, shared and unique (all MB); empty if /proc is unavailable
+    """
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as smaps:
+            for line in smaps:
+                parts = line.split()
+                key = parts[0].rstrip(":")
+                if key in SMAPS_FIELDS:
+                    values[key] = int(parts[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        return {}
+
+    return {
+        "pid": os.getpid() if pid == "self" else int(pid),
+        "rss_mb": round(values.get("Rss", 0.0), 1),
+        "pss_mb": round(values.get("Pss", 0.0), 1),
+        "shared_mb": round(values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0), 1),
+        "unique_mb": round(values.get("Private_Clean", 0.0) + values.get("Private_Dirty", 0.0), 1),
+    }
+
+
+def memory_report(pids: Iterable[int]) -> List[Dict[str, float]]:
+    return [stats for stats in (process_memory(pid) for pid in pids) if stats]
+
+
+def format_report(report: List[Dict[str, float]]) -> str:
+    lines = [f"{'pid':>8} {'rss MB':>10} {'pss MB':>10} {'shared MB':>10} {'unique MB':>10}"]
+    for stats in report:
+        lines.append(
+            f"{stats['pid']:>8} {stats['rss_mb']:>10} {stats['pss_mb']:>10} "
+            f"{stats['shared_mb']:>10} {stats['unique_mb']:>10}"
+        )
+    if report:
+        total_unique = sum(s["unique_mb"] for s in report)
+        total_pss = sum(s["pss_mb"] for s in report)
+        lines.append(f"Total unique: {total_unique:.1f} MB, total proportional (PSS): {total_pss:.1f} MB")
+    return "\n".join(lines)
@@ -0,0 +1,360 @@
+"""
+Process-wide model manager shared by all requests
+
+Models are registered with a loader and loaded on first use. When a memory
+budget is configured (MODEL_MEMORY_BUDGET_MB), the least recently used idle
+models are evicted once the resident total goes over it, so nodes that mostly
+serve /transcribe and /summarize never hold the NLP models at all.
+
+When serving with pre-forked workers (see serve.py), preload() and
+freeze() are called in the parent so every worker shares the same physical
+pages copy-on-write. Leave the budget unset in that mode: evicting a shared
+model in one worker frees nothing.
+"""
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from memory_stats import process_memory
+from metrics import cache_lookup, gauge
+
+MEMORY_BUDGET_ENV = "MODEL_MEMORY_BUDGET_MB"
+MAX_EVENTS = 200
+
+# Models behind the default request parameters (base generator tier and the
+# objective pipeline); optional tiers such as question_generator_small stay
+# lazy unless they are preloaded explicitly
+DEFAULT_SERVING_MODELS = ["question_generator", "qa_evaluator", "spacy_sm", "ner_tagger", "glove"]
+
+
+class ModelEntry:
+    def __init__(self, model: Any, size_mb: float) -> None:
+        self.model = model
+        self.size_mb = size_mb
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.uses = 0
+        self.active = 0
+
+
+class ModelManager:
+    def __init__(self, budget_mb: Optional[float] = None) -> None:
+        self.budget_mb = budget_mb
+        self._loaders = {}
+        self._versions = {}
+        self._entries = OrderedDict()  # least recently used first
+        self._events = deque(maxlen=MAX_EVENTS)
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any],
+                 version: Union[str, Callable[[], str], None] = None) -> None:
+        """
+        Register (or replace) the loader for a model; loading is deferred to first use
+
+        Args:
+            name: Model name used with get() and use()
+            loader: Callable returning the loaded model
+            version: Identifier of the weights the loader produces, or a
+                callable returning it, recorded with stored results
+                (default: the model name)
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._versions[name] = version
+            if name in self._entries:
+                self._evict(name, "replaced")
+
+    def get(self, name: str) -> Any:
+        """Return a model, loading it on first use"""
+        return self._acquire(name, pin=False).model
+
+    @contextmanager
+    def use(self, name: str):
+        """Hold a model for the duration of a block so it cannot be evicted"""
+        entry = self._acquire(name, pin=True)
+        try:
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.active -= 1
+
+    def _acquire(self, name: str, pin: bool) -> ModelEntry:
+        # A pinned entry is counted active under the same lock acquisition
+        # that finds or stores it, so a concurrent load cannot evict it first
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._touch(name, entry, pin)
+                cache_lookup("models", hit=True)
+                return entry
+
+        cache_lookup("models", hit=False)
+        # Loads are serialised so an RSS delta fallback is attributed to one model
+        with self._load_lock:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    self._touch(name, entry, pin)
+                    return entry
+                if name not in self._loaders:
+                    raise KeyError(f"Unknown model {name}")
+                loader = self._loaders[name]
+
+            print(f"Loading model: {name}")
+            rss_before = process_memory().get("rss_mb", 0.0)
+            start = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - start
+            size_mb = model_size_mb(model)
+            if size_mb is None:
+                size_mb = max(0.0, process_memory().get("rss_mb", 0.0) - rss_before)
+
+            with self._lock:
+                entry = ModelEntry(model, size_mb)
+                self._entries[name] = entry
+                self._touch(name, entry, pin)
+                self._record("load", name, size_mb, load_seconds=round(load_seconds, 2))
+                self._enforce_budget(keep=name)
+            return entry
+
+    def evict(self, name: str) -> bool:
+        with self._lock:
+            if name not in self._entries:
+                return False
+            self._evict(name, "manual")
+            return True
+
+    def version(self, name: str) -> str:
+        """Version of a registered model, available without loading it"""
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model {name}")
+            version = self._versions.get(name)
+        if callable(version):
+            version = version()
+        return version or name
+
+    def loaded(self) -> List[str]:
+        with self._lock:
+            return list(self._entries)
+
+    def resident_mb(self) -> float:
+        with self._lock:
+            return sum(entry.size_mb for entry in self._entries.values())
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_mb": self.budget_mb,
+                "resident_mb": round(self.resident_mb(), 1),
+                "registered": list(self._loaders),
+                "loaded": [
+                    {
+                        "name": name,
+                        "size_mb": round(entry.size_mb, 1),
+                        "loaded_at": entry.loaded_at,
+                        "last_used": entry.last_used,
+                        "uses": entry.uses,
+                        "active": entry.active,
+                    }
+                    for name, entry in self._entries.items()
+                ],
+                "events": list(self._events),
+            }
+
+    def _touch(self, name: str, entry: ModelEntry, pin: bool = False) -> None:
+        entry.last_used = time.time()
+        entry.uses += 1
+        if pin:
+            entry.active += 1
+        self._entries.move_to_end(name)
+
+    def _record(self, event: str, name: str, size_mb: float, **details) -> None:
+        record = {"time": time.time(), "event": event, "model": name, "size_mb": round(size_mb, 1)}
+        record.update(details)
+        self._events.append(record)
+
+    def _evict(self, name: str, reason: str) -> None:
+        entry = self._entries.pop(name)
+        self._record("evict", name, entry.size_mb, reason=reason)
+        print(f"Evicted model: {name} ({reason})")
+        del entry
+        gc.collect()
+
+    def _enforce_budget(self, keep: str) -> None:
+        if self.budget_mb is None:
+            return
+        for name in list(self._entries):
+            if self.resident_mb() <= self.budget_mb:
+                break
+            entry = self._entries[name]
+            if name != keep and entry.active == 0:
+                self._evict(name, "budget")
+
+
+# Attributes holding the torch modules of the pipeline wrappers
+TORCH_MODULE_ATTRS = ("qg_model", "qae_model")
+
+
+def _tensor_bytes(value: Any, seen: set) -> int:
+    """Bytes of the tensors in a state dict value (quantized layers hold tuples of packed tensors)"""
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item, seen) for item in value)
+    if not hasattr(value, "element_size"):
+        return 0
+    # Tied weights are counted once
+    key = (value.data_ptr(), value.numel())
+    if key in seen:
+        return 0
+    seen.add(key)
+    return value.numel() * value.element_size()
+
+
+def model_size_mb(model: Any) -> Optional[float]:
+    """
+    Size of a model's weights: parameter and buffer bytes of its torch modules,
+    or the array bytes of word vectors. Unlike an RSS delta it is not inflated
+    by allocations of concurrent requests. None when neither applies.
+    """
+    modules = [getattr(model, attr) for attr in TORCH_MODULE_ATTRS if getattr(model, attr, None) is not None]
+    if hasattr(model, "state_dict"):
+        modules.append(model)
+    if modules:
+        seen = set()
+        return sum(_tensor_bytes(value, seen) for module in modules
+                   for value in module.state_dict(keep_vars=True).values()) / (1 << 20)
+    vectors = getattr(model, "vectors", None)
+    if hasattr(vectors, "nbytes"):
+        return vectors.nbytes / (1 << 20)
+    return None
+
+
+def _budget_from_env() -> Optional[float]:
+    value = os.environ.get(MEMORY_BUDGET_ENV)
+    return float(value) if value else None
+
+
+manager = ModelManager(_budget_from_env())
+gauge("study_models_resident_mb", "Estimated resident size of loaded models").set_function(manager.resident_mb)
+
+
+def _load_question_generator():
+    from sub_q_gen.questiongenerator import QuestionGenerator
+    from segment_cache import segment_cache
+    return QuestionGenerator(
+        qa_evaluator=lambda: manager.get("qa_evaluator"),
+        spacy_nlp=lambda: manager.get("spacy_sm"),
+        segment_cache=segment_cache,
+    )
+
+
+def _load_small_question_generator():
+    from sub_q_gen.profiles import SMALL_GENERATOR_MODEL
+    from sub_q_gen.questiongenerator import QuestionGenerator
+    from segment_cache import segment_cache
+    return QuestionGenerator(
+        qa_evaluator=lambda: manager.get("qa_evaluator"),
+        spacy_nlp=lambda: manager.get("spacy_sm"),
+        segment_cache=segment_cache,
+        model_name=SMALL_GENERATOR_MODEL,
+        refiner=lambda: manager.use("question_generator"),
+    )
+
+
+def _load_qa_evaluator():
+    from sub_q_gen.questiongenerator import QAEvaluator
+    return QAEvaluator()
+
+
+def _load_spacy_sm():
+    import en_core_web_sm
+    return en_core_web_sm.load()
+
+
+def _load_ner_tagger():
+    import spacy
+    return spacy.load('en_core_web_md')
+
+
+def _load_glove():
+    import gensim.downloader as api
+    return api.load("glove-wiki-gigaword-100")
+
+
+def _int8_version(model_name: str) -> Callable[[], str]:
+    def version():
+        from sub_q_gen.quantization import quantization_enabled
+        return f"{model_name}-int8" if quantization_enabled() else model_name
+    return version
+
+
+manager.register("question_generator", _load_question_generator,
+                 _int8_version("iarfmoose/t5-base-question-generator"))
+manager.register("question_generator_small", _load_small_question_generator,
+                 _int8_version("valhalla/t5-small-qa-qg-hl"))
+manager.register("qa_evaluator", _load_qa_evaluator, _int8_version("iarfmoose/bert-base-cased-qa-evaluator"))
+manager.register("spacy_sm", _load_spacy_sm, "en_core_web_sm")
+manager.register("ner_tagger", _load_ner_tagger, "en_core_web_md")
+manager.register("glove", _load_glove, "glove-wiki-gigaword-100")
+
+
+def get_question_generator():
+    """Shared T5 question generator; its BERT evaluator is loaded separately on demand"""
+    return manager.get("question_generator")
+
+
+def get_ner_tagger():
+    """Shared en_core_web_md pipeline used for objective questions"""
+    return manager.get("ner_tagger")
+
+
+def get_glove():
+    """Shared GloVe vectors used for distractor generation"""
+    return manager.get("glove")
+
+
+def model_version(*names: str) -> str:
+    """Combined version of the models behind a result, e.g. for the question bank"""
+    return "+".join(manager.version(name) for name in names)
+
+
+def get_entity_cache():
+    """Segment cache namespace for per-sentence entities of the current NER model"""
+    from segment_cache import segment_cache
+    return segment_cache.namespace(f"entities:{manager.version('ner_tagger')}")
+
+
+def preload(names: Optional[List[str]] = None) -> None:
+    """Load the named models (default: DEFAULT_SERVING_MODELS)"""
+    for name in (DEFAULT_SERVING_MODELS if names is None else names):
+        manager.get(name)
+
+
+def freeze() -> None:
+    """
+    Make the loaded models as read-only as possible so that forked workers
+    keep sharing their pages: put torch modules in eval mode without
+    gradients, and move every existing object into the permanent GC
+    generation so collections in the workers never write to their headers.
+    """
+    for name in manager.loaded():
+        model = manager.get(name)
+        for attr in ("qg_model", "qae_model"):
+            module = getattr(model, attr, None)
+            if module is None:
+                continue
+            module.eval()
+            for param in module.parameters():
+                param.requires_grad_(False)
+
+    gc.collect()
+    gc.freeze()
+
+
+def loaded_models() -> List[str]:
+    return manager.loaded()
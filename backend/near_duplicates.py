@@ -0,0 +1,106 @@
+"""
+Near-duplicate detection with MinHash signatures and LSH bucketing
+
+Texts are compared by the Jaccard similarity of their word sets. Each text
+gets a MinHash signature; the signature is cut into bands and texts sharing a
+band land in the same bucket. Only texts that share a bucket are compared
+exactly, so filtering n texts costs roughly O(n) instead of the O(n^2) of
+comparing every pair.
+
+    dedup = NearDuplicateFilter(threshold=0.8)
+    kept = [text for text in ranked_texts if dedup.add(text)]
+"""
+import re
+import zlib
+from typing import Hashable, Set, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERMUTATIONS = 120  # many divisors, so bands can be fitted to any threshold
+
+# Universal hashing (a * x + b) mod p over 31-bit values keeps every product
+# inside int64
+_PRIME = (1 << 31) - 1
+_MAX_HASH = np.int64(_PRIME)
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, _PRIME, size=NUM_PERMUTATIONS).astype(np.int64)
+_B = _rng.randint(0, _PRIME, size=NUM_PERMUTATIONS).astype(np.int64)
+
+
+def words(text: str) -> Set[str]:
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def minhash(tokens: Set[str]) -> np.ndarray:
+    """MinHash signature of a token set (stable across processes)"""
+    if not tokens:
+        return np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.int64)
+    hashes = np.array([zlib.crc32(token.encode("utf-8")) % _PRIME for token in tokens], dtype=np.int64)
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def lsh_bands(threshold: float, num_permutations: int = NUM_PERMUTATIONS) -> Tuple[int, int]:
+    """
+    Pick (bands, rows) with bands * rows == num_permutations whose LSH
+    S-curve, which rises steeply around (1 / bands) ** (1 / rows), is
+    centred below threshold: pairs at the threshold are then almost always
+    bucketed together, at the price of a few more exact comparisons
+    """
+    best = None
+    for rows in range(1, num_permutations + 1):
+        if num_permutations % rows:
+            continue
+        bands = num_permutations // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        error = abs(midpoint - (threshold - 0.15))
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateFilter:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD) -> None:
+        """
+        Args:
+            threshold: Word Jaccard similarity at or above which two texts
+                count as duplicates. 1.0 only drops texts with identical
+                word sets.
+        """
+        self.threshold = threshold
+        self.bands, self.rows = lsh_bands(threshold)
+        self._buckets = {}  # (group, band, band hash) -> indices into self._kept
+        self._kept = []  # word sets of the texts kept so far
+
+    def add(self, text: str, group: Hashable = None) -> bool:
+        """
+        Keep text unless it is a near duplicate of an earlier text in the same group
+
+        Returns:
+            True if the text was kept
+        """
+        tokens = words(text)
+        signature = minhash(tokens)
+        band_keys = [
+            (group, band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        if any(jaccard(tokens, self._kept[i]) >= self.threshold for i in candidates):
+            return False
+
+        index = len(self._kept)
+        self._kept.append(tokens)
+        for key in band_keys:
+            self._buckets.setdefault(key, []).append(index)
+        return True
+
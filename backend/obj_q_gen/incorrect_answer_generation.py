@@ -8,9 +8,9 @@ class IncorrectAnswerGenerator:
     given an answer
     '''
 
-    def __init__(self, document):
-        # model reququest.txtired to fetch similar words
-        self.model = api.load("glove-wiki-gigaword-100")
+    def __init__(self, document, model=None):
+        # model required to fetch similar words, shared when passed in
+        self.model = model if model is not None else api.load("glove-wiki-gigaword-100")
         self.all_words = []
         for sent in sent_tokenize(document):
             self.all_words.extend(word_tokenize(sent))
@@ -4,6 +4,9 @@ import spacy
 from nltk.corpus import stopwords
 from nltk.tokenize import sent_tokenize, word_tokenize
 from sklearn.feature_extraction.text import TfidfVectorizer
+from metrics import stage, count_items
+from near_duplicates import DEFAULT_THRESHOLD, NearDuplicateFilter
+from segment_cache import segment_key
 
 
 class QuestionExtractor:
@@ -12,14 +15,21 @@ class QuestionExtractor:
     a given document
     '''
 
-    def __init__(self, num_questions):
+    def __init__(self, num_questions, ner_tagger=None, entity_cache=None, dedup_threshold=DEFAULT_THRESHOLD):
         self.num_questions = num_questions
 
+        # word jaccard similarity at which two source sentences count as
+        # near duplicates (None: only skip identical sentences)
+        self.dedup_threshold = dedup_threshold
+
+        # per-sentence entities from earlier documents, keyed by sentence hash
+        self.entity_cache = entity_cache
+
         # hash set for fast lookup
         self.stop_words = set(stopwords.words('english'))
 
-        # named entity recognition tagger
-        self.ner_tagger = spacy.load('en_core_web_md')
+        # named entity recognition tagger, shared when passed in
+        self.ner_tagger = ner_tagger if ner_tagger is not None else spacy.load('en_core_web_md')
 
         self.vectorizer = TfidfVectorizer()
 
@@ -38,10 +48,14 @@ class QuestionExtractor:
             * dict
         '''
         # find candidate keywords
-        self.candidate_keywords = self.get_candidate_entities(document)
+        with stage("ner"):
+            self.candidate_keywords = self.get_candidate_entities(document)
+        count_items("ner", "entities", len(self.candidate_keywords))
 
         # set word scores before ranking candidate keywords
-        self.set_tfidf_scores(document)
+        with stage("tfidf"):
+            self.set_tfidf_scores(document)
+        count_items("tfidf", "sentences", len(self.unfiltered_sentences))
 
         # rank the keywords using calculated tf idf scores
         self.rank_keywords()
@@ -77,18 +91,33 @@ class QuestionExtractor:
     def get_candidate_entities(self, document):
         ''' Returns a list of entities according to spacy's ner tagger. These entities are candidates for the questions
 
+        Without an entity cache the tagger sees the whole document. With one
+        it runs sentence by sentence, so only sentences that were not seen
+        before are tagged
+
         Params:
                 * document : string
         Returns:
                 * list<str>
         '''
-        entities = self.ner_tagger(document)
-        entity_list = []
+        if self.entity_cache is None:
+            entities = self.ner_tagger(document)
+            return list(set(ent.text for ent in entities.ents))  # remove duplicates
+
+        sentences = sent_tokenize(document)
+        keys = [segment_key(sentence) for sentence in sentences]
+        cached = self.entity_cache.get_many(keys)
 
-        for ent in entities.ents:
-            entity_list.append(ent.text)
+        missing = [(key, sentence) for key, sentence in zip(keys, sentences) if key not in cached]
+        new_entities = {}
+        for (key, _), doc in zip(missing, self.ner_tagger.pipe(sentence for _, sentence in missing)):
+            new_entities[key] = [ent.text for ent in doc.ents]
+        self.entity_cache.put_many(new_entities)
+        count_items("ner", "sentences_tagged", len(missing))
 
-       
+        entity_list = []
+        for key in keys:
+            entity_list.extend(cached.get(key, new_entities.get(key, [])))
 
         return list(set(entity_list))  # remove duplicates
 
@@ -176,15 +205,18 @@ class QuestionExtractor:
         ''' Forms the question and populates
         the question dict
         '''
-        used_sentences = list()
+        # hash set for exact repeats, MinHash/LSH for near duplicates
+        used_sentences = set()
+        near_duplicates = NearDuplicateFilter(self.dedup_threshold) if self.dedup_threshold is not None else None
         idx = 0
         cntr = 1
         num_candidates = len(self.candidate_triples)
         while cntr <= self.num_questions and idx < num_candidates:
             candidate_triple = self.candidate_triples[idx]
+            sentence = candidate_triple[2]
 
-            if candidate_triple[2] not in used_sentences:
-                used_sentences.append(candidate_triple[2])
+            if sentence not in used_sentences and (near_duplicates is None or near_duplicates.add(sentence)):
+                used_sentences.add(sentence)
 
                 self.questions_dict[cntr] = {
                     "question": candidate_triple[2].replace(
@@ -2,30 +2,44 @@ from obj_q_gen.question_extraction import QuestionExtractor
 from obj_q_gen.incorrect_answer_generation import IncorrectAnswerGenerator
 import re
 from nltk import sent_tokenize
+from cancellation import check_cancelled
+from metrics import stage, count_items
+from near_duplicates import DEFAULT_THRESHOLD
 
 class QuestionGeneration:
     '''This class contains the method
     to generate questions
     '''
-    def __init__(self, num_questions, num_options):
+    def __init__(self, num_questions, num_options, ner_tagger=None, glove_model=None, entity_cache=None,
+                 dedup_threshold=DEFAULT_THRESHOLD, cancel_token=None):
         self.num_questions = num_questions
         self.num_options = num_options
-        self.question_extractor = QuestionExtractor(num_questions)
+        self.glove_model = glove_model
+
+        # checked between stages and questions, raises Cancelled once the
+        # request is gone or past its deadline
+        self.cancel_token = cancel_token
+        self.question_extractor = QuestionExtractor(num_questions, ner_tagger, entity_cache, dedup_threshold)
 
     def generate_questions_dict(self, document):
-        document = self.clean_text(document)
+        with stage("normalize"):
+            document = self.clean_text(document)
 
         self.questions_dict = self.question_extractor.get_questions_dict(document)
+        check_cancelled(self.cancel_token)
 
-        incorrect_answer_generator = IncorrectAnswerGenerator(document)
+        with stage("distractors"):
+            incorrect_answer_generator = IncorrectAnswerGenerator(document, self.glove_model)
 
-        for i in range(1, self.num_questions + 1):
-            if i not in self.questions_dict:
-                continue
-            self.questions_dict[i]["options"] = incorrect_answer_generator.get_all_options_dict(
-                self.questions_dict[i]["answer"],
-                self.num_options
-            )
+            for i in range(1, self.num_questions + 1):
+                if i not in self.questions_dict:
+                    continue
+                check_cancelled(self.cancel_token)
+                self.questions_dict[i]["options"] = incorrect_answer_generator.get_all_options_dict(
+                    self.questions_dict[i]["answer"],
+                    self.num_options
+                )
+        count_items("distractors", "questions", len(self.questions_dict))
 
         return self.questions_dict
 
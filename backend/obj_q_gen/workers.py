@@ -1,25 +1,13 @@
-import sys
-import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import traceback
 
-# Add the current directory to path to help with imports
-current_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.append(current_dir)
+from cancellation import Cancelled
+from near_duplicates import DEFAULT_THRESHOLD
 
-# Try different import methods
-try:
-    from obj_q_gen.question_generation_main import QuestionGeneration
-    print("Successfully imported QuestionGeneration from obj_q_gen")
-except ImportError:
-    try:
-        from question_generation_main import QuestionGeneration
-        print("Successfully imported QuestionGeneration directly")
-    except ImportError as e:
-        print(f"Failed to import QuestionGeneration: {e}")
-        QuestionGeneration = None
-
-def text_to_questions(text_content: str, num_questions: int = 5, num_options: int = 4) -> Dict[int, Dict[str, Any]]:
+def text_to_questions(text_content: str, num_questions: int = 5, num_options: int = 4,
+                      ner_tagger=None, glove_model=None, entity_cache=None,
+                      dedup_threshold: Optional[float] = DEFAULT_THRESHOLD,
+                      cancel_token=None) -> Dict[int, Dict[str, Any]]:
     """
     Convert text to questions with options
     
@@ -27,6 +15,15 @@ def text_to_questions(text_content: str, num_questions: int = 5, num_options: in
         text_content: The input text to generate questions from
         num_questions: Number of questions to generate (default: 5)
         num_options: Number of options per question (default: 4)
+        ner_tagger: Preloaded spaCy model to share (default: load en_core_web_md)
+        glove_model: Preloaded GloVe vectors to share (default: load glove-wiki-gigaword-100)
+        entity_cache: Segment cache namespace for per-sentence entities, so
+            unchanged sentences of an edited document are not tagged again
+        dedup_threshold: Word Jaccard similarity at which two source sentences
+            count as near duplicates, so only one question is asked about
+            them. None only skips identical sentences.
+        cancel_token: CancellationToken checked between stages and
+            questions; Cancelled is raised as is, not wrapped
     
     Returns:
         Dict with question data in format:
@@ -39,8 +36,12 @@ def text_to_questions(text_content: str, num_questions: int = 5, num_options: in
             ...
         }
     """
-    if QuestionGeneration is None:
-        raise Exception("QuestionGeneration class not available - import failed")
+    # Imported on first use: it pulls in spaCy, gensim, nltk and scikit-learn,
+    # which would slow down the API's start
+    try:
+        from obj_q_gen.question_generation_main import QuestionGeneration
+    except ImportError as e:
+        raise Exception(f"QuestionGeneration class not available - import failed: {e}")
         
     if not text_content or not text_content.strip():
         raise Exception("Empty text provided for question generation")
@@ -50,7 +51,8 @@ def text_to_questions(text_content: str, num_questions: int = 5, num_options: in
         print(f"Text length: {len(text_content)} characters")
         
         # Generate questions using your existing system
-        qGen = QuestionGeneration(num_questions, num_options)
+        qGen = QuestionGeneration(num_questions, num_options, ner_tagger, glove_model, entity_cache, dedup_threshold,
+                                  cancel_token)
         questions_dict = qGen.generate_questions_dict(text_content)
         
         print(f"Raw questions_dict keys: {list(questions_dict.keys())}")
@@ -94,6 +96,8 @@ def text_to_questions(text_content: str, num_questions: int = 5, num_options: in
         print(f"Successfully formatted {len(formatted_questions)} questions")
         return formatted_questions
         
+    except Cancelled:
+        raise
     except Exception as e:
         print(f"Error in text_to_questions: {str(e)}")
         print(f"Traceback: {traceback.format_exc()}")
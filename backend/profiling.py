@@ -0,0 +1,292 @@
+"""
+On-demand profiling of single requests
+
+A request sent with `X-Profile: <PROFILE_TOKEN>` is profiled while its
+computation runs: a sampler thread records the Python stack of the worker
+thread every PROFILE_INTERVAL seconds, and torch.profiler records the torch
+operators when torch is installed. The artifacts are written to
+PROFILE_DIR/<profile id>/:
+
+    stacks.folded     Collapsed stacks ("outer;inner;leaf count"), the input
+                      format of flamegraph.pl, speedscope and inferno
+    torch_trace.json  Chrome trace of the torch operators (chrome://tracing,
+                      Perfetto)
+    torch_ops.txt     Operator table sorted by self CPU time
+    profile.json      Endpoint, duration, sample count and hottest functions
+
+The response carries the profile id in the X-Profile-Id header, and /profiles
+lists and serves the artifacts to callers with the same token. Profiled
+requests run their own computation instead of joining an identical one, and
+skip the question bank. Requests without the header cost one header lookup.
+
+torch.profiler is process-wide, so one request is profiled at a time: while
+a profile is being captured, Profiler.start() and Profile.capture() raise
+ProfilerBusy (a 409 at the API) instead of starting another.
+
+Environment variables:
+    PROFILE_TOKEN: Token clients must send in X-Profile. Unset (the default)
+        disables profiling; the header is then rejected with 403
+    PROFILE_DIR: Output directory (default profiles)
+    PROFILE_INTERVAL: Seconds between stack samples (default 0.005)
+    PROFILE_MAX_PROFILES: Profiles kept before the oldest are deleted
+        (default 20)
+"""
+import hmac
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+ARTIFACTS = {
+    "stacks.folded": "text/plain",
+    "torch_trace.json": "application/json",
+    "torch_ops.txt": "text/plain",
+    "profile.json": "application/json",
+}
+TOP_FUNCTIONS = 25
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[a-z_-]+-[0-9a-f]{8}$")
+
+
+class ProfilerBusy(Exception):
+    """Another request is being profiled"""
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval"""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()  # "outer;...;leaf" -> samples
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                             .replace(";", ":"))
+                frame = frame.f_back
+            if self._stop.is_set():
+                # The thread is already waiting in stop()
+                break
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class Profile:
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+        self.directory = os.path.join(profiler.directory, self.id)
+
+    def wrap(self, function: Callable[..., Any]) -> Callable[..., Any]:
+        """function, profiled in whichever thread it runs in"""
+        def profiled(*args: Any) -> Any:
+            with self.capture():
+                return function(*args)
+        return profiled
+
+    @contextmanager
+    def capture(self):
+        """
+        Profile the calling thread for the duration of the block
+
+        Raises:
+            ProfilerBusy: Another profile is being captured
+        """
+        if not self.profiler._capturing.acquire(blocking=False):
+            raise ProfilerBusy("Another request is being profiled; retry when it has finished")
+        try:
+            with self._capture():
+                yield
+        finally:
+            self.profiler._capturing.release()
+
+    @contextmanager
+    def _capture(self):
+        torch_profile = _torch_profiler()
+        if torch_profile is not None:
+            torch_profile.__enter__()
+        try:
+            sampler = StackSampler(threading.get_ident(), self.profiler.interval).start()
+        except BaseException:
+            if torch_profile is not None:
+                torch_profile.__exit__(None, None, None)
+            raise
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = repr(e)
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            try:
+                if torch_profile is not None:
+                    torch_profile.__exit__(None, None, None)
+            finally:
+                sampler.stop()
+            try:
+                self._write(sampler, torch_profile, seconds, error)
+            except Exception as e:
+                print(f"Warning: Could not write profile {self.id}: {e}")
+
+    def _write(self, sampler: StackSampler, torch_profile: Any, seconds: float, error: Optional[str]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "stacks.folded"), 'w', encoding='utf-8') as f:
+            for stack, count in sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        artifacts = ["stacks.folded", "profile.json"]
+        if torch_profile is not None:
+            torch_profile.export_chrome_trace(os.path.join(self.directory, "torch_trace.json"))
+            with open(os.path.join(self.directory, "torch_ops.txt"), 'w', encoding='utf-8') as f:
+                f.write(torch_profile.key_averages().table(sort_by="self_cpu_time_total", row_limit=50))
+            artifacts[1:1] = ["torch_trace.json", "torch_ops.txt"]
+
+        self_samples, total_samples = Counter(), Counter()
+        for stack, count in sampler.stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+
+        # Samples are spread over the wall time; the sampler waits for the GIL,
+        # so their count is usually lower than seconds / interval
+        def hottest(samples: Counter) -> List[Dict[str, Any]]:
+            return [
+                {"function": frame, "samples": count, "seconds": round(seconds * count / sampler.samples, 4)}
+                for frame, count in samples.most_common(TOP_FUNCTIONS)
+            ]
+
+        summary = {
+            "id": self.id,
+            "endpoint": self.name,
+            "created_at": time.time(),
+            "seconds": round(seconds, 4),
+            "error": error,
+            "interval": sampler.interval,
+            "samples": sampler.samples,
+            "artifacts": artifacts,
+            "self_time": hottest(self_samples),
+            "total_time": hottest(total_samples),
+        }
+        with open(os.path.join(self.directory, "profile.json"), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        self.profiler.rotate()
+
+
+class Profiler:
+    def __init__(self, token: Optional[str] = None, directory: str = "profiles", interval: float = 0.005,
+                 max_profiles: int = 20) -> None:
+        self.token = token
+        self.directory = directory
+        self.interval = interval
+        self.max_profiles = max_profiles
+        self._lock = threading.Lock()
+        self._capturing = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token)
+
+    @property
+    def busy(self) -> bool:
+        return self._capturing.locked()
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and token is not None and hmac.compare_digest(token.encode("utf-8"), self.token.encode("utf-8"))
+
+    def start(self, name: str) -> Profile:
+        """
+        Raises:
+            ProfilerBusy: Another profile is being captured (capture()
+                checks again, as the profiled computation starts later)
+        """
+        if self.busy:
+            raise ProfilerBusy("Another request is being profiled; retry when it has finished")
+        return Profile(self, name)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of the stored profiles, newest first"""
+        profiles = []
+        for profile_id in self._profile_ids():
+            try:
+                with open(os.path.join(self.directory, profile_id, "profile.json"), encoding='utf-8') as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profiles.append({k: summary.get(k) for k in ("id", "endpoint", "created_at", "seconds", "samples",
+                                                          "error", "artifacts")})
+        return sorted(profiles, key=lambda summary: summary["created_at"] or 0, reverse=True)
+
+    def artifact_path(self, profile_id: str, artifact: str) -> Optional[str]:
+        """Path of a stored artifact, or None if there is no such profile or artifact"""
+        if artifact not in ARTIFACTS or not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id, artifact)
+        return path if os.path.isfile(path) else None
+
+    def rotate(self) -> None:
+        with self._lock:
+            profile_ids = self._profile_ids()
+            by_age = sorted(profile_ids, key=lambda p: os.path.getmtime(os.path.join(self.directory, p)))
+            for profile_id in by_age[:max(0, len(by_age) - self.max_profiles)]:
+                shutil.rmtree(os.path.join(self.directory, profile_id), ignore_errors=True)
+
+    def _profile_ids(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [name for name in os.listdir(self.directory)
+                if PROFILE_ID_PATTERN.match(name) and os.path.isdir(os.path.join(self.directory, name))]
+
+
+def _torch_profiler() -> Any:
+    """A torch.profiler.profile over CPU (and CUDA) operators, or None without torch"""
+    try:
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+    except ImportError:
+        return None
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    return profile(activities=activities, record_shapes=True)
+
+
+def profiler_from_env() -> Profiler:
+    return Profiler(
+        token=os.environ.get("PROFILE_TOKEN") or None,
+        directory=os.environ.get("PROFILE_DIR", "profiles"),
+        interval=float(os.environ.get("PROFILE_INTERVAL", "0.005")),
+        max_profiles=int(os.environ.get("PROFILE_MAX_PROFILES", "20")),
+    )
+
+
+profiler = profiler_from_env()
@@ -0,0 +1,334 @@
+"""
+Persistent question bank
+
+Generated summaries and question sets are stored in a local SQLite database,
+keyed by the digest of the source text, the generation parameters and the
+version of the models that produced them. Repeat requests for the same text
+are answered from the bank instead of re-running the models, and stored
+questions are indexed (FTS5 when the SQLite build has it) so they can be
+searched by topic and paged through per document.
+
+Each process opens its own connection on first use, so the bank is safe to
+use from pre-forked workers; WAL mode lets them read while one writes.
+
+Environment variables:
+    QUESTION_BANK_PATH: Database file (default question_bank.db under
+        MODEL_CACHE_DIR, or under ~/.cache/study-simplify). Set to an empty
+        string to disable the bank.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from metrics import cache_lookup
+
+PREVIEW_CHARS = 200
+MAX_PAGE_SIZE = 100
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "study-simplify")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    digest TEXT PRIMARY KEY,
+    preview TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES documents(digest),
+    kind TEXT NOT NULL,
+    params_key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (digest, kind, params_key, model_version)
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    result_id INTEGER NOT NULL REFERENCES results(id),
+    digest TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    options TEXT NOT NULL,
+    type TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_by_document ON questions (digest, kind, type);
+CREATE INDEX IF NOT EXISTS questions_by_result ON questions (result_id);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts USING fts5(
+    question, answer, options, content='questions', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+    INSERT INTO questions_fts (rowid, question, answer, options)
+    VALUES (new.id, new.question, new.answer, new.options);
+END;
+CREATE TRIGGER IF NOT EXISTS questions_fts_delete AFTER DELETE ON questions BEGIN
+    INSERT INTO questions_fts (questions_fts, rowid, question, answer, options)
+    VALUES ('delete', old.id, old.question, old.answer, old.options);
+END;
+"""
+
+
+def document_digest(text: str) -> str:
+    """Identify a document by its text, ignoring surrounding whitespace"""
+    return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _option_list(options: Any) -> List[str]:
+    # Objective questions number their options in a dict
+    if isinstance(options, dict):
+        return [str(option) for option in options.values()]
+    return [str(option) for option in options or []]
+
+
+def _fts_query(topic: str) -> str:
+    # Quote every word so user input can never be parsed as FTS syntax
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in topic.split())
+
+
+class InvalidQuery(ValueError):
+    """A search the full-text index cannot parse"""
+
+
+class QuestionBank:
+    def __init__(self, path: Optional[str]) -> None:
+        """
+        Args:
+            path: SQLite database file; None or "" disables the bank
+        """
+        self.path = path or None
+        self.fts = False
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so each process opens its own
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.executescript(SCHEMA)
+                try:
+                    connection.executescript(FTS_SCHEMA)
+                    self.fts = True
+                except sqlite3.OperationalError:
+                    print("Warning: SQLite has no FTS5 support, question search falls back to LIKE")
+                    self.fts = False
+            self._connection = connection
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, digest: str, kind: str, params: Dict[str, Any], model_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the stored payload for a document, result kind and parameters
+
+        Returns:
+            The payload saved with put(), or None when nothing matching the
+            parameters and model version is stored or the bank is unreadable
+        """
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT payload FROM results WHERE digest = ? AND kind = ? AND params_key = ? AND model_version = ?",
+                    (digest, kind, params_key(params), model_version),
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not read question bank: {e}")
+            return None
+        cache_lookup("question_bank", hit=row is not None)
+        return json.loads(row["payload"]) if row else None
+
+    def put(self, text: str, kind: str, params: Dict[str, Any], model_version: str,
+            payload: Dict[str, Any], questions: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
+        """
+        Store a result, replacing any earlier one for the same key
+
+        Args:
+            text: Source text, used for the document digest and preview
+            kind: Result kind, e.g. summary, subjective or objective
+            params: Generation parameters that affect the result
+            model_version: Versions of the models that produced it
+            payload: Response data returned again by get()
+            questions: Questions to index, each with question, answer,
+                options and type keys
+
+        Returns:
+            The document digest, or None when the bank is disabled or the
+            result could not be stored
+        """
+        if not self.enabled:
+            return None
+        try:
+            return self._put(text, kind, params, model_version, payload, questions or [])
+        except sqlite3.Error as e:
+            print(f"Warning: Could not store {kind} result in question bank: {e}")
+            return None
+
+    def _put(self, text: str, kind: str, params: Dict[str, Any], model_version: str,
+             payload: Dict[str, Any], questions: List[Dict[str, Any]]) -> str:
+        digest = document_digest(text)
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT OR IGNORE INTO documents (digest, preview, chars, created_at) VALUES (?, ?, ?, ?)",
+                    (digest, text.strip()[:PREVIEW_CHARS], len(text), now),
+                )
+                key = params_key(params)
+                old = connection.execute(
+                    "SELECT id FROM results WHERE digest = ? AND kind = ? AND params_key = ? AND model_version = ?",
+                    (digest, kind, key, model_version),
+                ).fetchone()
+                if old:
+                    connection.execute("DELETE FROM questions WHERE result_id = ?", (old["id"],))
+                    connection.execute("DELETE FROM results WHERE id = ?", (old["id"],))
+                result_id = connection.execute(
+                    "INSERT INTO results (digest, kind, params_key, params, model_version, payload, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (digest, kind, key, json.dumps(params, sort_keys=True), model_version, json.dumps(payload), now),
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO questions (result_id, digest, kind, position, question, answer, options, type, "
+                    "model_version, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (result_id, digest, kind, position, q["question"], str(q["answer"]),
+                         json.dumps(_option_list(q.get("options"))), q.get("type", kind), model_version, now)
+                        for position, q in enumerate(questions, 1)
+                    ],
+                )
+        return digest
+
+    def documents(self, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """Page through stored documents, newest first, with their question counts"""
+        if not self.enabled:
+            return {"total": 0, "documents": []}
+        with self._lock:
+            connection = self._connect()
+            total = connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            rows = connection.execute(
+                "SELECT d.digest, d.preview, d.chars, d.created_at, "
+                "(SELECT COUNT(*) FROM questions q WHERE q.digest = d.digest) AS questions "
+                "FROM documents d ORDER BY d.created_at DESC LIMIT ? OFFSET ?",
+                (min(limit, MAX_PAGE_SIZE), offset),
+            ).fetchall()
+        return {"total": total, "documents": [dict(row) for row in rows]}
+
+    def document(self, digest: str) -> Optional[Dict[str, Any]]:
+        """A stored document with every result recorded for it"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT * FROM documents WHERE digest = ?", (digest,)).fetchone()
+            if row is None:
+                return None
+            results = connection.execute(
+                "SELECT r.kind, r.params, r.model_version, r.created_at, "
+                "(SELECT COUNT(*) FROM questions q WHERE q.result_id = r.id) AS questions "
+                "FROM results r WHERE r.digest = ? ORDER BY r.created_at DESC",
+                (digest,),
+            ).fetchall()
+        document = dict(row)
+        document["results"] = [dict(result, params=json.loads(result["params"])) for result in results]
+        return document
+
+    def search_questions(self, digest: Optional[str] = None, topic: Optional[str] = None,
+                         kind: Optional[str] = None, question_type: Optional[str] = None,
+                         limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Filter and page through stored questions
+
+        Args:
+            digest: Only questions generated from this document
+            topic: Words that must all appear in the question, answer or
+                options; results are ordered by relevance
+            kind: subjective or objective
+            question_type: Question type, e.g. subjective or multiple_choice
+            limit: Page size (at most MAX_PAGE_SIZE)
+            offset: Questions to skip
+
+        Returns:
+            Dict with the total number of matches and the requested page
+
+        Raises:
+            InvalidQuery: The full-text index rejected the topic
+        """
+        if not self.enabled:
+            return {"total": 0, "questions": []}
+
+        where, args = [], []
+        for column, value in (("q.digest", digest), ("q.kind", kind), ("q.type", question_type)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+
+        with self._lock:
+            connection = self._connect()
+            source = "questions q"
+            order = "q.created_at DESC, q.position"
+            words = topic.split() if topic else []
+            if words and self.fts:
+                source = "questions_fts JOIN questions q ON q.id = questions_fts.rowid"
+                where.append("questions_fts MATCH ?")
+                args.append(_fts_query(topic))
+                order = "questions_fts.rank"
+            elif words:
+                for word in words:
+                    where.append("(q.question LIKE ? OR q.answer LIKE ? OR q.options LIKE ?)")
+                    args.extend([f"%{word}%"] * 3)
+
+            clause = f" WHERE {' AND '.join(where)}" if where else ""
+            try:
+                total = connection.execute(f"SELECT COUNT(*) FROM {source}{clause}", args).fetchone()[0]
+                rows = connection.execute(
+                    f"SELECT q.id, q.digest, q.kind, q.position, q.question, q.answer, q.options, q.type, "
+                    f"q.model_version, q.created_at FROM {source}{clause} ORDER BY {order} LIMIT ? OFFSET ?",
+                    args + [min(limit, MAX_PAGE_SIZE), offset],
+                ).fetchall()
+            except sqlite3.OperationalError as e:
+                if "fts5" in str(e):
+                    raise InvalidQuery(f"Invalid topic {topic!r}: {e}") from e
+                raise
+        return {
+            "total": total,
+            "questions": [dict(row, options=json.loads(row["options"])) for row in rows],
+        }
+
+
+def default_path() -> str:
+    return os.path.join(os.environ.get("MODEL_CACHE_DIR") or DEFAULT_DIR, "question_bank.db")
+
+
+def bank_from_env() -> QuestionBank:
+    return QuestionBank(os.environ.get("QUESTION_BANK_PATH", default_path()))
+
+
+question_bank = bank_from_env()
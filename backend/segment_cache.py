@@ -0,0 +1,276 @@
+"""
+Content-addressed cache of per-segment results
+
+Documents are processed as segments (PDF pages, slides, sentences, generation
+inputs, QA pairs) and the result of each expensive step is stored under a
+hash of the segment's content. When an edited document is processed again,
+only the segments that changed miss the cache, so the cost scales with the
+size of the edit rather than the size of the document.
+
+Results live in namespaces that include the producing model's version (e.g.
+"questions:<model>:<profile>"), so upgrading a model never serves stale
+results. Entries are kept in an in-process LRU backed by SQLite; each thread
+opens its own connection, so lookups never wait on another thread's I/O and
+the file can be shared by pre-forked workers and bulk processing runs. The
+file is pruned as it is written: entries unused for SEGMENT_CACHE_TTL_DAYS go
+first, then the least recently used ones beyond SEGMENT_CACHE_MAX_ROWS.
+
+Environment variables:
+    SEGMENT_CACHE_PATH: SQLite file (default segment_cache.db under
+        MODEL_CACHE_DIR, or under ~/.cache/study-simplify). Set to an empty
+        string to keep results in memory only.
+    SEGMENT_CACHE_MEMORY_ITEMS: Entries kept in memory per process
+        (default 20000). With 0 and no path the cache is disabled.
+    SEGMENT_CACHE_MAX_ROWS: Entries kept in the file (default 500000, 0 for
+        no limit)
+    SEGMENT_CACHE_TTL_DAYS: Days an unused entry is kept in the file
+        (default 30, 0 to keep entries until they are evicted by size)
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from metrics import cache_lookup
+
+# SQLite limits the number of bound parameters per statement
+LOOKUP_CHUNK = 500
+# Rows written by a process between two prunes of the file
+PRUNE_EVERY = 1000
+# Reads refresh the last use of an entry at most this often (seconds), so
+# hot entries do not turn every lookup into a write
+TOUCH_INTERVAL = 3600
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "study-simplify")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+"""
+
+INDEX = "CREATE INDEX IF NOT EXISTS segments_by_use ON segments (used_at);"
+
+
+def segment_key(*parts: Any) -> str:
+    """Hash the content of a segment (str or bytes parts)"""
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        sha.update(b"\x00")
+    return sha.hexdigest()
+
+
+class CacheNamespace:
+    """A SegmentCache bound to one namespace, handed to the pipeline stages"""
+
+    def __init__(self, cache: "SegmentCache", name: str) -> None:
+        self.cache = cache
+        self.name = name
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return self.cache.get_many(self.name, keys)
+
+    def put_many(self, items: Dict[str, Any]) -> None:
+        self.cache.put_many(self.name, items)
+
+
+class SegmentCache:
+    def __init__(self, path: Optional[str] = None, memory_items: int = 20000, max_rows: int = 500000,
+                 ttl_days: float = 30) -> None:
+        """
+        Args:
+            path: SQLite file, or None to keep results in memory only
+            memory_items: Entries kept in the in-process LRU
+            max_rows: Entries kept in the file, 0 for no limit
+            ttl_days: Days an unused entry is kept in the file, 0 for no limit
+        """
+        self.path = path or None
+        self.memory_items = memory_items
+        self.max_rows = max_rows
+        self.ttl_days = ttl_days
+        self._memory = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()  # guards the in-memory LRU and the write counter only
+        self._writes = PRUNE_EVERY  # so the first write of a process prunes
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None or self.memory_items > 0
+
+    def namespace(self, name: str) -> Optional[CacheNamespace]:
+        """Return a view of one namespace, or None when the cache is disabled"""
+        return CacheNamespace(self, name) if self.enabled else None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not cross a fork or be shared between threads, so
+        # each thread of each process opens its own
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                connection.executescript(SCHEMA)
+                self._migrate(connection)
+                connection.executescript(INDEX)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _migrate(connection: sqlite3.Connection) -> None:
+        # Files written before entries recorded their last use
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(segments)")]
+        if "used_at" in columns:
+            return
+        try:
+            connection.execute("ALTER TABLE segments ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e):  # another process migrated it first
+                raise
+        connection.execute("UPDATE segments SET used_at = created_at")
+
+    def _remember(self, memory_key: tuple, value: Any) -> None:
+        if self.memory_items <= 0:
+            return
+        self._memory[memory_key] = value
+        self._memory.move_to_end(memory_key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up stored results
+
+        Returns:
+            Dict of key -> value for the keys that were found
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for key in keys:
+                memory_key = (namespace, key)
+                if memory_key in self._memory:
+                    self._memory.move_to_end(memory_key)
+                    found[key] = self._memory[memory_key]
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.path is not None:
+            stored = {}
+            try:
+                stored = self._read(namespace, missing)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not read segment cache: {e}")
+            with self._lock:
+                for key, value in stored.items():
+                    self._remember((namespace, key), value)
+            found.update(stored)
+
+        cache_name = f"segments_{namespace.split(':')[0]}"
+        cache_lookup(cache_name, hit=True, count=len(found))
+        cache_lookup(cache_name, hit=False, count=len(keys) - len(found))
+        return found
+
+    def _read(self, namespace: str, keys: List[str]) -> Dict[str, Any]:
+        connection = self._connect()
+        now = time.time()
+        found = {}
+        for i in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[i:i + LOOKUP_CHUNK]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT key, value, used_at FROM segments WHERE namespace = ? AND key IN ({placeholders})",
+                [namespace] + chunk,
+            ).fetchall()
+            stale = [key for key, _, used_at in rows if used_at < now - TOUCH_INTERVAL]
+            if stale:
+                with connection:
+                    connection.execute(
+                        f"UPDATE segments SET used_at = ? WHERE namespace = ? "
+                        f"AND key IN ({', '.join('?' * len(stale))})",
+                        [now, namespace] + stale,
+                    )
+            for key, value, _ in rows:
+                found[key] = json.loads(value)
+        return found
+
+    def put_many(self, namespace: str, items: Dict[str, Any]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._remember((namespace, key), value)
+            if self.path is None:
+                return
+            self._writes += len(items)
+            prune = self._writes >= PRUNE_EVERY
+            if prune:
+                self._writes = 0
+        now = time.time()
+        try:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO segments (namespace, key, value, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(namespace, key, json.dumps(value), now, now) for key, value in items.items()],
+                )
+            if prune:
+                self.prune()
+        except sqlite3.Error as e:
+            print(f"Warning: Could not store {namespace} segments: {e}")
+
+    def prune(self) -> int:
+        """
+        Delete entries unused for ttl_days, then the least recently used ones
+        beyond max_rows
+
+        Returns:
+            Number of entries deleted from the file
+        """
+        if self.path is None:
+            return 0
+        connection = self._connect()
+        deleted = 0
+        with connection:
+            if self.ttl_days > 0:
+                deleted += connection.execute(
+                    "DELETE FROM segments WHERE used_at < ?", (time.time() - self.ttl_days * 86400,)
+                ).rowcount
+            if self.max_rows > 0:
+                excess = connection.execute("SELECT COUNT(*) FROM segments").fetchone()[0] - self.max_rows
+                if excess > 0:
+                    deleted += connection.execute(
+                        "DELETE FROM segments WHERE (namespace, key) IN "
+                        "(SELECT namespace, key FROM segments ORDER BY used_at LIMIT ?)",
+                        (excess,),
+                    ).rowcount
+        return deleted
+
+
+def default_path() -> str:
+    return os.path.join(os.environ.get("MODEL_CACHE_DIR") or DEFAULT_DIR, "segment_cache.db")
+
+
+def cache_from_env() -> SegmentCache:
+    return SegmentCache(
+        path=os.environ.get("SEGMENT_CACHE_PATH", default_path()),
+        memory_items=int(os.environ.get("SEGMENT_CACHE_MEMORY_ITEMS", "20000")),
+        max_rows=int(os.environ.get("SEGMENT_CACHE_MAX_ROWS", "500000")),
+        ttl_days=float(os.environ.get("SEGMENT_CACHE_TTL_DAYS", "30")),
+    )
+
+
+segment_cache = cache_from_env()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Pre-forking server that shares model memory between workers
+
+The serving models are loaded once in the parent process, frozen, and then N worker
+processes are forked. Each worker runs its own uvicorn server on the shared
+listening socket, and the model weights stay in copy-on-write pages shared by
+every worker instead of being loaded N times. Each worker gets its own slice
+of the CPU cores for torch intra-op threads so workers do not oversubscribe.
+
+Usage:
+    python serve.py --workers 4 --port 8000 [--models question_generator,qa_evaluator]
+
+--models defaults to models.DEFAULT_SERVING_MODELS; "all" preloads every
+registered model, including optional tiers. Models that are not preloaded
+are loaded by each worker on first use.
+
+Send SIGUSR1 to the parent to print a per-worker memory report.
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+from memory_stats import format_report, memory_report, process_memory
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads_per_worker", type=int, default=None,
+                       help="torch intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--models", type=str, default=None,
+                       help="Comma-separated models to preload, or \"all\" (default: the serving set)")
+    parser.add_argument("--report_after", type=float, default=30.0,
+                       help="Seconds after startup to print the first memory report (0 disables)")
+    return parser.parse_args()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, app, threads: int) -> None:
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already initialised, the intra-op setting is what matters
+
+    config = uvicorn.Config(app, log_level="info")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+class Master:
+    def __init__(self, sock: socket.socket, app, workers: int, threads: int) -> None:
+        self.sock = sock
+        self.app = app
+        self.num_workers = workers
+        self.threads = threads
+        self.children = set()
+        self.stopping = False
+
+    def spawn(self) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+            try:
+                run_worker(self.sock, self.app, self.threads)
+            finally:
+                os._exit(0)
+        self.children.add(pid)
+
+    def report(self, *_) -> None:
+        print("Parent:")
+        print(format_report([process_memory()]))
+        print("Workers:")
+        print(format_report(memory_report(sorted(self.children))))
+        sys.stdout.flush()
+
+    def stop(self, *_) -> None:
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self, report_after: float) -> None:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGUSR1, self.report)
+        if report_after > 0:
+            signal.signal(signal.SIGALRM, self.report)
+            signal.setitimer(signal.ITIMER_REAL, report_after)
+
+        for _ in range(self.num_workers):
+            self.spawn()
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            self.children.discard(pid)
+            if not self.stopping:
+                print(f"Worker {pid} exited with status {status}, restarting")
+                time.sleep(1)
+                self.spawn()
+
+
+def main() -> None:
+    args = parse_args()
+
+    # Keep torch single-threaded in the parent: OpenMP pools created before a
+    # fork are not usable in the children
+    import torch
+    torch.set_num_threads(1)
+
+    import models
+    from main import app
+
+    sock = bind_socket(args.host, args.port)
+
+    start = time.perf_counter()
+    if args.models == "all":
+        names = models.manager.status()["registered"]
+    elif args.models:
+        names = [name.strip() for name in args.models.split(",") if name.strip()]
+    else:
+        names = None
+    models.preload(names)
+    models.freeze()
+    print(f"Loaded models {models.loaded_models()} in {time.perf_counter() - start:.1f}s")
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    print(f"Forking {args.workers} workers with {threads} torch threads each on {args.host}:{args.port}")
+    Master(sock, app, args.workers, threads).run(args.report_after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Coalescing of identical in-flight requests
+
+While a computation for a key is running, requests with the same key wait
+for its result instead of starting their own:
+
+    summarize_flight = SingleFlight("summarize")
+    response = await summarize_flight.do(key, summarize, text, deadline=deadline,
+                                         is_disconnected=request.is_disconnected,
+                                         workload="summarize")
+
+Keys are the digest of the input plus every parameter that affects the
+result. The computation runs in the threadpool, detached from the request
+that started it, so a client that disconnects does not cancel it for the
+requests waiting on it. It receives a CancellationToken as its first
+argument, which is cancelled once every waiting request has disconnected
+or timed out, and which carries the latest of their deadlines. A request
+arriving after that starts a new computation rather than joining the one
+that is winding down. With a
+workload class, the computation first queues for a slot of that class (see
+admission.py); coalesced requests never take a slot of their own. If the
+computation ends before the function starts (rejected by admission control
+or cancelled while queued), the starting request's on_abandon callback
+releases whatever the function would have cleaned up, e.g. an upload. A
+request that joins instead of starting has its on_join callback called
+right away, since the computation will never use its own copy of the
+input; the decision is made inside do(), so it always matches who leads.
+
+Coalescing is per process; identical requests that land on different
+workers still compute separately, and later repeats are served by the
+question bank and segment cache.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+import metrics
+from admission import admission
+from cancellation import CancellationToken, Cancelled, DeadlineExceeded
+
+# How often waiting requests check whether their client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+
+COALESCED_REQUESTS = metrics.counter(
+    "study_coalesced_requests_total",
+    "Computations started (leader) and requests that joined an identical in-flight one (coalesced)",
+    ["endpoint", "result"],
+)
+CANCELLED_REQUESTS = metrics.counter(
+    "study_cancelled_requests_total",
+    "Requests that stopped waiting for a computation, by reason",
+    ["endpoint", "reason"],
+)
+
+
+class _Call:
+    def __init__(self, token: CancellationToken, on_abandon: Optional[Callable[[], None]]) -> None:
+        self.future = None
+        self.token = token
+        self.on_abandon = on_abandon
+        self.started = False
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str) -> None:
+        """
+        Args:
+            name: Endpoint label for the metrics
+        """
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+        metrics.QUEUE_DEPTH.set_function(self.in_flight, queue=f"singleflight_{name}")
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def running(self, key: str) -> bool:
+        """Whether a request for key would join a computation rather than start one"""
+        call = self._calls.get(key)
+        return call is not None and not call.token.cancelled
+
+    async def do(self, key: str, function: Callable[..., Any], *args: Any,
+                 deadline: Optional[float] = None,
+                 is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+                 workload: Optional[str] = None,
+                 on_abandon: Optional[Callable[[], None]] = None,
+                 on_join: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Run function(cancel_token, *args) in the threadpool, or, if a call
+        with the same key is already running and not cancelled, wait for it
+
+        Args:
+            deadline: time.monotonic() value after which this request stops
+                waiting and raises DeadlineExceeded
+            is_disconnected: Coroutine function polled while waiting; when
+                it returns True the request stops waiting and raises Cancelled
+            workload: Admission workload class the computation runs in
+                (None runs it without admission control)
+            on_abandon: Called if this request starts the computation and it
+                ends before function was called (ignored when joining)
+            on_join: Called as soon as this request joins a running
+                computation instead of starting one
+
+        Returns:
+            The function's result; every coalesced caller receives the same
+            object (or the same exception), so callers must not mutate it
+        """
+        call = self._calls.get(key)
+        if call is not None and call.token.cancelled:
+            # Everyone waiting for it has gone and it is about to stop; this
+            # request would only inherit the cancellation
+            call = None
+        if call is None:
+            token = CancellationToken(deadline)
+            call = _Call(token, on_abandon)
+
+            def run(*run_args: Any) -> Any:
+                call.started = True
+                return function(*run_args)
+
+            if workload is None:
+                computation = run_in_threadpool(run, token, *args)
+            else:
+                computation = admission.run(workload, run, token, *args, cancel_token=token)
+            call.future = asyncio.ensure_future(computation)
+            self._calls[key] = call
+            call.future.add_done_callback(lambda done: self._finish(key, call))
+            COALESCED_REQUESTS.inc(endpoint=self.name, result="leader")
+        else:
+            call.token.extend(deadline)
+            COALESCED_REQUESTS.inc(endpoint=self.name, result="coalesced")
+            if on_join is not None:
+                self._release(on_join, "joined")
+
+        call.waiters += 1
+        try:
+            return await self._wait(call, deadline, is_disconnected)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.future.done():
+                call.token.cancel("every request waiting for the result has gone")
+
+    async def _wait(self, call: _Call, deadline: Optional[float],
+                    is_disconnected: Optional[Callable[[], Awaitable[bool]]]) -> Any:
+        # asyncio.wait never cancels the computation, whether it times out or
+        # this request is cancelled
+        while True:
+            timeout = DISCONNECT_POLL_SECONDS
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+            done, _ = await asyncio.wait({call.future}, timeout=timeout)
+            if done:
+                return call.future.result()
+            if deadline is not None and time.monotonic() >= deadline:
+                CANCELLED_REQUESTS.inc(endpoint=self.name, reason="deadline")
+                raise DeadlineExceeded("deadline exceeded")
+            if is_disconnected is not None and await is_disconnected():
+                CANCELLED_REQUESTS.inc(endpoint=self.name, reason="disconnected")
+                raise Cancelled("client disconnected")
+
+    def _finish(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.future.cancelled():
+            # Retrieve the exception so it is not reported as unhandled when
+            # every waiter has gone away
+            call.future.exception()
+        if not call.started and call.on_abandon is not None:
+            self._release(call.on_abandon, "abandoned")
+
+    def _release(self, callback: Callable[[], None], reason: str) -> None:
+        try:
+            callback()
+        except Exception as e:
+            print(f"Warning: Cleanup for a {reason} {self.name} request failed: {e}")
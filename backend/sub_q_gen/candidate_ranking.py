@@ -0,0 +1,125 @@
+from typing import List, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from metrics import count_items
+from near_duplicates import DEFAULT_THRESHOLD, NearDuplicateFilter
+
+SALIENCE_WEIGHT = 0.6
+LENGTH_WEIGHT = 0.2
+ENTITY_WEIGHT = 0.2
+
+IDEAL_MIN_WORDS = 8
+IDEAL_MAX_WORDS = 30
+DUPLICATE_THRESHOLD = DEFAULT_THRESHOLD
+
+
+def _duplicate_group(answer: str, focus: str) -> Tuple[str, str]:
+    # sentence candidates clash with each other; entity answers only clash
+    # when the same entity is asked about again
+    answer = answer.strip().lower()
+    if answer == focus.strip().lower():
+        return ("sentence", "")
+    return ("entity", answer)
+
+
+def salience_scores(texts: List[str]) -> np.ndarray:
+    """
+    Cosine similarity of each text's TF-IDF vector to the centroid of all
+    texts, i.e. how central a sentence is to the document
+    """
+    try:
+        matrix = TfidfVectorizer(stop_words="english").fit_transform(texts)
+    except ValueError:  # empty vocabulary
+        return np.zeros(len(texts))
+
+    centroid = np.asarray(matrix.mean(axis=0)).ravel()
+    norm = np.linalg.norm(centroid)
+    if norm == 0:
+        return np.zeros(len(texts))
+    # rows are already L2 normalised by the vectorizer
+    return np.asarray(matrix @ (centroid / norm)).ravel()
+
+
+def length_score(text: str) -> float:
+    """1.0 inside the ideal word range, decaying linearly outside it"""
+    num_words = len(text.split())
+    if num_words < IDEAL_MIN_WORDS:
+        return num_words / IDEAL_MIN_WORDS
+    if num_words > IDEAL_MAX_WORDS:
+        return max(0.0, 1 - (num_words - IDEAL_MAX_WORDS) / IDEAL_MAX_WORDS)
+    return 1.0
+
+
+def entity_density(text: str) -> float:
+    """
+    Cheap proxy for named-entity density: the share of capitalised
+    (non sentence-initial) words and numbers, scaled so 25% counts as dense
+    """
+    words = text.split()
+    if not words:
+        return 0.0
+    entity_like = sum(1 for w in words[1:] if w[0].isupper()) + sum(1 for w in words if w[0].isdigit())
+    return min(1.0, 4 * entity_like / len(words))
+
+
+def rank_candidates(candidates: List[Tuple[str, str]], limit: int = None,
+                    duplicate_threshold: float = DUPLICATE_THRESHOLD) -> List[int]:
+    """
+    Order generation candidates by how promising they are and drop near duplicates
+
+    Args:
+        candidates: (answer, focus_text) pairs. focus_text is the sentence the
+            question will be about; answer is the expected answer text.
+        limit: Maximum number of candidates to keep (None keeps all)
+        duplicate_threshold: Word Jaccard similarity of the focus texts above
+            which two sentence candidates, or two candidates for the same
+            entity answer, are considered duplicates (MinHash/LSH, see
+            near_duplicates.py). None keeps duplicates.
+
+    Returns:
+        Indices into candidates, best first
+    """
+    if not candidates:
+        return []
+
+    focus_texts = [focus for _, focus in candidates]
+    salience = salience_scores(focus_texts)
+    scores = [
+        SALIENCE_WEIGHT * salience[i]
+        + LENGTH_WEIGHT * length_score(focus)
+        + ENTITY_WEIGHT * entity_density(focus)
+        for i, focus in enumerate(focus_texts)
+    ]
+    order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+
+    kept = []
+    dropped = 0
+    dedup = NearDuplicateFilter(duplicate_threshold) if duplicate_threshold is not None else None
+    for i in order:
+        if limit is not None and len(kept) >= limit:
+            break
+        answer, focus = candidates[i]
+        if dedup is not None and not dedup.add(focus, _duplicate_group(answer, focus)):
+            dropped += 1
+            continue
+        kept.append(i)
+
+    count_items("dedup", "inputs_dropped", dropped)
+    return kept
+
+
+def dedup_candidates(candidates: List[Tuple[str, str]],
+                     duplicate_threshold: float = DUPLICATE_THRESHOLD) -> List[int]:
+    """
+    Drop near-duplicate candidates without ranking them
+
+    Returns:
+        Indices of the candidates that are not near duplicates of an earlier
+        one, in their original order
+    """
+    dedup = NearDuplicateFilter(duplicate_threshold)
+    kept = [i for i, (answer, focus) in enumerate(candidates) if dedup.add(focus, _duplicate_group(answer, focus))]
+    count_items("dedup", "inputs_dropped", len(candidates) - len(kept))
+    return kept
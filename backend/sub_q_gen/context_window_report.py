@@ -0,0 +1,127 @@
+"""
+Compare windowed context with full-segment context for sentence answers
+
+Questions are generated for the answer sentences of a multi-paragraph
+document (the medium benchmark corpus by default, so segments hold several
+hundred tokens), once with the whole segment as context (the default) and
+once per windowed configuration: a number of neighbouring sentences per side,
+or a token budget. For every configuration
+the report gives the mean input length, generation time and speedup, the
+evaluator's mean score for the generated QA pairs, and how closely its
+questions agree with the full-context ones.
+
+Usage:
+    python context_window_report.py [--windows 1,2] [--budgets 128,256] [--profile quality]
+                                    [--size medium] [--text_file FILE] [--output context_window_report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+# Shared backend modules (metrics, ...) live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quantization_report import _token_jaccard
+
+
+def run_configuration(qg: Any, corpus: List[str], context_window: Optional[int], context_tokens: Optional[int],
+                      decoding_profile: str) -> Dict[str, Any]:
+    inputs, answers = [], []
+    for text in corpus:
+        text_inputs, text_answers = qg.generate_qg_inputs(text, "sentences", context_window, context_tokens)
+        inputs.extend(text_inputs)
+        answers.extend(text_answers)
+    windowed = context_window is not None or context_tokens is not None
+
+    start = time.perf_counter()
+    questions = qg.generate_questions_from_inputs(inputs, decoding_profile, pad_inputs=not windowed)
+    generation_seconds = time.perf_counter() - start
+
+    scores = qg.score_qa_pairs(questions, answers)
+    input_tokens = [len(ids) for ids in qg.qg_tokenizer(inputs, truncation=True, max_length=qg.SEQ_LENGTH)["input_ids"]]
+    return {
+        "context_window": context_window,
+        "context_tokens": context_tokens,
+        "num_inputs": len(inputs),
+        "mean_input_tokens": sum(input_tokens) / len(input_tokens) if input_tokens else 0.0,
+        "generation_seconds": generation_seconds,
+        "mean_evaluator_score": sum(scores) / len(scores) if scores else None,
+        "questions": dict(zip(answers, questions)),
+    }
+
+
+def compare(full: Dict[str, Any], windowed: Dict[str, Any]) -> Dict[str, Any]:
+    pairs = [(full["questions"][answer], question) for answer, question in windowed["questions"].items()
+             if answer in full["questions"]]
+    exact = sum(1 for a, b in pairs if a.strip() == b.strip())
+    return {
+        "context_window": windowed["context_window"],
+        "context_tokens": windowed["context_tokens"],
+        "mean_input_tokens": windowed["mean_input_tokens"],
+        "input_token_ratio": windowed["mean_input_tokens"] / full["mean_input_tokens"] if full["mean_input_tokens"] else None,
+        "generation_seconds": windowed["generation_seconds"],
+        "generation_speedup": full["generation_seconds"] / windowed["generation_seconds"] if windowed["generation_seconds"] else None,
+        "mean_evaluator_score": windowed["mean_evaluator_score"],
+        "evaluator_score_delta": windowed["mean_evaluator_score"] - full["mean_evaluator_score"]
+        if windowed["mean_evaluator_score"] is not None and full["mean_evaluator_score"] is not None else None,
+        "question_exact_match": exact / len(pairs) if pairs else None,
+        "question_token_jaccard": sum(_token_jaccard(a, b) for a, b in pairs) / len(pairs) if pairs else None,
+        "differing_questions": [{"full": a, "windowed": b} for a, b in pairs if a.strip() != b.strip()][:10],
+    }
+
+
+def build_report(qg: Any, corpus: List[str], windows: List[int], budgets: List[int],
+                 decoding_profile: str) -> Dict[str, Any]:
+    full = run_configuration(qg, corpus, None, None, decoding_profile)
+    configurations = [(window, None) for window in windows] + [(None, budget) for budget in budgets]
+    return {
+        "decoding_profile": decoding_profile,
+        "full": {k: v for k, v in full.items() if k != "questions"},
+        "windowed": [
+            compare(full, run_configuration(qg, corpus, window, budget, decoding_profile))
+            for window, budget in configurations
+        ],
+    }
+
+
+def _int_list(spec: str) -> List[int]:
+    return [int(value) for value in spec.split(",") if value.strip()]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--windows", type=_int_list, default=[1, 2],
+                        help="Neighbouring sentences per side to compare (comma-separated)")
+    parser.add_argument("--budgets", type=_int_list, default=[128, 256],
+                        help="Context token budgets to compare (comma-separated)")
+    parser.add_argument("--profile", type=str, default="quality", help="Decoding profile")
+    parser.add_argument("--size", type=str, default="medium", help="Benchmark corpus size")
+    parser.add_argument("--text_file", type=str, default=None, help="Document to use instead of the benchmark corpus")
+    parser.add_argument("--output", type=str, default="context_window_report.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.text_file:
+        with open(args.text_file, 'r') as file:
+            corpus = [file.read()]
+    else:
+        from benchmarks import corpora
+        corpus = [corpora.text(args.size)]
+
+    from questiongenerator import QuestionGenerator
+
+    report = build_report(QuestionGenerator(), corpus, args.windows, args.budgets, args.profile)
+
+    print(json.dumps({
+        "full": report["full"],
+        "windowed": [{k: v for k, v in row.items() if k != "differing_questions"} for row in report["windowed"]],
+    }, indent=2))
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
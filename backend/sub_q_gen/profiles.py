@@ -0,0 +1,70 @@
+"""
+Decoding profiles, generator tiers and request defaults of the question generator
+
+Kept apart from questiongenerator.py so the API can validate requests
+without importing torch and transformers.
+
+Environment variables:
+    QG_GENERATOR_TIER: Generator tier used when a request does not choose
+        one: "base" (default), "fast" or "refine" (see GENERATOR_TIERS)
+"""
+import os
+
+# Named decoding settings, from cheapest to most expensive. "quality" matches
+# the original hardcoded beam search.
+DECODING_PROFILES = {
+    "fast": {"num_beams": 1, "max_length": 32},
+    "balanced": {"num_beams": 2, "max_length": 48},
+    "quality": {"num_beams": 4, "max_length": 64},
+}
+DEFAULT_DECODING_PROFILE = "quality"
+CHEAPER_PROFILE = {"quality": "balanced", "balanced": "fast"}
+
+VALID_ANSWER_STYLES = ["all", "sentences", "multiple_choice"]
+
+# Streaming mode: inputs generated per segment
+DEFAULT_STREAM_CANDIDATES_PER_SEGMENT = 4
+
+BASE_GENERATOR_MODEL = "iarfmoose/t5-base-question-generator"
+SMALL_GENERATOR_MODEL = "valhalla/t5-small-qa-qg-hl"
+
+# Generator tiers: the registered model (see models.py) that generates for
+# every candidate, and whether the base model then regenerates the drafts the
+# QA evaluator ranks highest
+GENERATOR_TIERS = {
+    "base": {"model": "question_generator", "refine": False},
+    "fast": {"model": "question_generator_small", "refine": False},
+    "refine": {"model": "question_generator_small", "refine": True},
+}
+
+# Refine tier: drafts regenerated by the base model per requested question,
+# so near duplicates dropped after refinement still leave enough questions
+DEFAULT_REFINE_MULTIPLE = 1.5
+
+
+def generator_tier_from_env() -> str:
+    tier = os.environ.get("QG_GENERATOR_TIER", "base").strip() or "base"
+    if tier not in GENERATOR_TIERS:
+        print(f"Warning: Unknown QG_GENERATOR_TIER {tier}, using base")
+        return "base"
+    return tier
+
+
+DEFAULT_GENERATOR_TIER = generator_tier_from_env()
+
+
+def validate_context_window(context_window, context_tokens) -> None:
+    """
+    Raises:
+        ValueError: context_window is not a non-negative integer,
+            context_tokens is not a positive integer (None is allowed for
+            both), or both are given
+    """
+    if context_window is not None and (isinstance(context_window, bool) or not isinstance(context_window, int)
+                                       or context_window < 0):
+        raise ValueError("context_window must be a non-negative integer or null")
+    if context_tokens is not None and (isinstance(context_tokens, bool) or not isinstance(context_tokens, int)
+                                       or context_tokens <= 0):
+        raise ValueError("context_tokens must be a positive integer or null")
+    if context_window is not None and context_tokens is not None:
+        raise ValueError("Give context_window or context_tokens, not both")
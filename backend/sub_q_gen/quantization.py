@@ -0,0 +1,103 @@
+import os
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    import torch
+
+# torch and transformers are imported when a model is quantized, so the model
+# versions can be computed without loading them
+
+QUANTIZE_ENV = "QG_QUANTIZE"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "study-simplify", "quantized")
+
+
+def quantization_enabled(quantize: Optional[bool] = None) -> bool:
+    """
+    Decide whether models should be loaded in int8 mode
+
+    Args:
+        quantize: Explicit choice. When None, the QG_QUANTIZE environment
+            variable decides, so the mode can be set per deployment.
+
+    Returns:
+        True if dynamic int8 quantization should be used
+    """
+    if quantize is not None:
+        return quantize
+    return os.environ.get(QUANTIZE_ENV, "").strip().lower() in ("1", "true", "yes", "int8")
+
+
+def _cache_path(model_name: str, cache_dir: Optional[str] = None) -> str:
+    if cache_dir is None:
+        model_cache_dir = os.environ.get("MODEL_CACHE_DIR")
+        cache_dir = os.path.join(model_cache_dir, "quantized") if model_cache_dir else DEFAULT_CACHE_DIR
+    import torch
+    import transformers
+    # The packed int8 weight layout can change between library versions
+    versions = f"torch{torch.__version__}-tf{transformers.__version__}".replace("+", "_")
+    filename = f"{model_name.replace('/', '--')}-int8-state-{versions}.pt"
+    return os.path.join(cache_dir, filename)
+
+
+def quantize_model(model: "torch.nn.Module") -> "torch.nn.Module":
+    """Apply dynamic int8 quantization to every linear layer of a model"""
+    import torch
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _quantized_skeleton(model_name: str, auto_class: Any) -> "torch.nn.Module":
+    """The quantized architecture of a model, with zero weights, to load a cached state dict into"""
+    import torch
+    from transformers import AutoConfig
+    from transformers.modeling_utils import no_init_weights
+    with no_init_weights():
+        model = auto_class.from_config(AutoConfig.from_pretrained(model_name))
+    # Uninitialized weights can hold NaNs, which quantization rejects
+    with torch.no_grad():
+        for parameter in model.parameters():
+            parameter.zero_()
+    return quantize_model(model)
+
+
+def load_quantized(model_name: str, auto_class: Any, cache_dir: Optional[str] = None) -> "torch.nn.Module":
+    """
+    Load an int8 copy of a model, converting and caching it on first use
+
+    The cache holds only the state dict, loaded with weights_only=True, so a
+    file planted in the cache directory cannot run code when it is read.
+
+    Args:
+        model_name: Hugging Face model id, used to name the cache file
+        auto_class: transformers auto class of the model (e.g.
+            AutoModelForSeq2SeqLM); the fp32 model is only loaded on a cache miss
+        cache_dir: Directory for converted models (default: MODEL_CACHE_DIR/quantized)
+
+    Returns:
+        The quantized model in eval mode
+    """
+    import torch
+    path = _cache_path(model_name, cache_dir)
+
+    if os.path.exists(path):
+        try:
+            state_dict = torch.load(path, map_location="cpu", weights_only=True)
+            model = _quantized_skeleton(model_name, auto_class)
+            model.load_state_dict(state_dict, strict=True)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f"Warning: Could not load quantized model {path}, converting again: {e}")
+
+    print(f"Quantizing {model_name} to int8...")
+    model = quantize_model(auto_class.from_pretrained(model_name))
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(model.state_dict(), temp_path)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: Could not cache quantized model {path}: {e}")
+
+    return model
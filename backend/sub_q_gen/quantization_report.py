@@ -0,0 +1,171 @@
+"""
+Compare fp32 and int8 inference for the question generator and QA evaluator
+
+Each mode runs in its own process so load time and resident memory are
+measured in isolation. Both modes generate questions for the same inputs, and
+both evaluators score the same (fp32) QA pairs so their rankings can be
+compared directly.
+
+Usage:
+    python quantization_report.py [--text_file FILE] [--output report.json]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, List
+
+# Shared backend modules (metrics, ...) live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REFERENCE_CORPUS = [
+    "Photosynthesis is the process by which plants convert sunlight, carbon dioxide, and water into glucose and oxygen. "
+    "This process occurs in the chloroplasts of plant cells. Chloroplasts contain chlorophyll, which is the green pigment "
+    "that captures light energy. The light-dependent reactions occur in the thylakoids, while the light-independent "
+    "reactions (Calvin cycle) occur in the stroma.",
+    "The French Revolution began in 1789 and ended in 1799. It was a period of radical political and societal change in France. "
+    "The storming of the Bastille on 14 July 1789 became a symbol of the uprising. Napoleon Bonaparte rose to power "
+    "in the aftermath of the revolution and crowned himself Emperor in 1804.",
+    "Newton's first law states that an object remains at rest or in uniform motion unless acted upon by a force. "
+    "The second law relates force, mass and acceleration through the equation F = ma. The third law states that "
+    "for every action there is an equal and opposite reaction. Isaac Newton published these laws in 1687 in the Principia.",
+]
+
+
+def _resident_memory_mb() -> float:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_mode(quantize: bool, corpus: List[str], reference: Dict[str, Any], queue) -> None:
+    from questiongenerator import QuestionGenerator
+
+    baseline_memory = _resident_memory_mb()
+    start = time.perf_counter()
+    qg = QuestionGenerator(quantize=quantize)
+    qa_evaluator = qg.qa_evaluator  # loaded lazily, include it in the measurement
+    load_seconds = time.perf_counter() - start
+    model_memory = _resident_memory_mb() - baseline_memory
+
+    inputs, answers = [], []
+    for text in corpus:
+        text_inputs, text_answers = qg.generate_qg_inputs(text, "all")
+        inputs.extend(text_inputs)
+        answers.extend(text_answers)
+    if reference:
+        inputs, answers = reference["inputs"], reference["answers"]
+
+    start = time.perf_counter()
+    questions = qg.generate_questions_from_inputs(inputs)
+    generation_seconds = time.perf_counter() - start
+
+    scored_questions = reference["questions"] if reference else questions
+    start = time.perf_counter()
+    encoded = qa_evaluator.encode_qa_pairs(scored_questions, answers)
+    ranking = qa_evaluator.get_scores(encoded)
+    evaluation_seconds = time.perf_counter() - start
+
+    queue.put({
+        "quantized": qg.quantized,
+        "load_seconds": load_seconds,
+        "model_memory_mb": model_memory,
+        "generation_seconds": generation_seconds,
+        "evaluation_seconds": evaluation_seconds,
+        "inputs": inputs,
+        "answers": answers,
+        "questions": questions,
+        "ranking": ranking,
+    })
+
+
+def run_in_subprocess(quantize: bool, corpus: List[str], reference: Dict[str, Any] = None) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_mode, args=(quantize, corpus, reference, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def _token_jaccard(a: str, b: str) -> float:
+    a_tokens, b_tokens = set(a.lower().split()), set(b.lower().split())
+    if not a_tokens and not b_tokens:
+        return 1.0
+    return len(a_tokens & b_tokens) / len(a_tokens | b_tokens)
+
+
+def _top_k_overlap(a: List[int], b: List[int], k: int) -> float:
+    k = min(k, len(a), len(b))
+    if k == 0:
+        return 1.0
+    return len(set(a[:k]) & set(b[:k])) / k
+
+
+def _spearman(a: List[int], b: List[int]) -> float:
+    n = len(a)
+    if n < 2:
+        return 1.0
+    rank_a = {item: i for i, item in enumerate(a)}
+    rank_b = {item: i for i, item in enumerate(b)}
+    d_squared = sum((rank_a[item] - rank_b[item]) ** 2 for item in rank_a)
+    return 1 - (6 * d_squared) / (n * (n ** 2 - 1))
+
+
+def build_report(fp32: Dict[str, Any], int8: Dict[str, Any]) -> Dict[str, Any]:
+    pairs = list(zip(fp32["questions"], int8["questions"]))
+    exact = sum(1 for a, b in pairs if a.strip() == b.strip())
+
+    def speedup(key):
+        return fp32[key] / int8[key] if int8[key] else None
+
+    return {
+        "num_inputs": len(pairs),
+        "fp32": {k: fp32[k] for k in ("load_seconds", "model_memory_mb", "generation_seconds", "evaluation_seconds")},
+        "int8": {k: int8[k] for k in ("quantized", "load_seconds", "model_memory_mb", "generation_seconds", "evaluation_seconds")},
+        "generation_speedup": speedup("generation_seconds"),
+        "evaluation_speedup": speedup("evaluation_seconds"),
+        "memory_ratio": int8["model_memory_mb"] / fp32["model_memory_mb"] if fp32["model_memory_mb"] else None,
+        "question_exact_match": exact / len(pairs) if pairs else None,
+        "question_token_jaccard": sum(_token_jaccard(a, b) for a, b in pairs) / len(pairs) if pairs else None,
+        "ranking_top10_overlap": _top_k_overlap(fp32["ranking"], int8["ranking"], 10),
+        "ranking_spearman": _spearman(fp32["ranking"], int8["ranking"]),
+        "differing_questions": [
+            {"fp32": a, "int8": b} for a, b in pairs if a.strip() != b.strip()
+        ][:20],
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--text_file", type=str, default=None,
+                       help="Corpus to use instead of the built-in reference paragraphs")
+    parser.add_argument("--output", type=str, default="quantization_report.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    corpus = REFERENCE_CORPUS
+    if args.text_file:
+        with open(args.text_file, 'r') as file:
+            corpus = [file.read()]
+
+    fp32 = run_in_subprocess(False, corpus)
+    int8 = run_in_subprocess(True, corpus, reference=fp32)
+    report = build_report(fp32, int8)
+
+    print(json.dumps({k: v for k, v in report.items() if k != "differing_questions"}, indent=2))
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
@@ -1,61 +1,570 @@
 import en_core_web_sm
+import heapq
+import itertools
 import json
+import math
 import numpy as np
+import os
 import random
 import re
+import time
 import torch
 from transformers import (
     AutoTokenizer,
     AutoModelForSeq2SeqLM,
     AutoModelForSequenceClassification,
     T5Tokenizer,
+    T5TokenizerFast,
     T5ForConditionalGeneration,
 )
-from typing import Any, List, Mapping, Tuple
+from contextlib import contextmanager
+from typing import Any, Callable, ContextManager, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
 import warnings
 
+from cancellation import CancellationToken, check_cancelled
+from metrics import stage, count_items
+from near_duplicates import NearDuplicateFilter
+from segment_cache import segment_key
+
+try:
+    from sub_q_gen.candidate_ranking import DUPLICATE_THRESHOLD, dedup_candidates, rank_candidates
+    from sub_q_gen.quantization import load_quantized, quantization_enabled
+    from sub_q_gen.profiles import (
+        CHEAPER_PROFILE, DECODING_PROFILES, DEFAULT_DECODING_PROFILE, DEFAULT_STREAM_CANDIDATES_PER_SEGMENT,
+        VALID_ANSWER_STYLES, BASE_GENERATOR_MODEL, SMALL_GENERATOR_MODEL, validate_context_window,
+    )
+except ImportError:
+    from candidate_ranking import DUPLICATE_THRESHOLD, dedup_candidates, rank_candidates
+    from quantization import load_quantized, quantization_enabled
+    from profiles import (
+        CHEAPER_PROFILE, DECODING_PROFILES, DEFAULT_DECODING_PROFILE, DEFAULT_STREAM_CANDIDATES_PER_SEGMENT,
+        VALID_ANSWER_STYLES, BASE_GENERATOR_MODEL, SMALL_GENERATOR_MODEL, validate_context_window,
+    )
+
 warnings.filterwarnings("ignore", message=".*Converting from Tiktoken failed.*")
 
+# Generate for at most this many candidates per requested question
+DEFAULT_CANDIDATE_MULTIPLE = 3
+
+# Incremental mode: inputs generated per evaluation round, and the evaluator
+# logit a QA pair needs to count towards num_questions
+DEFAULT_INCREMENTAL_BATCH_SIZE = 8
+DEFAULT_SCORE_THRESHOLD = 0.0
+
+# Context segments end after a paragraph whose hash is divisible by
+# SEGMENT_BOUNDARY_MODULUS once they hold MIN_SEGMENT_TOKENS, so segment
+# boundaries depend on content rather than position: an inserted paragraph
+# only changes the segments around it, and the cached questions for every
+# other segment stay valid.
+MIN_SEGMENT_TOKENS = 256
+MAX_SEGMENT_TOKENS = 490
+SEGMENT_BOUNDARY_MODULUS = 3
+
+# Paragraphs tokenized per batch when grouping them into context segments
+SEGMENT_ENCODE_BATCH = 64
+
+FAST_TOKENIZERS_ENV = "QG_FAST_TOKENIZERS"
+
+# Streaming mode: how many scored pairs per requested question are kept so
+# near duplicates can still be dropped at the end
+STREAM_KEEP_MULTIPLE = 3
+
+# Generators trained on "generate question: ... <hl> answer <hl> ..." inputs
+# rather than "<answer> ... <context> ..."
+HIGHLIGHT_FORMAT_MODELS = {SMALL_GENERATOR_MODEL}
+HIGHLIGHT_TOKEN = "<hl>"
+
 
 class QuestionGenerator:
-    def __init__(self) -> None:
-        QG_PRETRAINED = "iarfmoose/t5-base-question-generator"
+    def __init__(
+        self,
+        quantize: Optional[bool] = None,
+        qa_evaluator: Union["QAEvaluator", Callable[[], "QAEvaluator"], None] = None,
+        spacy_nlp: Union[Any, Callable[[], Any], None] = None,
+        segment_cache: Optional[Any] = None,
+        model_name: str = BASE_GENERATOR_MODEL,
+        refiner: Union["QuestionGenerator", Callable[[], ContextManager["QuestionGenerator"]], None] = None,
+    ) -> None:
+        """
+        Args:
+            quantize: Load int8 weights (default: QG_QUANTIZE env var)
+            qa_evaluator: Evaluator instance, or a callable returning one on
+                demand. By default an evaluator is created the first time one
+                is needed, so use_evaluator=False never loads BERT.
+            spacy_nlp: en_core_web_sm pipeline, or a callable returning it.
+                Loaded on first multiple-choice request by default.
+            segment_cache: SegmentCache for generated questions and evaluator
+                scores, keyed by the hash of each generation input / QA pair,
+                so re-processing an edited document only runs the models on
+                the changed parts. None disables caching.
+            model_name: T5 checkpoint to generate with, e.g.
+                SMALL_GENERATOR_MODEL for drafts
+            refiner: Generator that regenerates the best drafts when
+                refine_multiple is given, or a callable returning a context
+                manager that holds one (e.g. lambda: manager.use(name)),
+                entered for the duration of each refinement
+        """
         self.ANSWER_TOKEN = "<answer>"
         self.CONTEXT_TOKEN = "<context>"
         self.SEQ_LENGTH = 512
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.quantized = quantization_enabled(quantize) and self.device.type == "cpu"
 
-        self.qg_tokenizer = T5Tokenizer.from_pretrained(QG_PRETRAINED, legacy=False, use_fast=False)
-        self.qg_model = T5ForConditionalGeneration.from_pretrained(QG_PRETRAINED)
+        self.model_name = model_name
+        self.highlight_inputs = model_name in HIGHLIGHT_FORMAT_MODELS
+        self.qg_tokenizer = self._load_qg_tokenizer(model_name)
+        self.qg_model = self._load_qg_model(model_name)
         self.qg_model.to(self.device)
         self.qg_model.eval()
-        self.qa_evaluator = QAEvaluator()
+        self.model_version = self._model_version(model_name)
+        self.segment_cache = segment_cache if segment_cache is not None and segment_cache.enabled else None
+        self._quantize = quantize
+        self._qa_evaluator = qa_evaluator
+        self._spacy_nlp = spacy_nlp
+        self._refiner = refiner
+
+    @property
+    def qa_evaluator(self) -> "QAEvaluator":
+        if self._qa_evaluator is None:
+            self._qa_evaluator = QAEvaluator(quantize=self._quantize)
+        if callable(self._qa_evaluator):
+            return self._qa_evaluator()
+        return self._qa_evaluator
+
+    @contextmanager
+    def use_refiner(self) -> Iterator["QuestionGenerator"]:
+        if self._refiner is None:
+            yield self
+        elif callable(self._refiner):
+            with self._refiner() as refiner:
+                yield refiner
+        else:
+            yield self._refiner
+
+    def _model_version(self, model_name: str) -> str:
+        return f"{model_name}-int8" if self.quantized else model_name
+
+    def _load_qg_tokenizer(self, model_name: str) -> Any:
+        # from_slow applies legacy=False to the fast tokenizer too, so both
+        # produce the same ids (see tokenizer_report.py)
+        return load_tokenizer(
+            lambda: T5TokenizerFast.from_pretrained(model_name, legacy=False, from_slow=True),
+            lambda: T5Tokenizer.from_pretrained(model_name, legacy=False, use_fast=False),
+        )
+
+    def _load_qg_model(self, model_name: str) -> torch.nn.Module:
+        if self.quantized:
+            return load_quantized(model_name, AutoModelForSeq2SeqLM)
+        return T5ForConditionalGeneration.from_pretrained(model_name)
+
+    def generate(
+        self,
+        article: str,
+        use_evaluator: bool = True,
+        num_questions: int = None,
+        answer_style: str = "all",
+        decoding_profile: str = DEFAULT_DECODING_PROFILE,
+        time_budget: Optional[float] = None,
+        candidate_multiple: Optional[float] = DEFAULT_CANDIDATE_MULTIPLE,
+        incremental: bool = False,
+        score_threshold: float = DEFAULT_SCORE_THRESHOLD,
+        batch_size: int = DEFAULT_INCREMENTAL_BATCH_SIZE,
+        max_candidates: Optional[int] = None,
+        dedup_threshold: Optional[float] = DUPLICATE_THRESHOLD,
+        context_window: Optional[int] = None,
+        context_tokens: Optional[int] = None,
+        refine_multiple: Optional[float] = None,
+        with_info: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> List:
+        """
+        Generate question-answer pairs from an article
+
+        Args:
+            decoding_profile: One of DECODING_PROFILES
+            time_budget: Optional wall-clock budget in seconds. When generation
+                falls behind, decoding drops to a cheaper profile, and once the
+                budget is spent the questions generated so far are returned.
+            candidate_multiple: Pre-rank candidates and only generate for the
+                best num_questions * candidate_multiple of them. None or 0
+                generates for every candidate.
+            incremental: Generate and evaluate batch_size candidates at a time,
+                in ranked order, and stop as soon as num_questions pairs score
+                at least score_threshold (a raw evaluator logit) or
+                max_candidates inputs have been generated. Needs the evaluator.
+            dedup_threshold: Word Jaccard similarity at which two candidate
+                inputs (before generation) or two generated questions (after
+                it) count as near duplicates; only the better ranked one is
+                kept. None keeps duplicates.
+            context_window: Windowed context for sentence answers: each input
+                holds the answer sentence and up to this many neighbouring
+                sentences on each side instead of the whole segment
+            context_tokens: Windowed context with a token budget: neighbouring
+                sentences are added while the context stays within this many
+                tokens. Not to be combined with context_window; with neither
+                set, the whole segment is the context.
+            refine_multiple: Refine tier: once the drafts are scored, the
+                refiner regenerates the best num_questions * refine_multiple
+                of them and the result is ranked on the new scores. Needs the
+                evaluator; None keeps the drafts.
+            with_info: Also return a dict describing the decoding that was used
+            cancel_token: Checked between inputs and evaluator batches;
+                raises Cancelled once it is cancelled or past its deadline
+
+        Returns:
+            List of QA pairs, or (qa_list, info) if with_info is set
+        """
+        if decoding_profile not in DECODING_PROFILES:
+            raise ValueError(f"Invalid decoding profile {decoding_profile}. Please choose from {list(DECODING_PROFILES)}")
+        validate_context_window(context_window, context_tokens)
+        windowed = context_window is not None or context_tokens is not None
+
+        start_time = time.perf_counter()
+        info = {
+            "decoding_profile": decoding_profile,
+            "profiles_used": {},
+            "time_budget": time_budget,
+            "stopped_early": False,
+            "evaluated": False,
+            "context_window": context_window,
+            "context_tokens": context_tokens,
+            "generator": self.model_version,
+            "refined": 0,
+            "candidates_generated": 0,
+        }
+        refine_count = math.ceil((num_questions or 10) * refine_multiple) if refine_multiple else 0
 
-    def generate(self, article: str, use_evaluator: bool = True, num_questions: int = None, answer_style: str = "all") -> List:
         print("Generating questions...\n")
-        qg_inputs, qg_answers = self.generate_qg_inputs(article, answer_style)
-        generated_questions = self.generate_questions_from_inputs(qg_inputs)
-        
+        qg_inputs, qg_answers = self.generate_qg_inputs(article, answer_style, context_window, context_tokens)
+        info["candidates"] = len(qg_inputs)
+        if candidate_multiple or incremental:
+            limit = math.ceil((num_questions or 10) * candidate_multiple) if candidate_multiple else None
+            qg_inputs, qg_answers = self.prerank_qg_inputs(qg_inputs, qg_answers, limit, dedup_threshold)
+        elif dedup_threshold is not None:
+            qg_inputs, qg_answers = self.dedup_qg_inputs(qg_inputs, qg_answers, dedup_threshold)
+        check_cancelled(cancel_token)
+
+        if incremental and use_evaluator and self.qa_evaluator.evaluator_available:
+            qa_list = self._generate_incremental(
+                qg_inputs, qg_answers, num_questions or 10, score_threshold, batch_size,
+                max_candidates, decoding_profile, time_budget, start_time, info, dedup_threshold, cancel_token,
+                pad_inputs=not windowed, refine_count=refine_count
+            )
+        else:
+            qa_list = self._generate_then_evaluate(
+                qg_inputs, qg_answers, use_evaluator, num_questions,
+                decoding_profile, time_budget, start_time, info, dedup_threshold, cancel_token,
+                pad_inputs=not windowed, refine_count=refine_count
+            )
+
+        elapsed = time.perf_counter() - start_time
+        info["elapsed_seconds"] = round(elapsed, 3)
+        info["budget_used"] = round(elapsed / time_budget, 3) if time_budget else None
+
+        if with_info:
+            return qa_list, info
+        return qa_list
+
+    def generate_stream(
+        self,
+        pages: Iterable[str],
+        use_evaluator: bool = True,
+        num_questions: int = 10,
+        answer_style: str = "all",
+        decoding_profile: str = DEFAULT_DECODING_PROFILE,
+        time_budget: Optional[float] = None,
+        candidates_per_segment: Optional[int] = DEFAULT_STREAM_CANDIDATES_PER_SEGMENT,
+        max_candidates: Optional[int] = None,
+        batch_size: int = DEFAULT_INCREMENTAL_BATCH_SIZE,
+        dedup_threshold: Optional[float] = DUPLICATE_THRESHOLD,
+        context_window: Optional[int] = None,
+        context_tokens: Optional[int] = None,
+        refine_multiple: Optional[float] = None,
+        with_info: bool = False,
+        cancel_token: Optional[CancellationToken] = None,
+    ) -> List:
+        """
+        Generate question-answer pairs from a document given as an iterable of
+        page texts (e.g. Transcriber.iter_pages()) without materializing it
+
+        Pages are split into segments, and each segment's inputs are prepared,
+        generated and scored batch_size at a time as the pages arrive. Only the
+        current segment, one batch and the best num_questions *
+        STREAM_KEEP_MULTIPLE scored pairs are held, so peak memory depends on
+        the segment and batch size rather than the document length. Without
+        the evaluator, reading stops once num_questions unique questions have
+        been generated.
+
+        Args:
+            pages: Page texts, with paragraphs separated by newlines
+            candidates_per_segment: Pre-rank each segment's inputs and only
+                generate for the best this many. None or 0 generates for all.
+            max_candidates: Stop after this many inputs have been generated
+            Other arguments as for generate(). Multiple-choice distractors
+                are drawn from the same segment rather than the whole text.
+
+        Returns:
+            List of QA pairs, or (qa_list, info) if with_info is set
+        """
+        if decoding_profile not in DECODING_PROFILES:
+            raise ValueError(f"Invalid decoding profile {decoding_profile}. Please choose from {list(DECODING_PROFILES)}")
+        if answer_style not in VALID_ANSWER_STYLES:
+            raise ValueError(f"Invalid answer style {answer_style}. Please choose from {VALID_ANSWER_STYLES}")
+        validate_context_window(context_window, context_tokens)
+        windowed = context_window is not None or context_tokens is not None
+
+        start_time = time.perf_counter()
+        info = {
+            "decoding_profile": decoding_profile,
+            "profiles_used": {},
+            "time_budget": time_budget,
+            "stopped_early": False,
+            "evaluated": False,
+            "context_window": context_window,
+            "context_tokens": context_tokens,
+            "generator": self.model_version,
+            "refined": 0,
+            "pages": 0,
+            "segments": 0,
+            "candidates": 0,
+            "candidates_generated": 0,
+        }
+        evaluate = use_evaluator and self.qa_evaluator.evaluator_available
+        keep = num_questions * STREAM_KEEP_MULTIPLE
+        best = []  # min-heap of (score, -position, question, answer, input)
+        collected = []  # (question, answer) in document order, without the evaluator
+        unique = NearDuplicateFilter(dedup_threshold) if dedup_threshold is not None else None
+        profile = decoding_profile
+
+        print("Generating questions from stream...\n")
+        inputs = self._iter_stream_inputs(pages, answer_style, candidates_per_segment, dedup_threshold, info,
+                                          context_window, context_tokens)
+        if max_candidates is not None:
+            inputs = itertools.islice(inputs, max_candidates)
+        for batch in _batches(inputs, batch_size):
+            if time_budget is not None and time.perf_counter() - start_time >= time_budget:
+                info["stopped_early"] = True
+                break
+            position = info["candidates_generated"]
+            questions = self.generate_questions_from_inputs(
+                [qg_input for qg_input, _ in batch], profile, time_budget, start_time, info, cancel_token,
+                pad_inputs=not windowed
+            )
+            answers = [answer for _, answer in batch[:len(questions)]]
+            profile = info.get("current_profile", profile)
+
+            if evaluate and questions:
+                scores = self.score_qa_pairs(questions, answers, cancel_token)
+                for i, (score, question, answer, (qg_input, _)) in enumerate(zip(scores, questions, answers, batch)):
+                    entry = (score, -(position + i), question, answer, qg_input)
+                    if len(best) < keep:
+                        heapq.heappush(best, entry)
+                    else:
+                        heapq.heappushpop(best, entry)
+                info["evaluated"] = True
+            elif not evaluate:
+                collected.extend(
+                    (question, answer) for question, answer in zip(questions, answers)
+                    if unique is None or unique.add(self._question_text(question))
+                )
+
+            if len(questions) < len(batch):
+                print(f"Time budget spent after {info['candidates_generated']} inputs.\n")
+                info["stopped_early"] = True
+                break
+            if not evaluate and len(collected) >= num_questions:
+                break
+
+        if evaluate:
+            ranked = sorted(best, reverse=True)
+            if refine_multiple and ranked:
+                questions, scores = self._refine(
+                    [entry[4] for entry in ranked], [entry[2] for entry in ranked], [entry[3] for entry in ranked],
+                    [entry[0] for entry in ranked], math.ceil(num_questions * refine_multiple), decoding_profile,
+                    time_budget, start_time, info, cancel_token, not windowed
+                )
+                ranked = sorted(((score, entry[1], question, entry[3], entry[4])
+                                 for score, question, entry in zip(scores, questions, ranked)), reverse=True)
+            order = self._unique_questions(list(range(len(ranked))), [entry[2] for entry in ranked], dedup_threshold)
+            chosen = [ranked[i] for i in order[:num_questions]]
+            qa_list = self._get_all_qa_pairs([entry[2] for entry in chosen], [entry[3] for entry in chosen])
+        else:
+            qa_list = self._get_all_qa_pairs([q for q, _ in collected[:num_questions]],
+                                             [a for _, a in collected[:num_questions]])
+
+        elapsed = time.perf_counter() - start_time
+        info["elapsed_seconds"] = round(elapsed, 3)
+        info["budget_used"] = round(elapsed / time_budget, 3) if time_budget else None
+
+        if with_info:
+            return qa_list, info
+        return qa_list
+
+    def _iter_stream_inputs(self, pages: Iterable[str], answer_style: str, candidates_per_segment: Optional[int],
+                            dedup_threshold: Optional[float], info: dict, context_window: Optional[int] = None,
+                            context_tokens: Optional[int] = None) -> Iterator[Tuple[str, Any]]:
+        """(input, answer) pairs, prepared one segment at a time as pages are read"""
+        def paragraphs():
+            for page in pages:
+                info["pages"] += 1
+                yield from page.split("\n")
+
+        for segment in self._iter_segments(paragraphs()):
+            info["segments"] += 1
+            with stage("prepare_inputs"):
+                inputs, answers = self._segment_qg_inputs(segment, answer_style, context_window, context_tokens)
+            count_items("prepare_inputs", "inputs", len(inputs))
+            info["candidates"] += len(inputs)
+            if candidates_per_segment:
+                inputs, answers = self.prerank_qg_inputs(inputs, answers, candidates_per_segment, dedup_threshold)
+            elif dedup_threshold is not None:
+                inputs, answers = self.dedup_qg_inputs(inputs, answers, dedup_threshold)
+            yield from zip(inputs, answers)
+
+    def _segment_qg_inputs(self, segment: str, answer_style: str, context_window: Optional[int] = None,
+                           context_tokens: Optional[int] = None) -> Tuple[List[str], List]:
+        sentences = self._split_text(segment)
+        count_items("prepare_inputs", "sentences", len(sentences))
+        inputs, answers = [], []
+        if answer_style in ["sentences", "all"]:
+            inputs, answers = self._prepare_qg_inputs(sentences, segment, context_window, context_tokens)
+        if answer_style in ["multiple_choice", "all"]:
+            prepped_inputs, prepped_answers = self._prepare_qg_inputs_MC(sentences)
+            inputs.extend(prepped_inputs)
+            answers.extend(prepped_answers)
+        return inputs, answers
+
+    def _generate_then_evaluate(self, qg_inputs, qg_answers, use_evaluator, num_questions,
+                                decoding_profile, time_budget, start_time, info, dedup_threshold=None,
+                                cancel_token=None, pad_inputs=True, refine_count=0) -> List:
+        generated_questions = self.generate_questions_from_inputs(
+            qg_inputs, decoding_profile, time_budget, start_time, info, cancel_token, pad_inputs
+        )
+
+        if len(generated_questions) < len(qg_answers):
+            print(f"Time budget spent after {len(generated_questions)} of {len(qg_answers)} inputs.\n")
+            info["stopped_early"] = True
+            qg_answers = qg_answers[:len(generated_questions)]
+
         assert len(generated_questions) == len(qg_answers), f"{len(generated_questions)} questions doesn't match {len(qg_answers)} answers"
 
-        if use_evaluator and self.qa_evaluator.evaluator_available:
+        within_budget = time_budget is None or time.perf_counter() - start_time < time_budget
+        if use_evaluator and within_budget and self.qa_evaluator.evaluator_available:
             print("Evaluating QA pairs...\n")
-            encoded_qa_pairs = self.qa_evaluator.encode_qa_pairs(generated_questions, qg_answers)
-            scores = self.qa_evaluator.get_scores(encoded_qa_pairs)
+            raw_scores = self.score_qa_pairs(generated_questions, qg_answers, cancel_token)
+            if refine_count:
+                generated_questions, raw_scores = self._refine(
+                    qg_inputs, generated_questions, qg_answers, raw_scores, refine_count, decoding_profile,
+                    time_budget, start_time, info, cancel_token, pad_inputs
+                )
+            scores = self.qa_evaluator.rank_scores(raw_scores)
+            scores = self._unique_questions(scores, generated_questions, dedup_threshold)
             qa_list = self._get_ranked_qa_pairs(generated_questions, qg_answers, scores, num_questions or 10)
+            info["evaluated"] = True
         else:
             print("Skipping evaluation step.\n")
-            qa_list = self._get_all_qa_pairs(generated_questions, qg_answers)
+            order = self._unique_questions(list(range(len(generated_questions))), generated_questions, dedup_threshold)
+            qa_list = self._get_all_qa_pairs([generated_questions[i] for i in order], [qg_answers[i] for i in order])
             if num_questions and len(qa_list) > num_questions:
                 qa_list = qa_list[:num_questions]
 
         return qa_list
 
-    def generate_qg_inputs(self, text: str, answer_style: str) -> Tuple[List[str], List[str]]:
-        VALID_ANSWER_STYLES = ["all", "sentences", "multiple_choice"]
+    def _generate_incremental(self, qg_inputs, qg_answers, num_questions, score_threshold, batch_size,
+                              max_candidates, decoding_profile, time_budget, start_time, info,
+                              dedup_threshold=None, cancel_token=None, pad_inputs=True, refine_count=0) -> List:
+        print("Generating and evaluating questions incrementally...\n")
+        limit = len(qg_inputs) if max_candidates is None else min(max_candidates, len(qg_inputs))
+        profile = decoding_profile
+        scored = []
+        num_accepted = 0
+        # near duplicates of an accepted question do not count towards num_questions
+        accepted = NearDuplicateFilter(dedup_threshold) if dedup_threshold is not None else None
+
+        for batch_start in range(0, limit, batch_size):
+            batch_inputs = qg_inputs[batch_start:min(batch_start + batch_size, limit)]
+            questions = self.generate_questions_from_inputs(
+                batch_inputs, profile, time_budget, start_time, info, cancel_token, pad_inputs
+            )
+            answers = qg_answers[batch_start:batch_start + len(questions)]
+            profile = info.get("current_profile", profile)
+
+            if questions:
+                scores = self.score_qa_pairs(questions, answers, cancel_token)
+                scored.extend(zip(scores, questions, answers, batch_inputs))
+                num_accepted += sum(
+                    1 for score, question in zip(scores, questions)
+                    if score >= score_threshold and (accepted is None or accepted.add(self._question_text(question)))
+                )
+                info["evaluated"] = True
+
+            if num_accepted >= num_questions:
+                break
+            if len(questions) < len(batch_inputs):
+                print(f"Time budget spent after {len(scored)} inputs.\n")
+                info["stopped_early"] = True
+                break
+
+        info["candidates_evaluated"] = len(scored)
+        info["accepted"] = num_accepted
+        if len(scored) < num_questions:
+            print(f"\nWas only able to generate {len(scored)} questions. For more questions, please input a longer text.")
+
+        if refine_count and scored:
+            questions, scores = self._refine(
+                [entry[3] for entry in scored], [entry[1] for entry in scored], [entry[2] for entry in scored],
+                [entry[0] for entry in scored], refine_count, decoding_profile, time_budget, start_time, info,
+                cancel_token, pad_inputs
+            )
+            scored = [(score, question, entry[2], entry[3]) for score, question, entry in zip(scores, questions, scored)]
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        order = self._unique_questions(list(range(len(scored))), [entry[1] for entry in scored], dedup_threshold)
+        best = [scored[i] for i in order[:num_questions]]
+        return self._get_all_qa_pairs([entry[1] for entry in best], [entry[2] for entry in best])
+
+    def _refine(self, qg_inputs: List[str], questions: List[str], answers: List, raw_scores: List[float],
+                count: int, decoding_profile: str, time_budget: Optional[float], start_time: float, info: dict,
+                cancel_token: Optional[CancellationToken] = None, pad_inputs: bool = True) -> Tuple[List[str], List[float]]:
+        """
+        Regenerate the count best-scored drafts with the refiner and score the
+        new questions
+
+        Returns:
+            (questions, raw scores) in the order given, with the refined
+            questions and their scores in place of the drafts
+        """
+        top = sorted(range(len(raw_scores)), key=lambda i: raw_scores[i], reverse=True)[:count]
+        with self.use_refiner() as refiner, stage("refine"):
+            refined = refiner.generate_questions_from_inputs(
+                [qg_inputs[i] for i in top], decoding_profile, time_budget, start_time,
+                cancel_token=cancel_token, pad_inputs=pad_inputs
+            )
+            refiner_version = refiner.model_version
+        top = top[:len(refined)]
+        refined_scores = self.score_qa_pairs(refined, [answers[i] for i in top], cancel_token)
+        count_items("refine", "inputs", len(refined))
+
+        questions, raw_scores = list(questions), list(raw_scores)
+        for i, question, score in zip(top, refined, refined_scores):
+            questions[i], raw_scores[i] = question, score
+        info["refined"] += len(refined)
+        info["refiner"] = refiner_version
+        return questions, raw_scores
+
+    def generate_qg_inputs(self, text: str, answer_style: str, context_window: Optional[int] = None,
+                           context_tokens: Optional[int] = None) -> Tuple[List[str], List[str]]:
         if answer_style not in VALID_ANSWER_STYLES:
             raise ValueError(f"Invalid answer style {answer_style}. Please choose from {VALID_ANSWER_STYLES}")
+        validate_context_window(context_window, context_tokens)
 
+        with stage("prepare_inputs"):
+            inputs, answers = self._generate_qg_inputs(text, answer_style, context_window, context_tokens)
+        count_items("prepare_inputs", "inputs", len(inputs))
+        return inputs, answers
+
+    def _generate_qg_inputs(self, text: str, answer_style: str, context_window: Optional[int] = None,
+                            context_tokens: Optional[int] = None) -> Tuple[List[str], List[str]]:
         inputs = []
         answers = []
 
@@ -63,7 +572,9 @@ class QuestionGenerator:
             segments = self._split_into_segments(text)
             for segment in segments:
                 sentences = self._split_text(segment)
-                prepped_inputs, prepped_answers = self._prepare_qg_inputs(sentences, segment)
+                count_items("prepare_inputs", "sentences", len(sentences))
+                prepped_inputs, prepped_answers = self._prepare_qg_inputs(sentences, segment, context_window,
+                                                                          context_tokens)
                 inputs.extend(prepped_inputs)
                 answers.extend(prepped_answers)
 
@@ -75,13 +586,157 @@ class QuestionGenerator:
 
         return inputs, answers
 
-    def generate_questions_from_inputs(self, qg_inputs: List) -> List[str]:
+    def prerank_qg_inputs(self, qg_inputs: List[str], qg_answers: List, limit: int = None,
+                          dedup_threshold: Optional[float] = DUPLICATE_THRESHOLD) -> Tuple[List[str], List]:
+        """
+        Cheaply order generation inputs by TF-IDF salience, sentence length and
+        entity density, drop near duplicates and keep the best `limit` of them
+        """
+        candidates = self._ranking_candidates(qg_inputs, qg_answers)
+        with stage("prerank"):
+            order = rank_candidates(candidates, limit, dedup_threshold)
+        return [qg_inputs[i] for i in order], [qg_answers[i] for i in order]
+
+    def dedup_qg_inputs(self, qg_inputs: List[str], qg_answers: List,
+                        dedup_threshold: float = DUPLICATE_THRESHOLD) -> Tuple[List[str], List]:
+        """Drop near-duplicate generation inputs, keeping the original order"""
+        candidates = self._ranking_candidates(qg_inputs, qg_answers)
+        with stage("dedup"):
+            order = dedup_candidates(candidates, dedup_threshold)
+        return [qg_inputs[i] for i in order], [qg_answers[i] for i in order]
+
+    def _ranking_candidates(self, qg_inputs: List[str], qg_answers: List) -> List[Tuple[str, str]]:
+        # (answer, focus sentence) per input
+        candidates = []
+        for qg_input, answer in zip(qg_inputs, qg_answers):
+            if isinstance(answer, list):
+                focus = qg_input.split(self.CONTEXT_TOKEN, 1)[-1].strip()
+                candidates.append((QAEvaluator.correct_answer(answer), focus))
+            else:
+                candidates.append((answer, answer))
+        return candidates
+
+    def _unique_questions(self, order: List[int], questions: List[str], dedup_threshold: Optional[float]) -> List[int]:
+        """Filter indices (best first) down to questions that are not near duplicates of a better one"""
+        if dedup_threshold is None:
+            return order
+        with stage("dedup"):
+            dedup = NearDuplicateFilter(dedup_threshold)
+            kept = [i for i in order if dedup.add(self._question_text(questions[i]))]
+        count_items("dedup", "questions_dropped", len(order) - len(kept))
+        return kept
+
+    @staticmethod
+    def _question_text(question: str) -> str:
+        return question.split("?")[0]
+
+    def generate_questions_from_inputs(
+        self,
+        qg_inputs: List,
+        decoding_profile: str = DEFAULT_DECODING_PROFILE,
+        time_budget: Optional[float] = None,
+        start_time: Optional[float] = None,
+        info: Optional[dict] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        pad_inputs: bool = True,
+    ) -> List[str]:
+        """
+        Generate one question per input. With a time budget, the profile is
+        downgraded whenever the remaining inputs are projected to overrun it,
+        and generation stops once the budget is spent, so fewer questions than
+        inputs may be returned. cancel_token is checked before every input.
+        Inputs are padded to SEQ_LENGTH tokens, as the model always was, unless
+        pad_inputs is False: then they are only padded to the longest input,
+        which is what makes windowed context cheaper. The padding is masked
+        either way.
+        """
+        start_time = start_time if start_time is not None else time.perf_counter()
+        profiles_used = info["profiles_used"] if info is not None else {}
+        with stage("t5_generate"):
+            generated_questions = self._generate_questions(
+                qg_inputs, decoding_profile, time_budget, start_time, profiles_used, info, cancel_token, pad_inputs
+            )
+        count_items("t5_generate", "inputs", len(generated_questions))
+        if info is not None:
+            # Counted from the output: a spent time budget stops generation early
+            info["candidates_generated"] = info.get("candidates_generated", 0) + len(generated_questions)
+        return generated_questions
+
+    def _generate_questions(self, qg_inputs, decoding_profile, time_budget, start_time, profiles_used, info,
+                            cancel_token=None, pad_inputs=True) -> List[str]:
+        keys = [segment_key(qg_input) for qg_input in qg_inputs]
+        cached = self._question_cache(decoding_profile, pad_inputs).get_many(keys) if self.segment_cache else {}
+        pending = sum(1 for key in keys if key not in cached)
+        profile = decoding_profile
+        profile_start, profile_count = time.perf_counter(), 0
+
+        # Inputs to generate for are tokenized together up front
+        uncached = [i for i, key in enumerate(keys) if key not in cached]
+        encoded_inputs = dict(zip(uncached, self._encode_qg_inputs([qg_inputs[i] for i in uncached], pad_inputs)))
+
         generated_questions = []
-        for qg_input in qg_inputs:
-            question = self._generate_question(qg_input)
+        new_questions = {}  # profile -> {input key: question}
+        for i, (qg_input, key) in enumerate(zip(qg_inputs, keys)):
+            if key in cached:
+                generated_questions.append(cached[key])
+                continue
+            check_cancelled(cancel_token)
+
+            if time_budget is not None and profile_count > 0:
+                now = time.perf_counter()
+                remaining_budget = time_budget - (now - start_time)
+                if remaining_budget <= 0:
+                    break
+                per_input = (now - profile_start) / profile_count
+                if per_input * pending > remaining_budget and profile in CHEAPER_PROFILE:
+                    profile = CHEAPER_PROFILE[profile]
+                    profile_start, profile_count = now, 0
+
+            question = self._generate_question(qg_input, profile, encoded_inputs.pop(i, None))
             generated_questions.append(question)
+            new_questions.setdefault(profile, {})[key] = question
+            profiles_used[profile] = profiles_used.get(profile, 0) + 1
+            profile_count += 1
+            pending -= 1
+
+        if self.segment_cache:
+            for used_profile, questions in new_questions.items():
+                self._question_cache(used_profile, pad_inputs).put_many(questions)
+        count_items("t5_generate", "cached", len(cached))
+        if info is not None:
+            info["current_profile"] = profile
+            info["cached_questions"] = info.get("cached_questions", 0) + len(cached)
         return generated_questions
 
+    def _question_cache(self, decoding_profile: str, pad_inputs: bool = True) -> Any:
+        # Questions cached before the padding was masked were generated over
+        # the padding, so padded inputs moved to a new namespace
+        suffix = ":masked" if pad_inputs else ":unpadded"
+        return self.segment_cache.namespace(f"questions:{self.model_version}:{decoding_profile}{suffix}")
+
+    def score_qa_pairs(self, questions: List[str], answers: List,
+                       cancel_token: Optional[CancellationToken] = None) -> List[float]:
+        """
+        Raw evaluator scores for QA pairs; pairs scored before (same
+        question, same correct answer) are served from the segment cache
+        """
+        qa_evaluator = self.qa_evaluator
+        keys = [segment_key(question, qa_evaluator.correct_answer(answer))
+                for question, answer in zip(questions, answers)]
+        cache = self.segment_cache.namespace(f"scores:{qa_evaluator.model_version}") if self.segment_cache else None
+        cached = cache.get_many(keys) if cache else {}
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        if missing:
+            encoded_qa_pairs = qa_evaluator.encode_qa_pairs([questions[i] for i in missing],
+                                                            [answers[i] for i in missing])
+            raw_scores = qa_evaluator.get_raw_scores(encoded_qa_pairs, cancel_token)
+            new_scores = dict(zip((keys[i] for i in missing), raw_scores))
+            if cache:
+                cache.put_many(new_scores)
+            cached.update(new_scores)
+        return [cached[key] for key in keys]
+
     def _split_text(self, text: str) -> List[str]:
         MAX_SENTENCE_LEN = 128
         sentences = re.findall(".*?[.!\?]", text)
@@ -96,37 +751,114 @@ class QuestionGenerator:
         return list(set([s.strip(" ") for s in sentences]))
 
     def _split_into_segments(self, text: str) -> List[str]:
-        MAX_TOKENS = 490
-        paragraphs = text.split("\n")
-        tokenized_paragraphs = []
-        
-        for p in paragraphs:
-            if len(p) > 0:
-                tokens = self.qg_tokenizer(p, return_tensors="pt", truncation=True, max_length=512)["input_ids"][0].tolist()
-                tokenized_paragraphs.append(tokens)
-        
-        segments = []
-        while len(tokenized_paragraphs) > 0:
-            segment = []
-            while len(segment) < MAX_TOKENS and len(tokenized_paragraphs) > 0:
-                paragraph = tokenized_paragraphs.pop(0)
-                segment.extend(paragraph)
-            segments.append(segment)
+        return list(self._iter_segments(text.split("\n")))
+
+    def _iter_segments(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        """Group paragraphs into context segments, yielding each as soon as it ends"""
+        segment = []
+        for batch in _batches((p for p in paragraphs if len(p) > 0), SEGMENT_ENCODE_BATCH):
+            for text, tokens in self._paragraph_tokens(batch):
+                segment.extend(tokens)
+                at_boundary = int(segment_key(text)[:8], 16) % SEGMENT_BOUNDARY_MODULUS == 0
+                if len(segment) >= MAX_SEGMENT_TOKENS or (len(segment) >= MIN_SEGMENT_TOKENS and at_boundary):
+                    yield self.qg_tokenizer.decode(segment, skip_special_tokens=True)
+                    segment = []
+        if segment:
+            yield self.qg_tokenizer.decode(segment, skip_special_tokens=True)
 
-        return [self.qg_tokenizer.decode(s, skip_special_tokens=True) for s in segments]
+    def _paragraph_tokens(self, paragraphs: List[str]) -> List[Tuple[str, List[int]]]:
+        """
+        Token ids of a batch of paragraphs, as (key, ids) pieces of at most
+        SEQ_LENGTH tokens. Paragraphs longer than that continue in further
+        pieces, split the same way by both tokenizers: the fast one returns
+        them as overflowing tokens, and the slow one's ids are cut into the
+        same chunks. The first piece is keyed by the paragraph and the rest
+        by their ids, so segment boundaries do not depend on the tokenizer.
+        """
+        tokenizer = self.qg_tokenizer
+        if tokenizer.is_fast:
+            encoding = tokenizer(paragraphs, truncation=True, max_length=self.SEQ_LENGTH,
+                                 return_overflowing_tokens=True)
+            piece_ids, indices = encoding["input_ids"], encoding["overflow_to_sample_mapping"]
+        else:
+            chunk = self.SEQ_LENGTH - tokenizer.num_special_tokens_to_add()
+            piece_ids, indices = [], []
+            for index, ids in enumerate(tokenizer(paragraphs, add_special_tokens=False)["input_ids"]):
+                for start in range(0, max(len(ids), 1), chunk):
+                    piece_ids.append(tokenizer.build_inputs_with_special_tokens(ids[start:start + chunk]))
+                    indices.append(index)
 
-    def _prepare_qg_inputs(self, sentences: List[str], text: str) -> Tuple[List[str], List[str]]:
+        pieces = []
+        previous = None
+        for ids, index in zip(piece_ids, indices):
+            key = paragraphs[index] if index != previous else " ".join(map(str, ids))
+            pieces.append((key, ids))
+            previous = index
+        count_items("prepare_inputs", "paragraph_pieces", len(pieces) - len(paragraphs))
+        return pieces
+
+    def _prepare_qg_inputs(self, sentences: List[str], text: str, context_window: Optional[int] = None,
+                           context_tokens: Optional[int] = None) -> Tuple[List[str], List[str]]:
+        if context_window is None and context_tokens is None:
+            contexts = [text] * len(sentences)
+        else:
+            contexts = self._context_windows(sentences, text, context_window, context_tokens)
         inputs = []
         answers = []
-        for sentence in sentences:
-            qg_input = f"{self.ANSWER_TOKEN} {sentence} {self.CONTEXT_TOKEN} {text}"
+        for sentence, context in zip(sentences, contexts):
+            qg_input = f"{self.ANSWER_TOKEN} {sentence} {self.CONTEXT_TOKEN} {context}"
             inputs.append(qg_input)
             answers.append(sentence)
         return inputs, answers
 
+    def _context_windows(self, sentences: List[str], text: str, context_window: Optional[int],
+                         context_tokens: Optional[int]) -> List[str]:
+        """
+        Context of each answer sentence: the span of text from the sentence
+        outwards, taking neighbouring sentences alternately before and after
+        it, up to context_window on each side or while the span stays within
+        context_tokens tokens. A side stops growing at the first sentence that
+        does not fit.
+        """
+        spans = [match.span() for match in re.finditer(".*?[.!\?]", text)]
+        if not spans:
+            return [text] * len(sentences)
+        position = {}
+        for i, (start, end) in enumerate(spans):
+            position.setdefault(text[start:end].strip(" "), i)
+        lengths = [len(ids) for ids in self.qg_tokenizer([text[start:end] for start, end in spans],
+                                                         add_special_tokens=False)["input_ids"]]
+        limit = len(spans) if context_window is None else context_window
+
+        contexts = []
+        total_tokens = 0
+        for sentence in sentences:
+            i = position.get(sentence)
+            if i is None:
+                contexts.append(text)
+                continue
+            first, last, used = i, i, lengths[i]
+            open_before, open_after = True, True
+            for _ in range(limit):
+                if open_before:
+                    open_before = first > 0 and (context_tokens is None or used + lengths[first - 1] <= context_tokens)
+                    if open_before:
+                        first -= 1
+                        used += lengths[first]
+                if open_after:
+                    open_after = last + 1 < len(spans) and (context_tokens is None or used + lengths[last + 1] <= context_tokens)
+                    if open_after:
+                        last += 1
+                        used += lengths[last]
+                if not open_before and not open_after:
+                    break
+            contexts.append(text[spans[first][0]:spans[last][1]].strip())
+            total_tokens += used
+        count_items("prepare_inputs", "window_context_tokens", total_tokens)
+        return contexts
+
     def _prepare_qg_inputs_MC(self, sentences: List[str]) -> Tuple[List[str], List[str]]:
-        spacy_nlp = en_core_web_sm.load()
-        docs = list(spacy_nlp.pipe(sentences, disable=["parser"]))
+        docs = list(self._get_spacy_nlp().pipe(sentences, disable=["parser"]))
         inputs_from_text = []
         answers_from_text = []
 
@@ -141,6 +873,13 @@ class QuestionGenerator:
 
         return inputs_from_text, answers_from_text
 
+    def _get_spacy_nlp(self) -> Any:
+        if self._spacy_nlp is None:
+            self._spacy_nlp = en_core_web_sm.load()
+        if callable(self._spacy_nlp) and not hasattr(self._spacy_nlp, "pipe"):
+            return self._spacy_nlp()
+        return self._spacy_nlp
+
     def _get_MC_answers(self, correct_answer: Any, docs: Any) -> List[Mapping[str, Any]]:
         entities = []
         for doc in docs:
@@ -174,27 +913,58 @@ class QuestionGenerator:
         return final_choices
 
     @torch.no_grad()
-    def _generate_question(self, qg_input: str) -> str:
-        encoded_input = self._encode_qg_input(qg_input)
+    def _generate_question(self, qg_input: str, decoding_profile: str = DEFAULT_DECODING_PROFILE,
+                           encoded_input: Optional[dict] = None) -> str:
+        if encoded_input is None:
+            encoded_input = self._encode_qg_input(qg_input)
+        settings = DECODING_PROFILES[decoding_profile]
         output = self.qg_model.generate(
             input_ids=encoded_input["input_ids"],
-            max_length=64,
-            num_beams=4,
-            early_stopping=True,
+            attention_mask=encoded_input["attention_mask"],
+            max_length=settings["max_length"],
+            num_beams=settings["num_beams"],
+            early_stopping=settings["num_beams"] > 1,
             do_sample=False
         )
         question = self.qg_tokenizer.decode(output[0], skip_special_tokens=True)
         return question
 
-    def _encode_qg_input(self, qg_input: str) -> dict:
+    def _encode_qg_input(self, qg_input: str, pad: bool = True) -> dict:
+        return self._encode_qg_inputs([qg_input], pad)[0]
+
+    def _encode_qg_inputs(self, qg_inputs: List[str], pad: bool = True) -> List[dict]:
+        """
+        Encode generation inputs in one batch; one dict of [1, length] input
+        ids and attention mask per input, where length is SEQ_LENGTH when
+        padding and the longest input's token count otherwise
+        """
+        if not qg_inputs:
+            return []
+        if self.highlight_inputs:
+            qg_inputs = [self._highlight_input(qg_input) for qg_input in qg_inputs]
         encoding = self.qg_tokenizer(
-            qg_input,
-            padding='max_length',
+            qg_inputs,
+            padding='max_length' if pad else 'longest',
             max_length=self.SEQ_LENGTH,
             truncation=True,
             return_tensors="pt",
         )
-        return {k: v.to(self.device) for k, v in encoding.items()}
+        count_items("t5_generate", "tokens", int(encoding["attention_mask"].sum()))
+        return _split_encoding(encoding, len(qg_inputs), self.device)
+
+    def _highlight_input(self, qg_input: str) -> str:
+        """
+        Rewrite "<answer> A <context> C" as "generate question: ... <hl> A <hl> ...",
+        the format of the highlight-trained generators, marking the answer
+        where it occurs in the context (or in front of it otherwise)
+        """
+        answer, _, context = qg_input[len(self.ANSWER_TOKEN):].partition(self.CONTEXT_TOKEN)
+        answer, context = answer.strip(), context.strip()
+        position = context.find(answer)
+        if position < 0:
+            return f"generate question: {HIGHLIGHT_TOKEN} {answer} {HIGHLIGHT_TOKEN} {context}"
+        before, after = context[:position], context[position + len(answer):]
+        return f"generate question: {before}{HIGHLIGHT_TOKEN} {answer} {HIGHLIGHT_TOKEN}{after}"
 
     def _get_ranked_qa_pairs(self, generated_questions: List[str], qg_answers: List[str], scores, num_questions: int = 10) -> List[Mapping[str, str]]:
         if num_questions > len(scores):
@@ -223,45 +993,74 @@ class QuestionGenerator:
 
 
 class QAEvaluator:
-    def __init__(self) -> None:
+    def __init__(self, quantize: Optional[bool] = None) -> None:
         QAE_PRETRAINED = "iarfmoose/bert-base-cased-qa-evaluator"
         self.SEQ_LENGTH = 512
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.quantized = quantization_enabled(quantize) and self.device.type == "cpu"
         
-        self.qae_tokenizer = AutoTokenizer.from_pretrained(QAE_PRETRAINED, use_fast=False)
-        self.qae_model = AutoModelForSequenceClassification.from_pretrained(QAE_PRETRAINED)
+        self.qae_tokenizer = self._load_qae_tokenizer(QAE_PRETRAINED)
+        self.qae_model = self._load_qae_model(QAE_PRETRAINED)
         self.qae_model.to(self.device)
         self.qae_model.eval()
+        self.model_version = self._model_version(QAE_PRETRAINED)
         self.evaluator_available = True
 
-    def encode_qa_pairs(self, questions: List[str], answers: List[str]) -> List[torch.tensor]:
-        encoded_pairs = []
-        for question, answer in zip(questions, answers):
-            encoded_qa = self._encode_qa(question, answer)
-            encoded_pairs.append(encoded_qa)
-        return encoded_pairs
-
-    def get_scores(self, encoded_qa_pairs: List[torch.tensor]) -> List[int]:
-        scores = {}
-        for i in range(len(encoded_qa_pairs)):
-            scores[i] = self._evaluate_qa(encoded_qa_pairs[i])
-        return [k for k, v in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+    def _model_version(self, model_name: str) -> str:
+        return f"{model_name}-int8" if self.quantized else model_name
 
-    def _encode_qa(self, question: str, answer: str) -> dict:
-        if type(answer) is list:
-            correct_answer = next((a["answer"] for a in answer if a["correct"]), answer[0]["answer"])
-        else:
-            correct_answer = answer
+    def _load_qae_tokenizer(self, model_name: str) -> Any:
+        return load_tokenizer(
+            lambda: AutoTokenizer.from_pretrained(model_name, use_fast=True),
+            lambda: AutoTokenizer.from_pretrained(model_name, use_fast=False),
+        )
 
+    def _load_qae_model(self, model_name: str) -> torch.nn.Module:
+        if self.quantized:
+            return load_quantized(model_name, AutoModelForSequenceClassification)
+        return AutoModelForSequenceClassification.from_pretrained(model_name)
+
+    def encode_qa_pairs(self, questions: List[str], answers: List[str]) -> List[torch.tensor]:
+        """Encode QA pairs in one batch; one dict of [1, SEQ_LENGTH] tensors per pair"""
+        questions = list(questions)
+        if not questions:
+            return []
         encoding = self.qae_tokenizer(
-            text=question,
-            text_pair=correct_answer,
+            text=questions,
+            text_pair=[self.correct_answer(answer) for answer in answers],
             padding="max_length",
             max_length=self.SEQ_LENGTH,
             truncation=True,
             return_tensors="pt",
         )
-        return {k: v.to(self.device) for k, v in encoding.items()}
+        return _split_encoding(encoding, len(questions), self.device)
+
+    def get_scores(self, encoded_qa_pairs: List[torch.tensor],
+                   cancel_token: Optional[CancellationToken] = None) -> List[int]:
+        return self.rank_scores(self.get_raw_scores(encoded_qa_pairs, cancel_token))
+
+    @staticmethod
+    def rank_scores(raw_scores: List[float]) -> List[int]:
+        """Indices of the QA pairs, best score first"""
+        scores = dict(enumerate(raw_scores))
+        return [k for k, v in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
+
+    @staticmethod
+    def correct_answer(answer: Any) -> str:
+        """The answer text the evaluator scores (the correct option for multiple choice)"""
+        if type(answer) is list:
+            return next((a["answer"] for a in answer if a["correct"]), answer[0]["answer"])
+        return answer
+
+    def get_raw_scores(self, encoded_qa_pairs: List[torch.tensor],
+                       cancel_token: Optional[CancellationToken] = None) -> List[float]:
+        scores = []
+        with stage("evaluate"):
+            for encoded_qa_pair in encoded_qa_pairs:
+                check_cancelled(cancel_token)
+                scores.append(self._evaluate_qa(encoded_qa_pair))
+        count_items("evaluate", "pairs", len(scores))
+        return scores
 
     @torch.no_grad()
     def _evaluate_qa(self, encoded_qa_pair: dict) -> float:
@@ -269,6 +1068,35 @@ class QAEvaluator:
         return float(output.logits[0][1])
 
 
+def load_tokenizer(load_fast: Callable[[], Any], load_slow: Callable[[], Any]) -> Any:
+    """
+    Fast (Rust) tokenizer when QG_FAST_TOKENIZERS=1, otherwise (or when the
+    fast one cannot be built: it is converted from the sentencepiece model,
+    which needs sentencepiece and protobuf) the slow Python one. Fast
+    tokenizers stay opt-in until tokenizer_report.py shows parity for the
+    deployed models.
+    """
+    if os.environ.get(FAST_TOKENIZERS_ENV, "0").strip().lower() in ("1", "true", "yes"):
+        try:
+            return load_fast()
+        except Exception as e:
+            print(f"Warning: Could not load fast tokenizer, using the slow one: {e}")
+    return load_slow()
+
+
+def _split_encoding(encoding: Mapping[str, torch.Tensor], count: int, device: torch.device) -> List[dict]:
+    return [{k: v[i:i + 1].to(device) for k, v in encoding.items()} for i in range(count)]
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
 def print_qa(qa_list: List[Mapping[str, str]], show_answers: bool = True) -> None:
     for i in range(len(qa_list)):
         space = " " * (3 if i < 9 else 4)
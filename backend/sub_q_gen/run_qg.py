@@ -1,4 +1,10 @@
 import argparse
+import os
+import sys
+
+# Shared backend modules (metrics, ...) live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from questiongenerator import QuestionGenerator
 from questiongenerator import print_qa
 
@@ -9,6 +15,8 @@ def parse_args() -> argparse.Namespace:
                        help="The desired type of answers. Choose from ['all', 'sentences', 'multiple_choice']")
     parser.add_argument("--model_dir", type=str, default=None)
     parser.add_argument("--num_questions", type=int, default=10)
+    parser.add_argument("--quantize", dest="quantize", action="store_true", default=None,
+                       help="Run the generator and evaluator with int8 weights (default: QG_QUANTIZE env var)")
     parser.add_argument("--show_answers", dest="show_answers", action="store_true", default=True)
     parser.add_argument("--text_file", type=str, required=True)
     parser.add_argument("--use_qa_eval", dest="use_qa_eval", action="store_true", default=True)
@@ -21,7 +29,7 @@ if __name__ == "__main__":
     with open(args.text_file, 'r') as file:
         text_file = file.read()
     
-    qg = QuestionGenerator()
+    qg = QuestionGenerator(quantize=args.quantize)
     qa_list = qg.generate(
         text_file,
         num_questions=int(args.num_questions),
@@ -0,0 +1,119 @@
+"""
+Compare the generator tiers on a fixed corpus
+
+Every tier answers the same request on each document of the benchmark corpus
+(models are loaded up front, so load time is not counted):
+
+    base    the base model generates for every candidate
+    fast    the small model generates for every candidate
+    refine  the small model drafts every candidate and the base model
+            regenerates the drafts the QA evaluator ranks highest
+
+For each tier the report gives the time per document and speedup over base,
+questions per second, the evaluator's mean score for the returned questions
+(all tiers are scored by the same evaluator), and how many of the answers
+base picked the tier picked too.
+
+Usage:
+    python tier_report.py [--size medium] [--num_questions 10] [--profile quality]
+                          [--text_file FILE] [--output tier_report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+# Shared backend modules (metrics, ...) live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profiles import DEFAULT_REFINE_MULTIPLE, SMALL_GENERATOR_MODEL
+
+
+def run_tier(qg: Any, corpus: List[str], num_questions: int, decoding_profile: str,
+             refine: bool) -> Dict[str, Any]:
+    seconds, results, refined = [], [], 0
+    for text in corpus:
+        start = time.perf_counter()
+        qa_list, info = qg.generate(
+            text, num_questions=num_questions, decoding_profile=decoding_profile,
+            refine_multiple=DEFAULT_REFINE_MULTIPLE if refine else None, with_info=True,
+        )
+        seconds.append(time.perf_counter() - start)
+        refined += info["refined"]
+        results.append(qa_list)
+
+    questions = [qa["question"] for qa_list in results for qa in qa_list]
+    answers = [qa["answer"] for qa_list in results for qa in qa_list]
+    scores = qg.score_qa_pairs(questions, answers) if questions else []
+    return {
+        "generator": qg.model_version,
+        "seconds": sum(seconds),
+        "seconds_per_document": sum(seconds) / len(seconds) if seconds else None,
+        "questions": len(questions),
+        "questions_per_second": len(questions) / sum(seconds) if sum(seconds) else None,
+        "refined": refined,
+        "mean_evaluator_score": sum(scores) / len(scores) if scores else None,
+        "answers": [sorted(str(qa["answer"]) for qa in qa_list) for qa_list in results],
+        "examples": [{"question": q, "answer": str(a)} for q, a in zip(questions, answers)][:10],
+    }
+
+
+def answer_overlap(base: Dict[str, Any], tier: Dict[str, Any]) -> float:
+    shared = sum(len(set(a) & set(b)) for a, b in zip(base["answers"], tier["answers"]))
+    total = sum(len(a) for a in base["answers"])
+    return shared / total if total else 1.0
+
+
+def build_report(tiers: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    base = tiers["base"]
+    report = {}
+    for name, result in tiers.items():
+        row = {k: v for k, v in result.items() if k != "answers"}
+        row["speedup"] = base["seconds"] / result["seconds"] if result["seconds"] else None
+        row["answer_overlap_with_base"] = answer_overlap(base, result)
+        if base["mean_evaluator_score"] is not None and result["mean_evaluator_score"] is not None:
+            row["evaluator_score_delta"] = result["mean_evaluator_score"] - base["mean_evaluator_score"]
+        report[name] = row
+    return report
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=str, default="medium", help="Benchmark corpus size")
+    parser.add_argument("--num_questions", type=int, default=10)
+    parser.add_argument("--profile", type=str, default="quality", help="Decoding profile")
+    parser.add_argument("--text_file", type=str, default=None, help="Document to use instead of the benchmark corpus")
+    parser.add_argument("--output", type=str, default="tier_report.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.text_file:
+        with open(args.text_file, 'r') as file:
+            corpus = [file.read()]
+    else:
+        from benchmarks import corpora
+        # One document per page, so the small and large cases are both covered
+        corpus = corpora.pages(args.size) + [corpora.text(args.size)]
+
+    from questiongenerator import QAEvaluator, QuestionGenerator
+
+    evaluator = QAEvaluator()
+    base_qg = QuestionGenerator(qa_evaluator=evaluator)
+    small_qg = QuestionGenerator(qa_evaluator=evaluator, model_name=SMALL_GENERATOR_MODEL, refiner=base_qg)
+
+    report = build_report({
+        "base": run_tier(base_qg, corpus, args.num_questions, args.profile, refine=False),
+        "fast": run_tier(small_qg, corpus, args.num_questions, args.profile, refine=False),
+        "refine": run_tier(small_qg, corpus, args.num_questions, args.profile, refine=True),
+    })
+
+    print(json.dumps({name: {k: v for k, v in row.items() if k != "examples"} for name, row in report.items()},
+                     indent=2))
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
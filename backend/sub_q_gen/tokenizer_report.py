@@ -0,0 +1,227 @@
+"""
+Check that the fast (Rust) tokenizers match the slow ones, and compare their speed
+
+For the T5 question generator and the BERT QA evaluator, a reference corpus
+is encoded the way the pipeline encodes it (context paragraphs, padded
+generation inputs, padded QA pairs) with both tokenizers, and every token id,
+attention mask and token type id is compared. The context segments built by
+QuestionGenerator._iter_segments are compared as well, over paragraphs of
+any length, and so are the pieces QuestionGenerator._paragraph_tokens splits
+paragraphs longer than SEQ_LENGTH tokens into. Throughput is measured for the old path (slow tokenizer,
+one text at a time) and the new one (fast tokenizer, batched).
+
+Usage:
+    python tokenizer_report.py [--size medium] [--text_file FILE] [--output tokenizer_report.json]
+
+Exits with status 1 when any encoding differs.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+# Shared backend modules (metrics, benchmarks, ...) live one directory up
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transformers import AutoTokenizer, T5Tokenizer, T5TokenizerFast
+
+from quantization_report import REFERENCE_CORPUS
+from questiongenerator import QuestionGenerator
+
+QG_PRETRAINED = "iarfmoose/t5-base-question-generator"
+QAE_PRETRAINED = "iarfmoose/bert-base-cased-qa-evaluator"
+SEQ_LENGTH = 512
+
+# Text the transcripts do not always normalise away
+EDGE_CASES = [
+    "  Leading,  doubled   and trailing spaces.  ",
+    "Numbers 3.14159, 1,000,000 and 2^10 = 1024; ratios like 3:1 and 50%.",
+    "Symbols {braces}, ~tildes~, <angle brackets>, back\\slashes and \"quotes\".",
+    "Accented café, naïve façade, Ångström and em dashes — everywhere.",
+    "Special tokens inside text: <answer> not an answer <context> not a context </s>",
+    "CamelCaseWords, snake_case_words and URLs like https://example.com/a?b=c.",
+]
+
+
+def reference_paragraphs(size: str, text_file: str = None) -> List[str]:
+    if text_file:
+        with open(text_file, 'r') as file:
+            return [p for p in file.read().split("\n") if p.strip()]
+    from benchmarks import corpora
+    paragraphs = list(REFERENCE_CORPUS) + corpora.paragraphs(size) + EDGE_CASES
+    # One paragraph longer than SEQ_LENGTH tokens, to exercise truncation
+    paragraphs.append(" ".join(REFERENCE_CORPUS * 8))
+    return paragraphs
+
+
+def qg_inputs(paragraphs: List[str]) -> List[str]:
+    inputs = []
+    for paragraph in paragraphs:
+        for sentence in re.findall(".*?[.!?]", paragraph):
+            inputs.append(f"<answer> {sentence.strip()} <context> {paragraph}")
+    return inputs
+
+
+def qa_pairs(paragraphs: List[str]) -> Dict[str, List[str]]:
+    questions, answers = [], []
+    for paragraph in paragraphs:
+        for sentence in re.findall(".*?[.!?]", paragraph):
+            words = sentence.split()
+            questions.append(f"What is {' '.join(words[:6])}?")
+            answers.append(sentence.strip())
+    return {"questions": questions, "answers": answers}
+
+
+def compare(name: str, slow: Dict[str, List], fast: Dict[str, List], texts: List[Any]) -> Dict[str, Any]:
+    mismatches = []
+    for i, text in enumerate(texts):
+        differing = [key for key in slow if slow[key][i] != fast[key][i]]
+        if differing:
+            mismatches.append({"text": str(text)[:200], "fields": differing,
+                               "slow": slow["input_ids"][i][:40], "fast": fast["input_ids"][i][:40]})
+    return {"check": name, "cases": len(texts), "mismatches": len(mismatches), "examples": mismatches[:10]}
+
+
+def encode_each(tokenizer: Any, texts: List[str], pairs: List[str] = None, **kwargs) -> Dict[str, List]:
+    """The old path: one call per text"""
+    rows = [
+        tokenizer(text, pairs[i], **kwargs) if pairs is not None else tokenizer(text, **kwargs)
+        for i, text in enumerate(texts)
+    ]
+    return {key: [row[key] for row in rows] for key in rows[0].keys()} if rows else {}
+
+
+def encode_batch(tokenizer: Any, texts: List[str], pairs: List[str] = None, **kwargs) -> Dict[str, List]:
+    encoding = tokenizer(texts, pairs, **kwargs) if pairs is not None else tokenizer(texts, **kwargs)
+    return {key: list(encoding[key]) for key in encoding.keys()}
+
+
+def segments(tokenizer: Any, paragraphs: List[str]) -> List[str]:
+    qg = QuestionGenerator.__new__(QuestionGenerator)
+    qg.qg_tokenizer = tokenizer
+    qg.SEQ_LENGTH = SEQ_LENGTH
+    return list(qg._iter_segments(paragraphs))
+
+
+def throughput(function: Callable[[], Dict[str, List]], repeat: int) -> Dict[str, float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encoding = function()
+        timings.append(time.perf_counter() - start)
+    seconds = min(timings)
+    tokens = sum(sum(1 for _ in ids) for ids in encoding["input_ids"])
+    return {"seconds": seconds, "texts_per_second": len(encoding["input_ids"]) / seconds,
+            "tokens_per_second": tokens / seconds}
+
+
+def paragraph_pieces(tokenizer: Any, paragraphs: List[str]) -> List[List[int]]:
+    """Ids of the pieces QuestionGenerator._paragraph_tokens splits the paragraphs into"""
+    qg = QuestionGenerator.__new__(QuestionGenerator)
+    qg.qg_tokenizer = tokenizer
+    qg.SEQ_LENGTH = SEQ_LENGTH
+    return [ids for _, ids in qg._paragraph_tokens(paragraphs)]
+
+
+def load_tokenizers(local_files_only: bool = False) -> Dict[str, Any]:
+    return {
+        "t5_slow": T5Tokenizer.from_pretrained(QG_PRETRAINED, legacy=False, use_fast=False,
+                                               local_files_only=local_files_only),
+        "t5_fast": T5TokenizerFast.from_pretrained(QG_PRETRAINED, legacy=False, from_slow=True,
+                                                   local_files_only=local_files_only),
+        "bert_slow": AutoTokenizer.from_pretrained(QAE_PRETRAINED, use_fast=False, local_files_only=local_files_only),
+        "bert_fast": AutoTokenizer.from_pretrained(QAE_PRETRAINED, use_fast=True, local_files_only=local_files_only),
+    }
+
+
+def parity_checks(tokenizers: Dict[str, Any], paragraphs: List[str]) -> List[Dict[str, Any]]:
+    t5_slow, t5_fast = tokenizers["t5_slow"], tokenizers["t5_fast"]
+    bert_slow, bert_fast = tokenizers["bert_slow"], tokenizers["bert_fast"]
+    inputs = qg_inputs(paragraphs)
+    pairs = qa_pairs(paragraphs)
+    truncate = {"truncation": True, "max_length": SEQ_LENGTH}
+    padded = dict(truncate, padding="max_length")
+
+    checks = [
+        compare("t5_paragraphs", encode_each(t5_slow, paragraphs, **truncate),
+                encode_batch(t5_fast, paragraphs, **truncate), paragraphs),
+        compare("t5_generation_inputs", encode_each(t5_slow, inputs, **padded),
+                encode_batch(t5_fast, inputs, **padded), inputs),
+        compare("bert_qa_pairs", encode_each(bert_slow, pairs["questions"], pairs["answers"], **padded),
+                encode_batch(bert_fast, pairs["questions"], pairs["answers"], **padded),
+                list(zip(pairs["questions"], pairs["answers"]))),
+    ]
+    slow_segments, fast_segments = segments(t5_slow, paragraphs), segments(t5_fast, paragraphs)
+    checks.append({
+        "check": "context_segments",
+        "cases": len(slow_segments),
+        "mismatches": sum(1 for a, b in zip(slow_segments, fast_segments) if a != b)
+        + abs(len(slow_segments) - len(fast_segments)),
+        "examples": [{"slow": a[:200], "fast": b[:200]} for a, b in zip(slow_segments, fast_segments) if a != b][:10],
+    })
+    long = [p for p in paragraphs if len(t5_slow(p)["input_ids"]) > SEQ_LENGTH]
+    checks.append(compare("t5_paragraph_pieces", {"input_ids": [paragraph_pieces(t5_slow, [p]) for p in long]},
+                          {"input_ids": [paragraph_pieces(t5_fast, [p]) for p in long]}, long))
+    return checks
+
+
+def build_report(paragraphs: List[str], repeat: int) -> Dict[str, Any]:
+    tokenizers = load_tokenizers()
+    t5_slow, t5_fast = tokenizers["t5_slow"], tokenizers["t5_fast"]
+    bert_slow, bert_fast = tokenizers["bert_slow"], tokenizers["bert_fast"]
+    checks = parity_checks(tokenizers, paragraphs)
+
+    inputs = qg_inputs(paragraphs)
+    pairs = qa_pairs(paragraphs)
+    truncate = {"truncation": True, "max_length": SEQ_LENGTH}
+    padded = dict(truncate, padding="max_length")
+    timings = {
+        "t5_paragraphs": (lambda: encode_each(t5_slow, paragraphs, **truncate),
+                          lambda: encode_batch(t5_fast, paragraphs, **truncate)),
+        "t5_generation_inputs": (lambda: encode_each(t5_slow, inputs, **padded),
+                                 lambda: encode_batch(t5_fast, inputs, **padded)),
+        "bert_qa_pairs": (lambda: encode_each(bert_slow, pairs["questions"], pairs["answers"], **padded),
+                          lambda: encode_batch(bert_fast, pairs["questions"], pairs["answers"], **padded)),
+    }
+    benchmarks = {}
+    for name, (slow, fast) in timings.items():
+        slow_result, fast_result = throughput(slow, repeat), throughput(fast, repeat)
+        benchmarks[name] = {
+            "slow_one_at_a_time": slow_result,
+            "fast_batched": fast_result,
+            "speedup": slow_result["seconds"] / fast_result["seconds"] if fast_result["seconds"] else None,
+        }
+
+    return {
+        "parity": all(check["mismatches"] == 0 for check in checks),
+        "checks": checks,
+        "throughput": benchmarks,
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=str, default="medium", help="Benchmark corpus size added to the reference paragraphs")
+    parser.add_argument("--text_file", type=str, default=None,
+                       help="Corpus to use instead (one paragraph per line)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=str, default="tokenizer_report.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = build_report(reference_paragraphs(args.size, args.text_file), args.repeat)
+
+    for check in report["checks"]:
+        print(f"{check['check']:<24} {check['cases']:>6} cases  {check['mismatches']:>4} mismatches")
+    for name, result in report["throughput"].items():
+        print(f"{name:<24} slow {result['slow_one_at_a_time']['texts_per_second']:>10.0f} texts/s  "
+              f"fast {result['fast_batched']['texts_per_second']:>10.0f} texts/s  x{result['speedup']:.1f}")
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+    sys.exit(0 if report["parity"] else 1)
@@ -1,8 +1,10 @@
 import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from nltk.tokenize import sent_tokenize
 from typing import List, Tuple
 import os
+from metrics import stage, count_items
+
+# Bump when keyword extraction or summary output changes, so stored summaries are recomputed
+SUMMARIZER_VERSION = "tfidf-1"
 
 custom_stopwords = ["of", "that", "an", "than", "then", "be", "as", "can", "could", "the", "to", "and", "but", "or",
                     "for", "nor", "so", "yet", "is", "am", "are", "was", "were", "has", "have", "had", "in", "on", "at",
@@ -18,18 +20,22 @@ def preprocess_text(text):
     return text
 
 
-def get_keywords(text: str, num_keywords=5, save_debug_files=True) -> Tuple[List[str], str]:
+def get_keywords(text: str, num_keywords=5, save_debug_files=False) -> Tuple[List[str], str]:
     """
     Extract keywords and generate summary from text
     
     Args:
         text: Input text to process
         num_keywords: Number of keywords to extract
-        save_debug_files: Whether to save debug files (trans.txt and summ.txt)
+        save_debug_files: Whether to save debug files (trans.txt and summ.txt). Only meant
+            for standalone use; the API records sampled traces through tracing.py instead
     
     Returns:
         Tuple of (important_words_list, summary_paragraph)
     """
+    # Imported on first use so the API starts quickly
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from nltk.tokenize import sent_tokenize
     
     # Save input text to trans.txt for debugging
     if save_debug_files:
@@ -47,10 +53,12 @@ def get_keywords(text: str, num_keywords=5, save_debug_files=True) -> Tuple[List
 
     filtered_text = " ".join([word for word in text.split() if word.lower() not in custom_stopwords and not any(c.isdigit() for c in word)])
 
-    vectorizer = TfidfVectorizer()
-    tfidf_matrix = vectorizer.fit_transform([filtered_text])
+    count_items("summarize", "sentences", len(sentences))
+    with stage("tfidf"):
+        vectorizer = TfidfVectorizer()
+        tfidf_matrix = vectorizer.fit_transform([filtered_text])
 
-    feature_names = vectorizer.get_feature_names_out()
+        feature_names = vectorizer.get_feature_names_out()
 
     important_words = [feature_names[i] for i in tfidf_matrix.toarray()[0].argsort()[-max_words:][::-1] if
                        len(feature_names[i]) > 3 and not any(c.isdigit() for c in feature_names[i])]
@@ -85,7 +93,7 @@ def process_from_file(file_path='trans.txt'):
         with open(file_path, 'r+', encoding='utf-8') as file:
             input_text = file.read()
         
-        important_words, paragraph = get_keywords(input_text)
+        important_words, paragraph = get_keywords(input_text, save_debug_files=True)
         
         if important_words:
             print("Important words:")
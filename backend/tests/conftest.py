@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# The backend modules import each other as top-level modules (see main.py)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(1, os.path.join(BACKEND_DIR, "sub_q_gen"))
+
+# Keep the question bank, segment cache and profiles out of the working
+# directory; set before any backend module reads them
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="study-simplify-tests-")
+os.environ.setdefault("QUESTION_BANK_PATH", os.path.join(TEST_DATA_DIR, "question_bank.db"))
+os.environ.setdefault("SEGMENT_CACHE_PATH", "")
+os.environ.setdefault("PROFILE_DIR", os.path.join(TEST_DATA_DIR, "profiles"))
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+import admission
+from admission import AdmissionController, AdmissionRejected, WorkloadClass, _parse_overrides
+from cancellation import CancellationToken, Cancelled
+
+
+def test_parse_overrides():
+    assert _parse_overrides("subjective=2, summarize=16") == {"subjective": 2, "summarize": 16}
+    assert _parse_overrides("") == {}
+
+
+def test_full_queue_is_rejected():
+    controller = AdmissionController([WorkloadClass("work", 0, 1, 0)])
+
+    async def main():
+        async with controller.slot("work"):
+            with pytest.raises(AdmissionRejected):
+                async with controller.slot("work"):
+                    pass
+        async with controller.slot("work"):
+            return controller.stats()["running"]
+
+    assert asyncio.run(main()) == 1
+
+
+def test_freed_slots_go_to_the_highest_priority_class():
+    controller = AdmissionController([WorkloadClass("quick", 0, 1, 5), WorkloadClass("heavy", 1, 1, 5)],
+                                     total_slots=1)
+    order = []
+
+    async def job(name):
+        async with controller.slot(name):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        async with controller.slot("heavy"):
+            waiting = [asyncio.ensure_future(job("heavy")), asyncio.ensure_future(job("quick"))]
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*waiting)
+
+    asyncio.run(main())
+    assert order == ["quick", "heavy"]
+
+
+def test_cancelled_while_queued_leaves_the_queue(monkeypatch):
+    monkeypatch.setattr(admission, "CANCEL_POLL_SECONDS", 0.01)
+    controller = AdmissionController([WorkloadClass("work", 0, 1, 1)])
+    token = CancellationToken()
+
+    async def main():
+        async with controller.slot("work"):
+            queued = asyncio.ensure_future(controller.run("work", lambda: "ran", cancel_token=token))
+            await asyncio.sleep(0.02)
+            token.cancel("gone")
+            with pytest.raises(Cancelled):
+                await queued
+            assert not controller.workloads["work"].waiting
+        return await controller.run("work", lambda: "ran")
+
+    assert asyncio.run(main()) == "ran"
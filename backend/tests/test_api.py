@@ -0,0 +1,353 @@
+import io
+import os
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def request_series(endpoint):
+    return f'study_request_seconds_count{{endpoint="{endpoint}"'
+
+
+def test_request_metrics_use_route_templates(client):
+    client.get("/question-bank/documents/abc123")
+    client.get("/question-bank/documents/def456")
+    client.get("/no-such-path-1")
+    client.get("/no-such-path-2")
+
+    exposition = client.get("/metrics").text
+
+    assert request_series("/question-bank/documents/{document_id}") in exposition
+    assert request_series("unmatched") in exposition
+    assert "abc123" not in exposition and "no-such-path" not in exposition
+
+
+@pytest.fixture
+def stored_summary():
+    text = "Photosynthesis turns light into chemical energy."
+    main.question_bank.put(text, "summary", {}, main.SUMMARIZER_VERSION,
+                           {"success": True, "important_words": ["light"], "summary": "stored"})
+    return text
+
+
+@pytest.mark.parametrize("refresh", [False, "false", "0", "no"])
+def test_summarize_refresh_false_uses_the_bank(client, stored_summary, refresh):
+    response = client.post("/summarize", json={"text": stored_summary, "refresh": refresh})
+
+    assert response.status_code == 200
+    assert response.json()["cached"] is True
+
+
+@pytest.mark.parametrize("refresh", [True, "true", "1", "yes"])
+def test_summarize_refresh_true_recomputes(client, stored_summary, refresh, monkeypatch):
+    monkeypatch.setattr(main, "get_keywords", lambda text: (["energy"], "fresh"))
+
+    response = client.post("/summarize", json={"text": stored_summary, "refresh": refresh})
+
+    assert response.status_code == 200
+    assert response.json()["cached"] is False
+    assert response.json()["summary"] == "fresh"
+
+
+@pytest.mark.parametrize("endpoint", ["/summarize", "/generate-questions", "/generate-subjective-questions"])
+def test_invalid_refresh_is_rejected(client, endpoint):
+    response = client.post(endpoint, json={"text": "Some text.", "refresh": "maybe"})
+
+    assert response.status_code == 400
+    assert "refresh" in response.json()["detail"]
+
+
+def test_unparsable_topic_is_a_bad_request(client, stored_summary, monkeypatch):
+    main.question_bank.put(stored_summary, "objective", {}, "v1", {},
+                           [{"question": "What does light become?", "answer": "energy", "options": []}])
+    if not main.question_bank.fts:
+        pytest.skip("SQLite has no FTS5 support")
+    monkeypatch.setattr("question_bank._fts_query", lambda topic: topic)
+
+    response = client.get("/question-bank/questions", params={"topic": "light AND"})
+
+    assert response.status_code == 400
+    assert client.get("/question-bank/questions", params={"topic": "light"}).json()["total"] >= 1
+
+
+def test_question_bank_documents(client, stored_summary):
+    digest = main.document_digest(stored_summary)
+
+    listed = client.get("/question-bank/documents", params={"limit": 100}).json()
+    document = client.get(f"/question-bank/documents/{digest}").json()
+
+    assert digest in [d["digest"] for d in listed["documents"]]
+    assert "summary" in [result["kind"] for result in document["results"]]
+    assert client.get("/question-bank/documents/unknown").status_code == 404
+    assert client.get("/question-bank/documents", params={"limit": 0}).status_code == 422
+
+
+def test_admission_status_lists_every_workload(client):
+    status = client.get("/admission").json()
+
+    assert set(status["workloads"]) == set(main.admission.workloads)
+    assert status["running"] == 0
+
+
+def blank_pdf(pages):
+    PyPDF2 = pytest.importorskip("PyPDF2")
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(100, 100)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def test_stream_rejects_a_page_range_outside_the_document(client, monkeypatch):
+    removed = []
+    remove = main.remove_temp_file
+    monkeypatch.setattr(main, "remove_temp_file", lambda path: removed.append(path) or remove(path))
+
+    response = client.post("/transcribe/stream", files={"file": ("notes.pdf", blank_pdf(2), "application/pdf")},
+                           data={"pages": "5-6"})
+
+    assert response.status_code == 400
+    assert len(removed) == 1 and not os.path.exists(removed[0])
+
+
+def test_health_and_readiness(client, monkeypatch):
+    from warmup import WarmUp
+
+    assert client.get("/healthz").json() == {"status": "ok"}
+    monkeypatch.setattr(main, "warmup", WarmUp([]))
+    assert client.get("/readyz").status_code == 200
+
+    monkeypatch.setattr(main, "warmup", WarmUp(["question_generator"]))
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["state"] == "pending"
+
+
+@pytest.mark.parametrize("field, value", [
+    ("num_questions", "abc"), ("num_questions", 0), ("num_questions", True), ("answer_style", "bogus"),
+    ("candidate_multiple", "3"), ("candidate_multiple", -1), ("score_threshold", None),
+    ("max_candidates", 2.5), ("max_candidates", 0),
+])
+def test_invalid_generation_fields_are_rejected(client, field, value):
+    response = client.post("/generate-subjective-questions", json={"text": "Some text.", field: value})
+
+    assert response.status_code == 400
+    assert field.split("_")[0] in response.json()["detail"].lower()
+
+
+@pytest.mark.parametrize("fields", [
+    {"context_window": -1}, {"context_window": "2"}, {"context_tokens": 0},
+    {"context_window": 1, "context_tokens": 64},
+])
+def test_invalid_context_windows_are_rejected(client, fields):
+    response = client.post("/generate-subjective-questions", json=dict(fields, text="Some text."))
+
+    assert response.status_code == 400
+    assert "context_" in response.json()["detail"]
+
+
+def test_invalid_answer_style_of_a_file_is_rejected(client):
+    response = client.post("/generate-subjective-questions/file",
+                           files={"file": ("notes.png", b"not an image", "image/png")},
+                           data={"answer_style": "bogus"})
+
+    assert response.status_code == 400
+    assert "answer style" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("field", ["use_evaluator", "incremental"])
+def test_invalid_generation_flags_are_rejected(client, field):
+    response = client.post("/generate-subjective-questions", json={"text": "Some text.", field: "maybe"})
+
+    assert response.status_code == 400
+    assert field in response.json()["detail"]
+
+
+def test_string_flags_share_the_stored_result(client):
+    text = "Mitochondria release energy from glucose."
+    bank_params = {
+        "num_questions": 10, "answer_style": "all", "use_evaluator": False, "decoding_profile": "quality",
+        "candidate_multiple": 3, "incremental": False, "score_threshold": 0.0, "max_candidates": None,
+        "dedup_threshold": main.DEFAULT_DEDUP_THRESHOLD, "context_window": None, "context_tokens": None,
+        "generator_tier": main.DEFAULT_GENERATOR_TIER,
+    }
+    model_version = main.models.model_version(*main.generator_models(main.DEFAULT_GENERATOR_TIER, False)[1])
+    main.question_bank.put(text, "subjective", bank_params, model_version, {"success": True, "questions": {}}, [])
+
+    response = client.post("/generate-subjective-questions",
+                           json={"text": text, "use_evaluator": "false", "incremental": "no"})
+
+    assert response.status_code == 200
+    assert response.json()["cached"] is True
+
+
+def test_file_generation_closes_the_pages_on_error(client, monkeypatch):
+    from contextlib import contextmanager
+
+    closed, removed = [], []
+
+    class FakeTranscriber:
+        def __init__(self, path, **kwargs):
+            pass
+
+        def iter_pages(self):
+            try:
+                yield "First page."
+                yield "Second page."
+            finally:
+                closed.append(True)
+
+    class FailingGenerator:
+        def generate_stream(self, pages, **kwargs):
+            next(iter(pages))
+            raise RuntimeError("generation failed")
+
+    @contextmanager
+    def use(name):
+        yield FailingGenerator()
+
+    remove = main.remove_temp_file
+    monkeypatch.setattr(main, "Transcriber", FakeTranscriber)
+    monkeypatch.setattr(main.models.manager, "use", use)
+    monkeypatch.setattr(main, "remove_temp_file", lambda path: path and removed.append(path) or remove(path))
+
+    response = client.post("/generate-subjective-questions/file",
+                           files={"file": ("notes.png", b"page bytes", "image/png")})
+
+    assert response.status_code == 500
+    assert closed == [True]
+    assert len(removed) >= 1 and not any(os.path.exists(path) for path in removed)
+
+
+def test_upload_outlives_a_request_that_restarts_a_cancelled_computation(client, monkeypatch):
+    import threading
+    from contextlib import contextmanager
+
+    from cancellation import CancellationToken
+    from singleflight import _Call
+
+    # Every key looks like it has a cancelled computation still winding down
+    stale = _Call(CancellationToken(None), None)
+    stale.token.cancel("every request waiting for the result has gone")
+
+    class WindingDown(dict):
+        def get(self, key, default=None):
+            return super().get(key, stale)
+
+        def __contains__(self, key):
+            return True
+
+    monkeypatch.setattr(main.subjective_file_flight, "_calls", WindingDown())
+    paths, seen, done = [], [], threading.Event()
+
+    class FakeTranscriber:
+        def __init__(self, path, **kwargs):
+            paths.append(path)
+
+        def iter_pages(self):
+            yield "Only page."
+
+    class SlowGenerator:
+        def generate_stream(self, pages, **kwargs):
+            # Still reading the upload after the request has timed out
+            time.sleep(0.3)
+            seen.append(os.path.exists(paths[0]))
+            list(pages)
+            done.set()
+            return [], {}
+
+    @contextmanager
+    def use(name):
+        yield SlowGenerator()
+
+    monkeypatch.setattr(main, "Transcriber", FakeTranscriber)
+    monkeypatch.setattr(main.models.manager, "use", use)
+
+    response = client.post("/generate-subjective-questions/file",
+                           files={"file": ("notes.png", b"page bytes", "image/png")},
+                           headers={"X-Request-Timeout": "0.05"})
+
+    assert response.status_code == 504
+    assert done.wait(5)
+    assert seen == [True]
+    for _ in range(50):
+        if not os.path.exists(paths[0]):
+            break
+        time.sleep(0.01)
+    assert not os.path.exists(paths[0])
+
+
+def test_unknown_generator_tier_is_rejected(client):
+    response = client.post("/generate-subjective-questions", json={"text": "Some text.", "generator_tier": "huge"})
+
+    assert response.status_code == 400
+    assert "Unknown generator tier huge" in response.json()["detail"]
+    file_response = client.post("/generate-subjective-questions/file",
+                                files={"file": ("notes.png", b"page bytes", "image/png")},
+                                data={"generator_tier": "huge"})
+    assert file_response.status_code == 400
+
+
+def test_refine_tier_drafts_with_the_small_generator_and_refines_with_the_base_one(client, monkeypatch):
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    pytest.importorskip("en_core_web_sm")
+    from benchmarks.stubs import install_stub_models
+
+    manager = main.models.ModelManager()
+    install_stub_models(manager)
+    monkeypatch.setattr(main.models, "manager", manager)
+    text = ("Mitochondria release energy from glucose through respiration. "
+            "Chloroplasts capture sunlight to build sugars in leaves. "
+            "Ribosomes assemble proteins from amino acids in the cytoplasm. "
+            "The nucleus stores genetic material inside a double membrane. "
+            "Lysosomes break down worn organelles with digestive enzymes.")
+
+    response = client.post("/generate-subjective-questions", json={
+        "text": text, "num_questions": 2, "answer_style": "sentences", "generator_tier": "refine", "refresh": True,
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["generator_tier"] == "refine"
+    assert body["total_questions"] == 2
+    decoding = body["decoding"]
+    assert decoding["generator"] == "stub-question-generator-small"
+    assert decoding["refiner"] == "stub-question-generator"
+    assert decoding["refined"] == 3  # num_questions * DEFAULT_REFINE_MULTIPLE, rounded up
+    assert body["model_version"] == main.models.model_version("question_generator_small", "question_generator",
+                                                              "qa_evaluator")
+    assert set(manager.loaded()) == {"question_generator_small", "question_generator", "qa_evaluator"}
+
+
+
+@pytest.mark.parametrize("busy_at", ["start", "capture"])
+def test_profiled_requests_run_one_at_a_time(client, monkeypatch, busy_at):
+    import threading
+
+    monkeypatch.setattr(main.profiler, "token", "secret")
+    monkeypatch.setattr(main.profiler, "_capturing", threading.Lock())
+    if busy_at == "capture":
+        # another profile starts capturing after this request passed start()
+        profile = main.profiler.start("summarize")
+        monkeypatch.setattr(main.profiler, "start", lambda name: profile)
+    main.profiler._capturing.acquire()
+
+    response = client.post("/summarize", json={"text": "Some text."}, headers={"X-Profile": "secret"})
+
+    assert response.status_code == 409
+    assert "profiled" in response.json()["detail"]
@@ -0,0 +1,37 @@
+from benchmarks.run import compare
+
+BASELINE = {"results": {
+    "small/get_keywords": {"median": 0.010},
+    "small/question_generator": {"median": 0.100},
+    "medium/get_keywords": {"median": 0.050},
+}}
+
+
+def test_slower_benchmarks_are_regressions():
+    results = {
+        "small/get_keywords": {"median": 0.011},
+        "small/question_generator": {"median": 0.200},
+        "medium/get_keywords": {"median": 0.050},
+    }
+    regressions = compare(results, BASELINE, 0.25)
+    assert [r["benchmark"] for r in regressions] == ["small/question_generator"]
+
+
+def test_failed_benchmarks_are_regressions():
+    results = {
+        "small/get_keywords": {"median": 0.010},
+        "small/question_generator": {"error": "boom"},
+        "medium/get_keywords": {"median": 0.050},
+    }
+    regressions = compare(results, BASELINE, 0.25)
+    assert regressions == [{"benchmark": "small/question_generator", "baseline": 0.100, "current": None,
+                            "error": "boom"}]
+
+
+def test_baseline_benchmarks_missing_from_a_run_are_regressions():
+    results = {"small/get_keywords": {"median": 0.010}}
+
+    regressions = compare(results, BASELINE, 0.25, selected=lambda key: key.startswith("small/"))
+
+    assert [r["benchmark"] for r in regressions] == ["small/question_generator"]
+    assert regressions[0]["error"] == "missing from the results"
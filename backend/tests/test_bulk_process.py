@@ -0,0 +1,36 @@
+import os
+
+from bulk_process import run_tasks
+
+PARAMS = {"stages": [], "use_evaluator": False}
+
+
+def crash_on_marked_files(task):
+    """Stands in for process_file; a file named crash* kills its worker process like an OOM kill"""
+    if os.path.basename(task["path"]).startswith("crash"):
+        os._exit(9)
+    return {"path": task["path"], "key": task["key"], "seconds": 0.0}
+
+
+def tasks(*names):
+    return [{"path": f"/docs/{name}", "digest": name, "key": f"{name}:params"} for name in names]
+
+
+def test_records_every_file():
+    records = list(run_tasks(tasks("a.txt", "b.txt", "c.txt"), 2, PARAMS, False, 1, crash_on_marked_files))
+
+    assert sorted(record["path"] for record in records) == ["/docs/a.txt", "/docs/b.txt", "/docs/c.txt"]
+    assert not any(record.get("error") for record in records)
+
+
+def test_a_dead_worker_fails_its_file_instead_of_hanging():
+    names = ["a.txt", "crash.txt", "b.txt", "c.txt", "d.txt"]
+
+    records = {record["path"]: record for record in run_tasks(tasks(*names), 1, PARAMS, False, 1,
+                                                              crash_on_marked_files)}
+
+    assert set(records) == {f"/docs/{name}" for name in names}
+    assert "Worker process died" in records["/docs/crash.txt"]["error"]
+    assert records["/docs/crash.txt"]["key"] == "crash.txt:params"
+    # The pool is restarted for the files after the crash
+    assert all(not records[f"/docs/{name}"].get("error") for name in ["a.txt", "b.txt", "c.txt", "d.txt"])
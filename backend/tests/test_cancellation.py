@@ -0,0 +1,41 @@
+import time
+
+import pytest
+
+from cancellation import CancellationToken, Cancelled, DeadlineExceeded, check_cancelled, deadline_after
+
+
+def test_cancel_keeps_the_first_reason():
+    token = CancellationToken()
+    assert not token.cancelled
+    token.cancel("client gone")
+    token.cancel("second")
+
+    assert token.cancelled
+    with pytest.raises(Cancelled, match="client gone"):
+        token.check()
+
+
+def test_deadline_counts_as_cancelled():
+    token = CancellationToken(time.monotonic() - 1)
+
+    assert token.cancelled
+    assert token.remaining() == 0.0
+    with pytest.raises(DeadlineExceeded):
+        token.check()
+
+
+def test_extend_keeps_the_later_deadline():
+    token = CancellationToken(deadline_after(1))
+    token.extend(deadline_after(0.01))
+    assert token.remaining() > 0.5
+
+    token.extend(None)
+    assert token.deadline is None and token.remaining() is None
+
+
+def test_no_deadline_without_timeout():
+    assert deadline_after(None) is None
+    assert deadline_after(0) is None
+    check_cancelled(None)
+    check_cancelled(CancellationToken())
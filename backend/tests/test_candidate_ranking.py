@@ -0,0 +1,74 @@
+import pytest
+
+pytest.importorskip("sklearn")
+
+from sub_q_gen.candidate_ranking import (
+    IDEAL_MAX_WORDS, IDEAL_MIN_WORDS, entity_density, length_score, rank_candidates, salience_scores,
+)
+
+PHOTOSYNTHESIS = [
+    "Photosynthesis converts light energy into chemical energy in the leaves of green plants.",
+    "Chlorophyll in the leaves absorbs light energy that drives photosynthesis in plants.",
+    "The football match was postponed because of heavy rain on Saturday.",
+]
+
+
+def sentence(words):
+    return " ".join(["word"] * words)
+
+
+def test_salience_prefers_sentences_central_to_the_document():
+    scores = salience_scores(PHOTOSYNTHESIS)
+
+    assert scores[0] > scores[2] and scores[1] > scores[2]
+
+
+def test_salience_of_stop_words_only_is_zero():
+    assert list(salience_scores(["the and of", "a an the"])) == [0, 0]
+
+
+def test_length_score_peaks_inside_the_ideal_range():
+    assert length_score(sentence(IDEAL_MIN_WORDS)) == 1.0
+    assert length_score(sentence(IDEAL_MAX_WORDS)) == 1.0
+    assert length_score(sentence(IDEAL_MIN_WORDS // 2)) == 0.5
+    assert length_score(sentence(IDEAL_MAX_WORDS + IDEAL_MAX_WORDS // 2)) == 0.5
+    assert length_score(sentence(3 * IDEAL_MAX_WORDS)) == 0.0
+
+
+def test_entity_density_counts_names_and_numbers_but_not_the_first_word():
+    assert entity_density("The cat sat on the mat today") == 0.0
+    assert entity_density("The treaty was signed in Paris in 1919 by France") == pytest.approx(1.0)
+    assert entity_density("") == 0.0
+
+
+def test_candidates_are_ranked_by_combined_score():
+    short = "Plants grow."
+    candidates = [(short, short)] + [(text, text) for text in PHOTOSYNTHESIS]
+
+    order = rank_candidates(candidates, duplicate_threshold=None)
+
+    assert sorted(order) == [0, 1, 2, 3]
+    assert order[0] in (1, 2) and order[-1] == 0
+
+
+def test_limit_caps_the_kept_candidates_after_dropping_duplicates():
+    repeated = PHOTOSYNTHESIS[0]
+    candidates = [(repeated, repeated), (repeated, repeated)] + [(text, text) for text in PHOTOSYNTHESIS[1:]]
+
+    order = rank_candidates(candidates, limit=2)
+
+    assert len(order) == 2
+    assert not {0, 1} <= set(order)
+
+
+def test_entity_answers_only_clash_with_the_same_entity():
+    focus = PHOTOSYNTHESIS[0]
+    candidates = [("Photosynthesis", focus), ("chlorophyll", focus), ("photosynthesis", focus)]
+
+    order = rank_candidates(candidates)
+
+    assert sorted(order) == [0, 1]
+
+
+def test_no_candidates():
+    assert rank_candidates([], limit=3) == []
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("requests")
+
+from benchmarks.loadtest import failing_endpoints, summarize_samples
+
+
+def test_non_2xx_responses_count_as_errors():
+    samples = [("summarize", 0.01, 422)] * 9 + [("summarize", 0.01, 200), ("objective", 0.02, 200),
+                                                 ("objective", 0.02, None)]
+
+    level = summarize_samples(samples, elapsed=1.0, concurrency=2)
+
+    assert level["endpoints"]["summarize"]["error_rate"] == 0.9
+    assert level["endpoints"]["summarize"]["status_codes"] == {"422": 9, "200": 1}
+    assert level["endpoints"]["objective"]["status_codes"] == {"200": 1, "failed": 1}
+    assert level["error_rate"] == pytest.approx(10 / 12, abs=1e-4)
+
+
+def test_endpoints_over_the_error_rate_fail_the_level():
+    samples = [("summarize", 0.01, 422)] * 3 + [("transcribe", 0.5, 200)] * 3
+
+    level = summarize_samples(samples, elapsed=1.0, concurrency=1)
+
+    assert failing_endpoints(level, 0.05) == {"summarize": {"422": 3}}
+    assert failing_endpoints(summarize_samples(samples[3:], 1.0, 1), 0.05) == {}
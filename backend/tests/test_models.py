@@ -0,0 +1,110 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import models
+from models import ModelManager
+
+
+def fake_manager(monkeypatch, names):
+    manager = ModelManager()
+    for name in names:
+        manager.register(name, lambda name=name: f"{name} model")
+    monkeypatch.setattr(models, "manager", manager)
+    return manager
+
+
+def test_preload_loads_only_the_serving_models(monkeypatch):
+    manager = fake_manager(monkeypatch, models.DEFAULT_SERVING_MODELS + ["question_generator_small"])
+
+    models.preload()
+
+    assert sorted(manager.loaded()) == sorted(models.DEFAULT_SERVING_MODELS)
+
+
+def test_preload_respects_an_explicit_list(monkeypatch):
+    manager = fake_manager(monkeypatch, models.DEFAULT_SERVING_MODELS + ["question_generator_small"])
+
+    models.preload(["question_generator_small"])
+
+    assert manager.loaded() == ["question_generator_small"]
+
+
+def test_model_size_counts_parameter_and_buffer_bytes():
+    torch = pytest.importorskip("torch")
+
+    class Wrapper:
+        qg_model = torch.nn.Sequential(torch.nn.Linear(256, 256), torch.nn.BatchNorm1d(256))
+
+    # 256*256 + 256 weights and bias, 2*256 norm parameters, 2*256 + 1 buffers
+    expected = (256 * 256 + 256 + 2 * 256 + 2 * 256) * 4 + 8
+    assert models.model_size_mb(Wrapper()) == pytest.approx(expected / (1 << 20))
+
+
+def test_model_size_counts_tied_and_quantized_weights_once():
+    torch = pytest.importorskip("torch")
+    embedding = torch.nn.Embedding(100, 64)
+    head = torch.nn.Linear(64, 100, bias=False)
+    head.weight = embedding.weight
+    tied = torch.nn.ModuleDict({"embedding": embedding, "head": head})
+    assert models.model_size_mb(tied) == pytest.approx(100 * 64 * 4 / (1 << 20))
+
+    quantized = torch.quantization.quantize_dynamic(torch.nn.Sequential(torch.nn.Linear(512, 512)),
+                                                    {torch.nn.Linear}, dtype=torch.qint8)
+    # int8 weights, fp32 bias
+    assert models.model_size_mb(quantized) == pytest.approx((512 * 512 + 512 * 4) / (1 << 20), rel=0.01)
+
+
+def test_model_size_without_weights_is_unknown():
+    assert models.model_size_mb(object()) is None
+
+
+class HookedLock:
+    """Reentrant lock that runs a callback once, right after its next release"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.after_release = None
+
+    def __enter__(self):
+        self._lock.__enter__()
+
+    def __exit__(self, *exc_info):
+        self._lock.__exit__(*exc_info)
+        hook, self.after_release = self.after_release, None
+        if hook is not None:
+            hook()
+
+
+def one_mb_model():
+    return SimpleNamespace(vectors=SimpleNamespace(nbytes=1 << 20))
+
+
+def test_use_pins_before_a_concurrent_load_can_evict(monkeypatch):
+    manager = ModelManager(budget_mb=1)
+    manager._lock = HookedLock()
+    manager.register("a", one_mb_model)
+    manager.register("b", one_mb_model)
+    manager.get("a")
+
+    # Another request loads b as soon as use() first lets go of the lock
+    manager._lock.after_release = lambda: manager.get("b")
+    with manager.use("a"):
+        assert sorted(manager.loaded()) == ["a", "b"]
+        assert manager.status()["loaded"][0]["active"] == 1
+
+    assert manager.status()["loaded"][0]["active"] == 0
+
+
+def test_loading_a_model_evicts_only_idle_ones_over_the_budget():
+    manager = ModelManager(budget_mb=1)
+    for name in "abc":
+        manager.register(name, one_mb_model)
+
+    with manager.use("a"):
+        manager.get("b")
+        assert sorted(manager.loaded()) == ["a", "b"]
+    manager.get("c")
+
+    assert manager.loaded() == ["c"]
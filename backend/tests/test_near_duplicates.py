@@ -0,0 +1,53 @@
+import pytest
+
+from near_duplicates import NUM_PERMUTATIONS, NearDuplicateFilter, jaccard, lsh_bands, minhash, words
+
+
+def test_words_ignore_case_and_punctuation():
+    assert words("The cell, the CELL!") == {"the", "cell"}
+
+
+def test_minhash_estimates_jaccard():
+    a = words(" ".join(f"w{i}" for i in range(100)))
+    b = words(" ".join(f"w{i}" for i in range(20, 120)))
+    estimate = (minhash(a) == minhash(b)).mean()
+
+    assert estimate == pytest.approx(jaccard(a, b), abs=0.12)
+
+
+def test_minhash_is_stable():
+    assert (minhash({"a", "b"}) == minhash({"b", "a"})).all()
+    assert len(minhash(set())) == NUM_PERMUTATIONS
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.95])
+def test_lsh_bands_fit_the_threshold(threshold):
+    bands, rows = lsh_bands(threshold)
+
+    assert bands * rows == NUM_PERMUTATIONS
+    # Pairs at the threshold are bucketed together with high probability
+    assert 1 - (1 - threshold ** rows) ** bands > 0.95
+
+
+def test_filter_drops_near_duplicates():
+    dedup = NearDuplicateFilter(0.8)
+
+    assert dedup.add("What is the function of the mitochondria in the cell?")
+    assert not dedup.add("What is the function of the mitochondria in a cell?")
+    assert dedup.add("Which gas do plants absorb during photosynthesis?")
+
+
+def test_filter_compares_within_a_group():
+    dedup = NearDuplicateFilter(0.8)
+
+    assert dedup.add("What is osmosis?", group="water")
+    assert dedup.add("What is osmosis?", group="membranes")
+    assert not dedup.add("What is osmosis?", group="water")
+
+
+def test_threshold_one_only_drops_identical_word_sets():
+    dedup = NearDuplicateFilter(1.0)
+
+    assert dedup.add("the cell divides")
+    assert not dedup.add("The cell divides.")
+    assert dedup.add("the cell divides twice")
@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import profiling
+from profiling import Profiler, ProfilerBusy
+
+
+class BrokenTorchProfile:
+    def __init__(self, fail_on):
+        self.fail_on = fail_on
+
+    def __enter__(self):
+        if self.fail_on == "enter":
+            raise RuntimeError("profiler unavailable")
+
+    def __exit__(self, *exc_info):
+        if self.fail_on == "exit":
+            raise RuntimeError("could not stop profiler")
+
+
+def samplers():
+    return [thread for thread in threading.enumerate() if thread.name == "profile-sampler"]
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    return Profiler(token="secret", directory=str(tmp_path), interval=0.001)
+
+
+def test_capture_writes_stacks_and_summary(profiler, monkeypatch):
+    monkeypatch.setattr(profiling, "_torch_profiler", lambda: None)
+    profile = profiler.start("summarize")
+
+    assert profile.wrap(lambda: time.sleep(0.05) or "done")() == "done"
+
+    with open(os.path.join(profile.directory, "profile.json")) as f:
+        summary = json.load(f)
+    assert summary["endpoint"] == "summarize" and summary["samples"] > 0
+    assert profiler.artifact_path(profile.id, "stacks.folded") is not None
+    assert [entry["id"] for entry in profiler.list()] == [profile.id]
+    assert samplers() == []
+
+
+@pytest.mark.parametrize("fail_on", ["enter", "exit"])
+def test_sampler_stops_when_the_torch_profiler_fails(profiler, monkeypatch, fail_on):
+    monkeypatch.setattr(profiling, "_torch_profiler", lambda: BrokenTorchProfile(fail_on))
+
+    with pytest.raises(RuntimeError):
+        with profiler.start("summarize").capture():
+            time.sleep(0.01)
+
+    assert samplers() == []
+    assert not profiler.busy
+
+
+def test_artifact_paths_are_validated(profiler):
+    assert profiler.artifact_path("../etc", "profile.json") is None
+    assert profiler.artifact_path("20240101-000000-summarize-0123abcd", "passwd") is None
+    assert profiler.authorized("secret") and not profiler.authorized("wrong")
+    assert not Profiler().authorized("secret")
+
+
+def test_one_request_is_profiled_at_a_time(profiler, monkeypatch):
+    monkeypatch.setattr(profiling, "_torch_profiler", lambda: None)
+    started = profiler.start("summarize")  # before the first capture begins
+    first, second = profiler.start("summarize"), started
+
+    with first.capture():
+        assert profiler.busy
+        with pytest.raises(ProfilerBusy):
+            profiler.start("transcribe")
+        with pytest.raises(ProfilerBusy):
+            with second.capture():
+                pass
+
+    assert not profiler.busy
+    with second.capture():
+        pass
+    assert {entry["id"] for entry in profiler.list()} == {first.id, second.id}
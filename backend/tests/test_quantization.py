@@ -0,0 +1,39 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from sub_q_gen.quantization import _cache_path, load_quantized
+
+
+@pytest.fixture
+def tiny_t5(tmp_path):
+    config = transformers.T5Config(d_model=32, d_ff=64, d_kv=16, num_layers=2, num_heads=2, vocab_size=100,
+                                   decoder_start_token_id=0, pad_token_id=0, eos_token_id=1)
+    torch.manual_seed(0)
+    path = str(tmp_path / "tiny-t5")
+    transformers.T5ForConditionalGeneration(config).save_pretrained(path)
+    return path
+
+
+def test_cached_model_matches_the_converted_one(tiny_t5, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    converted = load_quantized(tiny_t5, transformers.AutoModelForSeq2SeqLM, cache_dir)
+    cached = load_quantized(tiny_t5, transformers.AutoModelForSeq2SeqLM, cache_dir)
+
+    input_ids = torch.tensor([[5, 6, 7, 8]])
+    assert torch.equal(converted.generate(input_ids, max_length=8), cached.generate(input_ids, max_length=8))
+
+
+def test_cache_never_unpickles_objects(tiny_t5, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    load_quantized(tiny_t5, transformers.AutoModelForSeq2SeqLM, cache_dir)
+    path = _cache_path(tiny_t5, cache_dir)
+    # A pickled module (or any other object) in the cache is rejected and
+    # converted again instead of being executed
+    torch.save(torch.nn.Linear(2, 2), path)
+
+    model = load_quantized(tiny_t5, transformers.AutoModelForSeq2SeqLM, cache_dir)
+
+    assert isinstance(torch.load(path, weights_only=True), dict)
+    assert model.generate(torch.tensor([[5, 6]]), max_length=4).shape[0] == 1
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+import question_bank
+from question_bank import InvalidQuery, QuestionBank, document_digest, params_key
+
+TEXT = "  The mitochondria is the powerhouse of the cell.  "
+QUESTIONS = [
+    {"question": "What is the powerhouse of the cell?", "answer": "mitochondria", "options": None},
+    {"question": "Which organelle makes ATP?", "answer": "mitochondria", "options": {"a": "nucleus"}},
+]
+
+
+@pytest.fixture
+def bank(tmp_path):
+    return QuestionBank(str(tmp_path / "bank.db"))
+
+
+def test_digest_ignores_surrounding_whitespace():
+    assert document_digest(TEXT) == document_digest(TEXT.strip())
+    assert document_digest(TEXT) != document_digest(TEXT + "!")
+
+
+def test_params_key_ignores_key_order():
+    assert params_key({"a": 1, "b": 2}) == params_key({"b": 2, "a": 1})
+    assert params_key({"a": 1}) != params_key({"a": 2})
+
+
+def test_results_are_keyed_by_params_and_model_version(bank):
+    digest = bank.put(TEXT, "subjective", {"num_questions": 2}, "v1", {"questions": 2}, QUESTIONS)
+
+    assert bank.get(digest, "subjective", {"num_questions": 2}, "v1") == {"questions": 2}
+    assert bank.get(digest, "subjective", {"num_questions": 3}, "v1") is None
+    assert bank.get(digest, "subjective", {"num_questions": 2}, "v2") is None
+    assert bank.get(digest, "objective", {"num_questions": 2}, "v1") is None
+
+
+def test_put_replaces_the_questions_of_an_earlier_result(bank):
+    bank.put(TEXT, "subjective", {}, "v1", {}, QUESTIONS)
+    digest = bank.put(TEXT, "subjective", {}, "v1", {}, QUESTIONS[:1])
+
+    assert bank.search_questions(digest=digest)["total"] == 1
+    assert bank.documents()["total"] == 1
+
+
+def test_search_by_topic(bank):
+    bank.put(TEXT, "subjective", {}, "v1", {}, QUESTIONS)
+
+    page = bank.search_questions(topic="ATP organelle")
+
+    assert page["total"] == 1
+    assert page["questions"][0]["question"] == "Which organelle makes ATP?"
+    assert page["questions"][0]["options"] == ["nucleus"]
+
+
+def test_topic_syntax_is_quoted(bank):
+    bank.put(TEXT, "subjective", {}, "v1", {}, QUESTIONS)
+
+    assert bank.search_questions(topic='cell AND OR "NEAR(')["total"] == 0
+
+
+def test_index_errors_are_invalid_queries(bank, monkeypatch):
+    bank.put(TEXT, "subjective", {}, "v1", {}, QUESTIONS)
+    if not bank.fts:
+        pytest.skip("SQLite has no FTS5 support")
+    monkeypatch.setattr("question_bank._fts_query", lambda topic: topic)
+
+    with pytest.raises(InvalidQuery):
+        bank.search_questions(topic="cell AND")
+
+
+def test_disabled_bank_stores_nothing():
+    bank = QuestionBank("")
+
+    assert bank.put(TEXT, "summary", {}, "v1", {}) is None
+    assert bank.get(document_digest(TEXT), "summary", {}, "v1") is None
+    assert bank.search_questions() == {"total": 0, "questions": []}
+
+
+def test_default_path_follows_model_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv("QUESTION_BANK_PATH", raising=False)
+    monkeypatch.setenv("MODEL_CACHE_DIR", str(tmp_path))
+
+    assert question_bank.bank_from_env().path == str(tmp_path / "question_bank.db")
+
+
+def test_default_path_does_not_depend_on_the_working_directory(monkeypatch, tmp_path):
+    monkeypatch.delenv("QUESTION_BANK_PATH", raising=False)
+    monkeypatch.delenv("MODEL_CACHE_DIR", raising=False)
+    monkeypatch.chdir(tmp_path)
+
+    assert question_bank.bank_from_env().path == os.path.join(question_bank.DEFAULT_DIR, "question_bank.db")
@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("nltk")
+pytest.importorskip("spacy")
+pytest.importorskip("sklearn")
+
+from obj_q_gen.question_extraction import QuestionExtractor
+from segment_cache import SegmentCache
+
+DOCUMENT = "Marie Curie was born in Warsaw. She later moved to Paris."
+NAMES = {"Marie", "Curie", "Pierre", "Warsaw", "Paris"}
+
+
+class RecordingTagger:
+    """Tags the words in NAMES as entities and records what it was given"""
+
+    def __init__(self):
+        self.calls = []
+
+    def _doc(self, text):
+        words = text.replace(".", "").split()
+        return SimpleNamespace(ents=[SimpleNamespace(text=w) for w in words if w in NAMES])
+
+    def __call__(self, text):
+        self.calls.append([text])
+        return self._doc(text)
+
+    def pipe(self, texts):
+        texts = list(texts)
+        self.calls.append(texts)
+        return [self._doc(text) for text in texts]
+
+
+def extractor(entity_cache=None):
+    qe = QuestionExtractor.__new__(QuestionExtractor)
+    qe.ner_tagger, qe.entity_cache = RecordingTagger(), entity_cache
+    return qe
+
+
+def require_punkt():
+    from nltk.tokenize import sent_tokenize
+    try:
+        sent_tokenize("One. Two.")
+    except LookupError:
+        pytest.skip("NLTK punkt data is not installed")
+
+
+def test_without_a_cache_the_whole_document_is_tagged_once():
+    qe = extractor()
+
+    entities = qe.get_candidate_entities(DOCUMENT)
+
+    assert qe.ner_tagger.calls == [[DOCUMENT]]
+    assert sorted(entities) == ["Curie", "Marie", "Paris", "Warsaw"]
+
+
+def test_with_a_cache_only_new_sentences_are_tagged():
+    require_punkt()
+    cache = SegmentCache(path=None, memory_items=100).namespace("entities:test")
+    qe = extractor(cache)
+    qe.get_candidate_entities(DOCUMENT)
+
+    entities = qe.get_candidate_entities(DOCUMENT + " Pierre Curie worked with her.")
+
+    assert qe.ner_tagger.calls[-1] == ["Pierre Curie worked with her."]
+    assert sorted(entities) == ["Curie", "Marie", "Paris", "Pierre", "Warsaw"]
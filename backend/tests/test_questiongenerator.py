@@ -0,0 +1,344 @@
+import time
+
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("en_core_web_sm")
+
+from sub_q_gen.questiongenerator import QuestionGenerator
+
+
+class NoEvaluator:
+    evaluator_available = False
+
+
+@pytest.fixture
+def qg(monkeypatch):
+    """A QuestionGenerator whose model calls are replaced by string functions"""
+    qg = QuestionGenerator.__new__(QuestionGenerator)
+    qg.ANSWER_TOKEN, qg.CONTEXT_TOKEN, qg.SEQ_LENGTH = "<answer>", "<context>", 512
+    qg.model_version = "test-generator"
+    qg.segment_cache = None
+    qg.highlight_inputs = False
+    qg._qa_evaluator = NoEvaluator()
+    qg._refiner = None
+    monkeypatch.setattr(qg, "_encode_qg_inputs", lambda inputs, pad=True: [None] * len(inputs))
+    return qg
+
+
+def inputs_for(count):
+    inputs = [f"<answer> Sentence number {i} is here. <context> Paragraph {i}." for i in range(count)]
+    answers = [f"Sentence number {i} is here." for i in range(count)]
+    return inputs, answers
+
+
+def test_candidates_generated_counts_every_generated_input(qg, monkeypatch):
+    monkeypatch.setattr(qg, "generate_qg_inputs", lambda *args: inputs_for(6))
+    monkeypatch.setattr(qg, "_generate_question", lambda qg_input, *args: f"Question {qg_input}?")
+
+    qa_list, info = qg.generate("text", use_evaluator=False, num_questions=3, candidate_multiple=None,
+                                dedup_threshold=None, with_info=True)
+
+    assert info["candidates"] == 6
+    assert info["candidates_generated"] == 6
+    assert len(qa_list) == 3
+
+
+@pytest.mark.parametrize("num_questions, candidate_multiple, generated", [(2, 1.5, 3), (4, 1, 4), (2, 10, 6)])
+def test_candidate_multiple_caps_generation_per_question(qg, monkeypatch, num_questions, candidate_multiple,
+                                                         generated):
+    pytest.importorskip("sklearn")
+    monkeypatch.setattr(qg, "generate_qg_inputs", lambda *args: inputs_for(6))
+    monkeypatch.setattr(qg, "_generate_question", lambda qg_input, *args: f"Question {qg_input}?")
+
+    _, info = qg.generate("text", use_evaluator=False, num_questions=num_questions,
+                          candidate_multiple=candidate_multiple, dedup_threshold=None, with_info=True)
+
+    assert info["candidates"] == 6
+    assert info["candidates_generated"] == generated
+
+
+def test_candidates_generated_stops_with_the_time_budget(qg, monkeypatch):
+    def slow_question(qg_input, *args):
+        time.sleep(0.05)
+        return f"Question {qg_input}?"
+
+    monkeypatch.setattr(qg, "generate_qg_inputs", lambda *args: inputs_for(20))
+    monkeypatch.setattr(qg, "_generate_question", slow_question)
+
+    qa_list, info = qg.generate("text", use_evaluator=False, num_questions=20, candidate_multiple=None,
+                                dedup_threshold=None, time_budget=0.12, decoding_profile="fast",
+                                with_info=True)
+
+    assert info["stopped_early"]
+    assert info["candidates_generated"] < 20
+    assert info["candidates_generated"] == len(qa_list)
+
+
+class ScoringEvaluator:
+    evaluator_available = True
+    model_version = "test-evaluator"
+
+    @staticmethod
+    def correct_answer(answer):
+        return answer
+
+    @staticmethod
+    def rank_scores(scores):
+        return sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+
+
+def test_refiner_is_pinned_while_it_refines(qg, monkeypatch):
+    from models import ModelManager
+
+    manager = ModelManager(budget_mb=0)
+    refiner = QuestionGenerator.__new__(QuestionGenerator)
+    refiner.model_version = "test-refiner"
+    active_while_refining = []
+
+    def refine(qg_inputs, *args, **kwargs):
+        active_while_refining.append(manager.status()["loaded"][0]["active"])
+        return [f"Refined {qg_input}?" for qg_input in qg_inputs]
+
+    refiner.generate_questions_from_inputs = refine
+    manager.register("question_generator", lambda: refiner)
+    qg._refiner = lambda: manager.use("question_generator")
+    qg._qa_evaluator = ScoringEvaluator()
+    monkeypatch.setattr(qg, "generate_qg_inputs", lambda *args: inputs_for(4))
+    monkeypatch.setattr(qg, "_generate_question", lambda qg_input, *args: f"Draft {qg_input}?")
+    monkeypatch.setattr(qg, "score_qa_pairs", lambda questions, *args: [float(len(q)) for q in questions])
+
+    qa_list, info = qg.generate("text", num_questions=2, candidate_multiple=None, dedup_threshold=None,
+                                refine_multiple=1.0, with_info=True)
+
+    assert active_while_refining == [1]
+    assert manager.status()["loaded"][0]["active"] == 0
+    assert info["refined"] == 2 and info["refiner"] == "test-refiner"
+    assert all(qa["question"].startswith("Refined") for qa in qa_list)
+
+
+class RecordingModel:
+    def __init__(self):
+        self.calls = []
+
+    def generate(self, **kwargs):
+        self.calls.append(kwargs)
+        return torch.tensor([[5, 1]])
+
+
+@pytest.mark.parametrize("pad", [True, False])
+def test_generation_masks_the_padding(pad, monkeypatch):
+    from benchmarks.stubs import StubTokenizer
+
+    qg = QuestionGenerator.__new__(QuestionGenerator)
+    qg.SEQ_LENGTH, qg.highlight_inputs, qg.device = 16, False, torch.device("cpu")
+    qg.qg_tokenizer, qg.qg_model = StubTokenizer(), RecordingModel()
+
+    encoded = qg._encode_qg_inputs(["one two", "one two three four five"], pad)
+    qg._generate_question("one two", encoded_input=encoded[0])
+
+    length = qg.SEQ_LENGTH if pad else 6  # the longest input and its end token
+    assert [e["input_ids"].shape for e in encoded] == [torch.Size([1, length])] * 2
+    assert [int(e["attention_mask"].sum()) for e in encoded] == [3, 6]
+    assert torch.equal(qg.qg_model.calls[0]["attention_mask"], encoded[0]["attention_mask"])
+
+
+def pages_of(count, inputs_per_page, read):
+    """Pages whose single paragraph holds inputs_per_page sentences; read counts the pages taken"""
+    for page in range(count):
+        read.append(page)
+        yield " ".join(f"Page {page} sentence {i}." for i in range(inputs_per_page))
+
+
+@pytest.fixture
+def stream_qg(qg, monkeypatch):
+    """qg with every paragraph as its own segment and one input per sentence"""
+    def segment_inputs(segment, *args):
+        sentences = [s.strip() + "." for s in segment.split(".") if s.strip()]
+        return [f"<answer> {s} <context> {segment}" for s in sentences], sentences
+
+    monkeypatch.setattr(qg, "_iter_segments", lambda paragraphs: iter(paragraphs))
+    monkeypatch.setattr(qg, "_segment_qg_inputs", segment_inputs)
+    monkeypatch.setattr(qg, "prerank_qg_inputs",
+                        lambda inputs, answers, limit, *args: (inputs[:limit], answers[:limit]))
+    monkeypatch.setattr(qg, "_generate_question", lambda qg_input, *args: f"Question {qg_input}?")
+    return qg
+
+
+def test_stream_caps_candidates_per_segment(stream_qg):
+    read = []
+
+    qa_list, info = stream_qg.generate_stream(pages_of(3, 5, read), use_evaluator=False, num_questions=100,
+                                              candidates_per_segment=2, dedup_threshold=None, with_info=True)
+
+    assert (info["pages"], info["segments"], info["candidates"]) == (3, 3, 15)
+    assert info["candidates_generated"] == len(qa_list) == 6
+    assert [qa["answer"] for qa in qa_list[:3]] == ["Page 0 sentence 0.", "Page 0 sentence 1.", "Page 1 sentence 0."]
+
+
+def test_stream_stops_reading_pages_at_max_candidates(stream_qg):
+    read = []
+
+    qa_list, info = stream_qg.generate_stream(pages_of(10, 5, read), use_evaluator=False, num_questions=100,
+                                              candidates_per_segment=None, max_candidates=7,
+                                              dedup_threshold=None, with_info=True)
+
+    assert info["candidates_generated"] == len(qa_list) == 7
+    assert read == [0, 1]
+
+
+def test_stream_without_evaluator_stops_once_enough_questions_exist(stream_qg):
+    read = []
+
+    qa_list, info = stream_qg.generate_stream(pages_of(10, 4, read), use_evaluator=False, num_questions=5,
+                                              candidates_per_segment=None, batch_size=4, dedup_threshold=None,
+                                              with_info=True)
+
+    assert len(qa_list) == 5
+    assert info["candidates_generated"] == 8
+    assert read == [0, 1]
+
+
+def test_stream_keeps_the_best_scored_questions(stream_qg, monkeypatch):
+    stream_qg._qa_evaluator = ScoringEvaluator()
+    monkeypatch.setattr(stream_qg, "score_qa_pairs",
+                        lambda questions, answers, *args: [float(answer.split()[3].rstrip(".")) for answer in answers])
+
+    qa_list, info = stream_qg.generate_stream(pages_of(3, 4, []), num_questions=2, candidates_per_segment=None,
+                                              dedup_threshold=None, with_info=True)
+
+    assert info["evaluated"]
+    assert [qa["answer"] for qa in qa_list] == ["Page 0 sentence 3.", "Page 1 sentence 3."]
+
+
+def test_stream_stops_with_the_time_budget(stream_qg, monkeypatch):
+    def slow_question(qg_input, *args):
+        time.sleep(0.05)
+        return f"Question {qg_input}?"
+
+    monkeypatch.setattr(stream_qg, "_generate_question", slow_question)
+    read = []
+
+    qa_list, info = stream_qg.generate_stream(pages_of(10, 4, read), use_evaluator=False, num_questions=40,
+                                              decoding_profile="fast", time_budget=0.12,
+                                              candidates_per_segment=None, dedup_threshold=None, with_info=True)
+
+    assert info["stopped_early"]
+    assert 0 < info["candidates_generated"] == len(qa_list) < 40
+    assert len(read) < 10
+
+
+WINDOW_TEXT = "A one. B two. C three. D four. E five."
+WINDOW_SENTENCES = ["A one.", "B two.", "C three.", "D four.", "E five."]  # 3 tokens each
+
+
+@pytest.fixture
+def window_qg(qg):
+    from benchmarks.stubs import StubTokenizer
+
+    qg.qg_tokenizer = StubTokenizer()
+    return qg
+
+
+@pytest.mark.parametrize("context_window, expected", [
+    (0, ["A one.", "C three.", "E five."]),
+    (1, ["A one. B two.", "B two. C three. D four.", "D four. E five."]),
+    (2, ["A one. B two. C three.", WINDOW_TEXT, "C three. D four. E five."]),
+])
+def test_context_window_takes_neighbouring_sentences_on_each_side(window_qg, context_window, expected):
+    sentences = ["A one.", "C three.", "E five."]
+
+    assert window_qg._context_windows(sentences, WINDOW_TEXT, context_window, None) == expected
+
+
+@pytest.mark.parametrize("context_tokens, expected", [
+    (2, "C three."),  # the answer sentence is always kept
+    (7, "B two. C three."),  # before is tried first, then after no longer fits
+    (9, "B two. C three. D four."),
+    (14, "A one. B two. C three. D four."),
+    (100, WINDOW_TEXT),
+])
+def test_context_tokens_grow_the_window_while_it_fits(window_qg, context_tokens, expected):
+    assert window_qg._context_windows(["C three."], WINDOW_TEXT, None, context_tokens) == [expected]
+
+
+def test_sentences_outside_the_text_get_the_whole_text(window_qg):
+    assert window_qg._context_windows(["Z none."], WINDOW_TEXT, 1, None) == [WINDOW_TEXT]
+
+
+def test_windowed_inputs_pair_each_sentence_with_its_window(window_qg):
+    inputs, answers = window_qg._prepare_qg_inputs(["B two."], WINDOW_TEXT, context_window=1)
+
+    assert inputs == ["<answer> B two. <context> A one. B two. C three."]
+    assert answers == ["B two."]
+
+
+def test_context_window_and_context_tokens_are_exclusive(window_qg):
+    with pytest.raises(ValueError, match="not both"):
+        window_qg.generate_qg_inputs(WINDOW_TEXT, "sentences", context_window=1, context_tokens=64)
+
+
+def test_refine_regenerates_only_the_best_scored_drafts(qg, monkeypatch):
+    refined_inputs = []
+
+    def refine(qg_inputs, *args, **kwargs):
+        refined_inputs.extend(qg_inputs)
+        return [f"Refined {qg_input}?" for qg_input in qg_inputs]
+
+    qg.model_version = "test-refiner"
+    qg.generate_questions_from_inputs = refine
+    monkeypatch.setattr(qg, "score_qa_pairs", lambda questions, answers, *args: [10.0] * len(questions))
+    info = {"refined": 0}
+
+    questions, scores = qg._refine(["in0", "in1", "in2", "in3"], ["q0", "q1", "q2", "q3"], ["a0", "a1", "a2", "a3"],
+                                   [1.0, 4.0, 2.0, 3.0], 2, "fast", None, time.perf_counter(), info)
+
+    assert refined_inputs == ["in1", "in3"]
+    assert questions == ["q0", "Refined in1?", "q2", "Refined in3?"]
+    assert scores == [1.0, 10.0, 2.0, 10.0]
+    assert info == {"refined": 2, "refiner": "test-refiner"}
+
+
+@pytest.mark.parametrize("num_questions, refine_multiple, refined", [(2, 1.0, 2), (2, 1.5, 3), (4, 10, 6)])
+def test_refine_multiple_sets_how_many_drafts_are_refined(qg, monkeypatch, num_questions, refine_multiple, refined):
+    refiner = QuestionGenerator.__new__(QuestionGenerator)
+    refiner.model_version = "test-refiner"
+    refiner.generate_questions_from_inputs = lambda qg_inputs, *args, **kwargs: [f"Refined {i}?" for i in qg_inputs]
+    qg._refiner = refiner
+    qg._qa_evaluator = ScoringEvaluator()
+    monkeypatch.setattr(qg, "generate_qg_inputs", lambda *args: inputs_for(6))
+    monkeypatch.setattr(qg, "_generate_question", lambda qg_input, *args: f"Draft {qg_input}?")
+    monkeypatch.setattr(qg, "score_qa_pairs", lambda questions, *args: [float(len(q)) for q in questions])
+
+    qa_list, info = qg.generate("text", num_questions=num_questions, candidate_multiple=None, dedup_threshold=None,
+                                refine_multiple=refine_multiple, with_info=True)
+
+    assert info["refined"] == refined
+    # the refined questions score higher (they are longer), so they come first
+    assert all(qa["question"].startswith("Refined") for qa in qa_list)
+
+
+def test_drafts_are_kept_without_refine_multiple(qg, monkeypatch):
+    qg._qa_evaluator = ScoringEvaluator()
+    monkeypatch.setattr(qg, "generate_qg_inputs", lambda *args: inputs_for(4))
+    monkeypatch.setattr(qg, "_generate_question", lambda qg_input, *args: f"Draft {qg_input}?")
+    monkeypatch.setattr(qg, "score_qa_pairs", lambda questions, *args: [float(len(q)) for q in questions])
+
+    qa_list, info = qg.generate("text", num_questions=2, candidate_multiple=None, dedup_threshold=None,
+                                with_info=True)
+
+    assert info["refined"] == 0 and "refiner" not in info
+    assert all(qa["question"].startswith("Draft") for qa in qa_list)
+
+
+@pytest.mark.parametrize("qg_input, expected", [
+    ("<answer> the mitochondria <context> Energy comes from the mitochondria in cells.",
+     "generate question: Energy comes from <hl> the mitochondria <hl> in cells."),
+    ("<answer> Energy comes first. <context> Energy comes first. Then growth.",
+     "generate question: <hl> Energy comes first. <hl> Then growth."),
+    ("<answer> ATP <context> Energy comes from the mitochondria.",
+     "generate question: <hl> ATP <hl> Energy comes from the mitochondria."),
+])
+def test_highlight_input_marks_the_answer_in_its_context(qg, qg_input, expected):
+    assert qg._highlight_input(qg_input) == expected
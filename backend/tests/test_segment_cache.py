@@ -0,0 +1,119 @@
+import sqlite3
+import threading
+import time
+
+import segment_cache
+from segment_cache import SegmentCache, segment_key
+
+
+def test_segment_key_separates_parts():
+    assert segment_key("ab", "c") != segment_key("a", "bc")
+    assert segment_key("pdf", b"page") == segment_key("pdf", b"page")
+    assert segment_key("pdf", b"page") != segment_key("pptx", b"page")
+
+
+def test_results_survive_a_new_process(tmp_path):
+    path = str(tmp_path / "segments.db")
+    SegmentCache(path).put_many("questions:v1", {"a": [1, 2], "b": {"x": "y"}})
+
+    cache = SegmentCache(path, memory_items=0)
+
+    assert cache.get_many("questions:v1", ["a", "b", "c"]) == {"a": [1, 2], "b": {"x": "y"}}
+    assert cache.get_many("questions:v2", ["a"]) == {}
+
+
+def test_memory_only_cache(tmp_path):
+    cache = SegmentCache(None, memory_items=2)
+    cache.put_many("n", {"a": 1, "b": 2, "c": 3})
+
+    assert cache.get_many("n", ["a", "b", "c"]) == {"b": 2, "c": 3}
+    assert SegmentCache(None, memory_items=0).namespace("n") is None
+
+
+def test_prune_keeps_the_most_recently_used_rows(tmp_path):
+    cache = SegmentCache(str(tmp_path / "segments.db"), memory_items=0, max_rows=2, ttl_days=0)
+    cache.put_many("n", {"old": 1})
+    cache.put_many("n", {"older": 2})
+    connection = cache._connect()
+    with connection:
+        connection.execute("UPDATE segments SET used_at = 1 WHERE key = 'older'")
+        connection.execute("UPDATE segments SET used_at = 2 WHERE key = 'old'")
+    cache.put_many("n", {"new": 3})
+
+    assert cache.prune() == 1
+    assert cache.get_many("n", ["old", "older", "new"]) == {"old": 1, "new": 3}
+
+
+def test_prune_drops_expired_rows(tmp_path):
+    cache = SegmentCache(str(tmp_path / "segments.db"), memory_items=0, max_rows=0, ttl_days=1)
+    cache.put_many("n", {"stale": 1, "fresh": 2})
+    connection = cache._connect()
+    with connection:
+        connection.execute("UPDATE segments SET used_at = ? WHERE key = 'stale'", (time.time() - 2 * 86400,))
+
+    assert cache.prune() == 1
+    assert cache.get_many("n", ["stale", "fresh"]) == {"fresh": 2}
+
+
+def test_reads_refresh_the_last_use(tmp_path):
+    cache = SegmentCache(str(tmp_path / "segments.db"), memory_items=0)
+    cache.put_many("n", {"a": 1})
+    connection = cache._connect()
+    with connection:
+        connection.execute("UPDATE segments SET used_at = 1")
+
+    cache.get_many("n", ["a"])
+
+    assert connection.execute("SELECT used_at FROM segments").fetchone()[0] > time.time() - 60
+
+
+def test_writes_prune_the_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(segment_cache, "PRUNE_EVERY", 3)
+    cache = SegmentCache(str(tmp_path / "segments.db"), memory_items=0, max_rows=2)
+    for key in "abcd":
+        cache.put_many("n", {key: key})
+
+    assert cache._connect().execute("SELECT COUNT(*) FROM segments").fetchone()[0] <= 3
+
+
+def test_files_without_last_use_are_migrated(tmp_path):
+    path = str(tmp_path / "segments.db")
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("CREATE TABLE segments (namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+                           "created_at REAL NOT NULL, PRIMARY KEY (namespace, key)) WITHOUT ROWID")
+        connection.execute("INSERT INTO segments VALUES ('n', 'a', '1', 5)")
+    connection.close()
+
+    cache = SegmentCache(path, memory_items=0)
+
+    assert cache._connect().execute("SELECT used_at FROM segments").fetchone()[0] == 5
+    assert cache.get_many("n", ["a"]) == {"a": 1}
+
+
+def test_threads_use_their_own_connections(tmp_path):
+    cache = SegmentCache(str(tmp_path / "segments.db"), memory_items=0)
+    errors = []
+
+    def work(thread):
+        try:
+            for i in range(20):
+                cache.put_many("n", {f"{thread}-{i}": i})
+                assert cache.get_many("n", [f"{thread}-{i}"]) == {f"{thread}-{i}": i}
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_default_path_follows_model_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv("SEGMENT_CACHE_PATH", raising=False)
+    monkeypatch.setenv("MODEL_CACHE_DIR", str(tmp_path))
+
+    assert segment_cache.cache_from_env().path == str(tmp_path / "segment_cache.db")
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import admission
+import singleflight
+from admission import AdmissionController, AdmissionRejected, WorkloadClass
+from cancellation import DeadlineExceeded, deadline_after
+from singleflight import SingleFlight
+
+
+@pytest.fixture
+def one_slot(monkeypatch):
+    """Admission with a single slot and room for one queued request"""
+    monkeypatch.setattr(admission, "CANCEL_POLL_SECONDS", 0.01)
+    controller = AdmissionController([WorkloadClass("work", 0, 1, 1)])
+    monkeypatch.setattr(singleflight, "admission", controller)
+    return controller
+
+
+def blocking(release):
+    def function(cancel_token):
+        release.wait(5)
+        return "done"
+    return function
+
+
+def test_identical_requests_share_one_computation():
+    calls = []
+
+    def function(cancel_token, value):
+        calls.append(value)
+        time.sleep(0.05)
+        return value * 2
+
+    async def main():
+        flight = SingleFlight("test")
+        return await asyncio.gather(*(flight.do("key", function, 21) for _ in range(3)))
+
+    assert asyncio.run(main()) == [42, 42, 42]
+    assert calls == [21]
+
+
+def test_abandoned_when_rejected_by_admission(one_slot):
+    release = threading.Event()
+    abandoned = []
+
+    async def main():
+        flight = SingleFlight("test")
+        running = asyncio.ensure_future(flight.do("a", blocking(release), workload="work"))
+        queued = asyncio.ensure_future(flight.do("b", blocking(release), workload="work"))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(AdmissionRejected):
+                await flight.do("c", blocking(release), workload="work", on_abandon=lambda: abandoned.append("c"))
+        finally:
+            release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(main())
+    assert abandoned == ["c"]
+
+
+def test_abandoned_when_cancelled_while_queued(one_slot):
+    release = threading.Event()
+    abandoned = []
+
+    async def main():
+        flight = SingleFlight("test")
+        running = asyncio.ensure_future(flight.do("a", blocking(release), workload="work"))
+        await asyncio.sleep(0.05)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                await flight.do("b", blocking(release), workload="work", deadline=deadline_after(0.05),
+                                on_abandon=lambda: abandoned.append("b"))
+            await asyncio.sleep(0.1)
+        finally:
+            release.set()
+        await running
+
+    asyncio.run(main())
+    assert abandoned == ["b"]
+
+
+def test_not_abandoned_once_started(one_slot):
+    abandoned = []
+
+    def failing(cancel_token):
+        raise ValueError("bad input")
+
+    async def main():
+        flight = SingleFlight("test")
+        with pytest.raises(ValueError):
+            await flight.do("a", failing, workload="work", on_abandon=lambda: abandoned.append("a"))
+
+    asyncio.run(main())
+    assert abandoned == []
+
+
+def test_late_joiner_after_cancellation_starts_a_new_computation():
+    release = threading.Event()
+    calls = []
+
+    def function(cancel_token):
+        calls.append(cancel_token)
+        if len(calls) == 1:
+            # Keeps running for a while after it is cancelled
+            release.wait(5)
+            cancel_token.check()
+        return "fresh"
+
+    async def main():
+        flight = SingleFlight("test")
+        with pytest.raises(DeadlineExceeded):
+            await flight.do("key", function, deadline=deadline_after(0.05))
+        # Still winding down, but a new request would not join it
+        assert flight.in_flight() == 1 and not flight.running("key")
+        try:
+            return await flight.do("key", function)
+        finally:
+            release.set()
+
+    assert asyncio.run(main()) == "fresh"
+    assert len(calls) == 2
+    assert calls[0].cancelled and not calls[1].cancelled
+
+
+def test_running_until_cancelled():
+    release = threading.Event()
+
+    async def main():
+        flight = SingleFlight("test")
+        leader = asyncio.ensure_future(flight.do("key", blocking(release), deadline=deadline_after(0.05)))
+        await asyncio.sleep(0.01)
+        running_before = flight.running("key")
+        with pytest.raises(DeadlineExceeded):
+            await leader
+        running_after = flight.running("key")
+        release.set()
+        return running_before, running_after
+
+    assert asyncio.run(main()) == (True, False)
+
+
+def test_on_join_is_called_only_for_joiners():
+    release = threading.Event()
+    joined = []
+
+    async def main():
+        flight = SingleFlight("test")
+        leader = asyncio.ensure_future(flight.do("key", blocking(release), on_join=lambda: joined.append("leader")))
+        await asyncio.sleep(0.01)
+        joiner = asyncio.ensure_future(flight.do("key", blocking(release), on_join=lambda: joined.append("joiner")))
+        await asyncio.sleep(0.01)
+        assert joined == ["joiner"]
+        release.set()
+        return await asyncio.gather(leader, joiner)
+
+    assert asyncio.run(main()) == ["done", "done"]
+    assert joined == ["joiner"]
+
+
+def test_new_leader_after_cancellation_is_not_a_joiner():
+    release = threading.Event()
+    joined = []
+
+    async def main():
+        flight = SingleFlight("test")
+        with pytest.raises(DeadlineExceeded):
+            await flight.do("key", blocking(release), deadline=deadline_after(0.05))
+        try:
+            return await flight.do("key", lambda cancel_token: "fresh", on_join=lambda: joined.append("late"))
+        finally:
+            release.set()
+
+    assert asyncio.run(main()) == "fresh"
+    assert joined == []
+
+
+def test_joiners_extend_the_deadline():
+    async def main():
+        flight = SingleFlight("test")
+
+        def function(cancel_token):
+            time.sleep(0.15)
+            cancel_token.check()
+            return "done"
+
+        short = asyncio.ensure_future(flight.do("key", function, deadline=deadline_after(0.05)))
+        await asyncio.sleep(0.01)
+        result = await flight.do("key", function, deadline=deadline_after(5))
+        with pytest.raises(DeadlineExceeded):
+            await short
+        return result
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,124 @@
+import re
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+pytest.importorskip("en_core_web_sm")
+
+import tokenizer_report
+from transformers import PreTrainedTokenizer, PreTrainedTokenizerFast
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]+")
+SPECIAL_TOKENS = ["<pad>", "</s>", "<unk>"]
+
+
+def word_vocab(paragraphs):
+    words = sorted({word for paragraph in paragraphs for word in WORD_PATTERN.findall(paragraph)})
+    return {token: i for i, token in enumerate(SPECIAL_TOKENS + words)}
+
+
+class SlowWordTokenizer(PreTrainedTokenizer):
+    """Word-level slow tokenizer that ends every input with </s>, like T5's"""
+
+    def __init__(self, vocab, **kwargs):
+        self.vocab = vocab
+        self.tokens = {i: token for token, i in vocab.items()}
+        super().__init__(pad_token="<pad>", eos_token="</s>", unk_token="<unk>", **kwargs)
+
+    @property
+    def vocab_size(self):
+        return len(self.vocab)
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+    def _tokenize(self, text):
+        return WORD_PATTERN.findall(text)
+
+    def _convert_token_to_id(self, token):
+        return self.vocab.get(token, self.vocab["<unk>"])
+
+    def _convert_id_to_token(self, index):
+        return self.tokens.get(index, "<unk>")
+
+    def convert_tokens_to_string(self, tokens):
+        return " ".join(tokens)
+
+    def build_inputs_with_special_tokens(self, token_ids_0, token_ids_1=None):
+        return token_ids_0 + [self.eos_token_id]
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 1
+
+
+def fast_word_tokenizer(vocab):
+    from tokenizers import Tokenizer
+    from tokenizers.decoders import WordPiece
+    from tokenizers.models import WordLevel
+    from tokenizers.pre_tokenizers import Whitespace
+    from tokenizers.processors import TemplateProcessing
+
+    tokenizer = Tokenizer(WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = Whitespace()
+    tokenizer.post_processor = TemplateProcessing(single="$A </s>", special_tokens=[("</s>", vocab["</s>"])])
+    tokenizer.decoder = WordPiece(cleanup=False)
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>",
+                                   unk_token="<unk>")
+
+
+@pytest.fixture(scope="module")
+def word_tokenizers():
+    paragraphs = tokenizer_report.reference_paragraphs("small")
+    vocab = word_vocab(paragraphs)
+    return SlowWordTokenizer(vocab), fast_word_tokenizer(vocab), paragraphs
+
+
+def test_word_tokenizers_encode_alike(word_tokenizers):
+    slow, fast, paragraphs = word_tokenizers
+
+    assert [slow(p)["input_ids"] for p in paragraphs] == fast(paragraphs)["input_ids"]
+
+
+def test_long_paragraphs_are_split_into_the_same_pieces(word_tokenizers):
+    slow, fast, paragraphs = word_tokenizers
+    long = [p for p in paragraphs if len(slow(p)["input_ids"]) > tokenizer_report.SEQ_LENGTH]
+    assert long  # the reference corpus has a paragraph that overflows
+
+    slow_pieces = tokenizer_report.paragraph_pieces(slow, paragraphs)
+    fast_pieces = tokenizer_report.paragraph_pieces(fast, paragraphs)
+
+    assert slow_pieces == fast_pieces
+    assert len(slow_pieces) > len(paragraphs)
+    assert max(len(ids) for ids in slow_pieces) == tokenizer_report.SEQ_LENGTH
+    # no token is lost between pieces: only each piece's </s> is added
+    for paragraph in long:
+        ids = [i for piece in tokenizer_report.paragraph_pieces(slow, [paragraph]) for i in piece[:-1]]
+        assert ids == slow(paragraph, add_special_tokens=False)["input_ids"]
+
+
+def test_context_segments_do_not_depend_on_the_tokenizer(word_tokenizers):
+    slow, fast, paragraphs = word_tokenizers
+
+    assert tokenizer_report.segments(slow, paragraphs) == tokenizer_report.segments(fast, paragraphs)
+
+
+@pytest.fixture(scope="module")
+def tokenizers():
+    pytest.importorskip("sentencepiece")
+    try:
+        return tokenizer_report.load_tokenizers(local_files_only=True)
+    except Exception as e:  # not in the local Hugging Face cache
+        pytest.skip(f"Tokenizers unavailable: {e}")
+
+
+def test_fast_tokenizers_match_the_slow_ones(tokenizers):
+    paragraphs = tokenizer_report.reference_paragraphs("medium")
+
+    checks = tokenizer_report.parity_checks(tokenizers, paragraphs)
+
+    assert {check["check"] for check in checks} >= {"t5_paragraphs", "t5_generation_inputs", "bert_qa_pairs",
+                                                     "context_segments", "t5_paragraph_pieces"}
+    assert [check for check in checks if check["mismatches"]] == []
+    pieces = next(check for check in checks if check["check"] == "t5_paragraph_pieces")
+    assert pieces["cases"] >= 1  # the reference corpus has a paragraph that overflows
@@ -0,0 +1,63 @@
+import os
+
+import tracing
+from tracing import TraceSink
+
+
+def written(sink, directory):
+    sink.flush()
+    return sorted(os.listdir(directory))
+
+
+def test_disabled_sink_never_traces():
+    sink = TraceSink(sample_rate=0.0)
+
+    assert not sink.enabled
+    assert all(sink.start_trace("summarize") is None for _ in range(100))
+
+
+def test_sampling_follows_the_sample_rate(monkeypatch):
+    sink = TraceSink(sample_rate=0.25)
+    draws = iter([0.1, 0.3, 0.24, 0.25])
+    monkeypatch.setattr(tracing.random, "random", lambda: next(draws))
+
+    traced = [sink.start_trace("summarize") is not None for _ in range(4)]
+
+    assert traced == [True, False, True, False]
+
+
+def test_traces_are_written_per_request(tmp_path):
+    sink = TraceSink(directory=str(tmp_path), sample_rate=1.0)
+    trace = sink.start_trace("summarize")
+
+    trace.write("input.txt", "some text")
+
+    assert written(sink, tmp_path) == [f"{trace.request_id}_input.txt"]
+    assert (tmp_path / f"{trace.request_id}_input.txt").read_text(encoding="utf-8") == "some text"
+
+
+def test_content_is_truncated_to_max_bytes_of_utf8(tmp_path):
+    sink = TraceSink(directory=str(tmp_path), sample_rate=1.0, max_bytes=10)
+    trace = sink.start_trace("summarize")
+
+    # 3 ASCII bytes, then 2-byte characters: the cut at byte 10 splits the fourth
+    trace.write("input.txt", "abc" + "é" * 10)
+
+    written(sink, tmp_path)
+    kept, marker = (tmp_path / f"{trace.request_id}_input.txt").read_text(encoding="utf-8").split("\n")
+    assert kept == "abc" + "é" * 3
+    assert len(kept.encode("utf-8")) <= 10
+    assert marker == "... truncated 13 bytes"
+
+
+def test_oldest_files_are_rotated_out(tmp_path):
+    old = tmp_path / "old_trace.txt"
+    old.write_text("old")
+    sink = TraceSink(directory=str(tmp_path), sample_rate=1.0, max_files=2)
+    trace = sink.start_trace("summarize")
+
+    trace.write("a.txt", "a")
+    trace.write("b.txt", "b")
+
+    assert written(sink, tmp_path) == [f"{trace.request_id}_a.txt", f"{trace.request_id}_b.txt"]
+    assert sink.written == 2
@@ -0,0 +1,165 @@
+import io
+
+import pytest
+
+from segment_cache import segment_key
+from transcript import PageRangeError, Transcriber, parse_page_range
+
+SCANNED_PAGE = b"q 100 0 0 100 0 0 cm /Im0 Do Q"
+
+
+def stream(writer, data, **entries):
+    from PyPDF2.generic import DecodedStreamObject, NameObject
+
+    obj = DecodedStreamObject()
+    obj.set_data(data)
+    for key, value in entries.items():
+        obj[NameObject(f"/{key}")] = value
+    return writer._add_object(obj)
+
+
+def image(writer, pixel):
+    from PyPDF2.generic import NameObject, NumberObject
+
+    return stream(writer, pixel, Type=NameObject("/XObject"), Subtype=NameObject("/Image"),
+                  Width=NumberObject(1), Height=NumberObject(1), BitsPerComponent=NumberObject(8),
+                  ColorSpace=NameObject("/DeviceGray"))
+
+
+def scanned_pdf(pixels, in_form=False):
+    """PDF whose pages each draw one 1x1 image through the same content stream"""
+    PyPDF2 = pytest.importorskip("PyPDF2")
+    from PyPDF2.generic import DictionaryObject, NameObject
+
+    writer = PyPDF2.PdfWriter()
+    for pixel in pixels:
+        writer.add_blank_page(100, 100)
+        page = writer.pages[-1]
+        xobject = image(writer, pixel)
+        if in_form:
+            resources = DictionaryObject({NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): xobject})})
+            xobject = stream(writer, b"/Im0 Do", Type=NameObject("/XObject"), Subtype=NameObject("/Form"),
+                             Resources=resources)
+        page[NameObject("/Resources")] = DictionaryObject(
+            {NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): xobject})}
+        )
+        page[NameObject("/Contents")] = stream(writer, SCANNED_PAGE)
+    output = io.BytesIO()
+    writer.write(output)
+    output.seek(0)
+    return PyPDF2.PdfReader(output)
+
+
+def page_keys(reader):
+    return [segment_key("pdf-ocr", Transcriber._pdf_page_content(page)) for page in reader.pages]
+
+
+@pytest.mark.parametrize("in_form", [False, True])
+def test_scanned_pages_with_different_images_get_different_keys(in_form):
+    keys = page_keys(scanned_pdf([b"\x00", b"\xff"], in_form))
+
+    assert keys[0] != keys[1]
+
+
+@pytest.mark.parametrize("in_form", [False, True])
+def test_identical_scans_share_a_key_across_documents(in_form):
+    first = page_keys(scanned_pdf([b"\x00", b"\x80"], in_form))
+    second = page_keys(scanned_pdf([b"\x80"], in_form))
+
+    assert first[1] == second[0]
+
+
+@pytest.mark.parametrize("spec, pages", [
+    (None, [0, 1, 2, 3, 4]),
+    ("", [0, 1, 2, 3, 4]),
+    ("2", [1]),
+    ("1-3", [0, 1, 2]),
+    (" 4- ", [3, 4]),
+    ("-2", [0, 1]),
+    ("5,1-2,2", [0, 1, 4]),
+    ("4-9", [3, 4]),
+    ("3,12", [2]),
+])
+def test_page_range_selects_pages(spec, pages):
+    assert parse_page_range(spec, 5) == pages
+
+
+@pytest.mark.parametrize("spec", ["0", "3-2", "a", "1-b", "1,,2", "1-2-3", "-0"])
+def test_malformed_page_ranges_are_rejected(spec):
+    with pytest.raises(PageRangeError, match="Invalid page range"):
+        parse_page_range(spec, 5)
+
+
+@pytest.mark.parametrize("spec", ["6", "7-9", "10-"])
+def test_page_ranges_past_the_end_are_rejected(spec):
+    with pytest.raises(PageRangeError, match="selects none"):
+        parse_page_range(spec, 5)
+
+
+def transcriber_of(pages, page_range, media_type="pdf"):
+    """Transcriber whose document has the given raw page texts"""
+    transcriber = Transcriber(f"document.{media_type}", cleanup=False, page_range=page_range)
+
+    def page_results(separator="\n"):
+        for text in transcriber._selected(pages):
+            yield text, 0.0, False, False
+
+    transcriber._page_results = page_results
+    return transcriber
+
+
+def test_page_offsets_locate_each_page_in_the_transcript():
+    pages = ["First  page", "", "Third\n\npage", "Fourth page", "Fifth page"]
+
+    result = transcriber_of(pages, "1-4").transcribe_pages()
+
+    assert result["transcript"] == "First page\nThird\npage\nFourth page"
+    assert result["page_count"] == 5
+    assert [page["page"] for page in result["pages"]] == [1, 3, 4]
+    assert [result["transcript"][page["start"]:page["end"]] for page in result["pages"]] == \
+        ["First page", "Third\npage", "Fourth page"]
+
+
+def test_slide_offsets_account_for_the_space_separator():
+    result = transcriber_of(["One", "Two", "Three"], "2-", media_type="pptx").transcribe_pages()
+
+    assert result["transcript"] == "Two Three"
+    assert result["pages"] == [{"page": 2, "start": 0, "end": 3}, {"page": 3, "start": 4, "end": 9}]
+
+
+def test_pages_are_not_hashed_without_a_page_cache():
+    def content(page):
+        raise AssertionError("content read for a cache key")
+
+    transcriber = Transcriber("document.pdf", cleanup=False)
+
+    results = list(transcriber._iter_cached_results("pdf-text", ["a", "b", "a"], content, str.upper))
+
+    assert [(text, cached) for text, _, cached in results] == [("A", False), ("B", False), ("A", False)]
+
+
+def test_cached_pages_are_extracted_once():
+    from segment_cache import SegmentCache
+
+    extracted = []
+    cache = SegmentCache(path=None, memory_items=100).namespace("transcripts")
+    transcriber = Transcriber("document.pdf", cleanup=False, page_cache=cache)
+
+    def extract(page):
+        extracted.append(page)
+        return page.upper()
+
+    list(transcriber._iter_cached_results("pdf-text", ["a", "b", "a"], str.encode, extract))
+    results = list(transcriber._iter_cached_results("pdf-text", ["b", "c"], str.encode, extract))
+
+    assert extracted == ["a", "b", "c"]
+    assert [(text, cached) for text, _, cached in results] == [("B", True), ("C", False)]
+
+
+def test_scanned_pages_are_not_ocrd_with_the_fallback_off(monkeypatch):
+    import transcript
+
+    monkeypatch.setattr(transcript, "PDF_OCR_FALLBACK", False)
+    page = scanned_pdf([b"\x00"]).pages[0]
+
+    assert Transcriber._extract_pdf_page(page) == ["", False]
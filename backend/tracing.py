@@ -0,0 +1,129 @@
+"""
+Sampled, non-blocking debug traces
+
+Replaces the old synchronous debug/ file dumps. A sampled request gets a Trace
+with its own id; trace.write() only queues the content, and a background
+thread writes it to TRACE_DIR as <request id>_<name>. Old files are rotated
+out once more than TRACE_MAX_FILES exist. With the default sample rate of 0,
+start_trace() returns None and callers skip building any debug content.
+
+Environment variables:
+    TRACE_SAMPLE_RATE: Fraction of requests to trace, 0.0-1.0 (default 0)
+    TRACE_DIR: Output directory (default debug)
+    TRACE_MAX_BYTES: Per-file cap on the UTF-8 encoded content, longer content
+        is truncated (default 65536)
+    TRACE_MAX_FILES: Files kept before the oldest are deleted (default 200)
+"""
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+QUEUE_SIZE = 256
+
+
+class Trace:
+    def __init__(self, sink: "TraceSink", name: str) -> None:
+        self.sink = sink
+        self.request_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{uuid.uuid4().hex[:8]}"
+
+    def write(self, filename: str, content: str) -> None:
+        """Queue content for writing; never blocks the caller"""
+        self.sink.enqueue(f"{self.request_id}_{filename}", content)
+
+
+class TraceSink:
+    def __init__(self, directory: str = "debug", sample_rate: float = 0.0,
+                 max_bytes: int = 65536, max_files: int = 200) -> None:
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._files = None
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def start_trace(self, name: str) -> Optional[Trace]:
+        """Return a Trace if this request is sampled, otherwise None"""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        return Trace(self, name)
+
+    def enqueue(self, filename: str, content: str) -> None:
+        encoded = content.encode("utf-8")
+        if len(encoded) > self.max_bytes:
+            # A character split by the cut is dropped rather than mangled
+            content = (encoded[:self.max_bytes].decode("utf-8", errors="ignore")
+                       + f"\n... truncated {len(encoded) - self.max_bytes} bytes")
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((filename, content))
+        except queue.Full:
+            self.dropped += 1
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait until queued traces are written, e.g. at shutdown"""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                self._writer.start()
+
+    def _run(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        existing = [os.path.join(self.directory, f) for f in os.listdir(self.directory)]
+        self._files = deque(sorted((f for f in existing if os.path.isfile(f)), key=os.path.getmtime))
+
+        while True:
+            filename, content = self._queue.get()
+            try:
+                path = os.path.join(self.directory, filename)
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                self.written += 1
+                self._files.append(path)
+                self._rotate()
+            except Exception as e:
+                print(f"Warning: Could not write trace {filename}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _rotate(self) -> None:
+        while len(self._files) > self.max_files:
+            oldest = self._files.popleft()
+            try:
+                os.remove(oldest)
+            except OSError:
+                pass
+
+
+def sink_from_env() -> TraceSink:
+    return TraceSink(
+        directory=os.environ.get("TRACE_DIR", "debug"),
+        sample_rate=float(os.environ.get("TRACE_SAMPLE_RATE", "0")),
+        max_bytes=int(os.environ.get("TRACE_MAX_BYTES", "65536")),
+        max_files=int(os.environ.get("TRACE_MAX_FILES", "200")),
+    )
+
+
+tracer = sink_from_env()
@@ -1,9 +1,12 @@
+import hashlib
+import io
 import os
 import re
-from PIL import Image 
-from pytesseract import pytesseract 
-from pptx import Presentation
-import PyPDF2
+import time
+from itertools import islice
+from cancellation import Cancelled, check_cancelled
+from metrics import TRANSCRIPTION_SECONDS, count_items, stage
+from segment_cache import segment_key
 
 # Read API key if needed for future audio/video features
 try:
@@ -12,11 +15,326 @@ try:
 except FileNotFoundError:
     api_key = None
 
+# The document parsers and OCR (PyPDF2, python-pptx, Pillow, pytesseract) are
+# imported on first use so the API starts quickly
+
+# Pages looked up in the page cache and extracted at a time
+PAGE_CHUNK = 16
+IMAGE_TYPES = ("png", "jpg", "jpeg")
+# OCR the embedded images of PDF pages without a text layer (scanned pages).
+# Off by default: it runs Tesseract on every such page
+PDF_OCR_FALLBACK = os.environ.get("PDF_OCR_FALLBACK", "0").strip().lower() in ("1", "true", "yes")
+
+class PageRangeError(ValueError):
+    """A page range that is malformed or selects no page of the document"""
+
+def parse_page_range(spec, page_count):
+    """
+    Return the 0-based indices of the pages selected by a 1-based range spec
+    such as "1-3,7,10-" (open-ended ranges run to the last page, pages past
+    the end are ignored). None or "" selects every page.
+    """
+    if spec is None or not str(spec).strip():
+        return list(range(page_count))
+
+    indices = set()
+    for part in str(spec).split(","):
+        start, dash, end = part.strip().partition("-")
+        if not dash and not start:
+            raise PageRangeError(f"Invalid page range {spec!r}: empty part")
+        try:
+            first = int(start) if start.strip() else 1
+            last = int(end) if end.strip() else None
+        except ValueError:
+            raise PageRangeError(f"Invalid page range {part.strip()!r}")
+        if first < 1 or (last is not None and last < first):
+            raise PageRangeError(f"Invalid page range {part.strip()!r}")
+        if not dash:
+            last = first
+        indices.update(range(first - 1, min(last or page_count, page_count)))
+
+    if not indices:
+        raise PageRangeError(f"Page range {spec} selects none of the document's {page_count} pages")
+    return sorted(indices)
+
 class Transcriber:
-    def __init__(self, file_path):
+    def __init__(self, file_path, cleanup=True, page_cache=None, page_range=None, cancel_token=None):
+        """
+        Args:
+            file_path: File to transcribe
+            cleanup: Delete the file once it has been transcribed (the API
+                transcribes temp files; bulk processing keeps its sources)
+            page_cache: Segment cache namespace for per-page text, keyed by
+                the hash of each page's content, so only new or changed
+                pages of a re-uploaded document are extracted again
+            page_range: Pages or slides to transcribe as a 1-based spec such
+                as "3-7,10" or "12-" (see parse_page_range). None transcribes
+                every page. Only the selected pages are parsed and extracted.
+            cancel_token: CancellationToken checked before each page is
+                extracted, so abandoned requests stop between pages
+        """
         self.file_path = file_path
+        self.cleanup = cleanup
+        self.page_cache = page_cache
+        self.page_range = page_range
+        self.cancel_token = cancel_token
+        # Set once the document is opened
+        self.page_count = None
+        self.page_numbers = []
         self.media_type = file_path.split(".")[-1].lower()
         print(f"Processing file type: {self.media_type}")
+
+    def _iter_cached_results(self, kind, pages, content, extract):
+        """
+        Yield (result, seconds, cached) for each page, extracting only cache
+        misses. Pages are looked up in the page cache PAGE_CHUNK at a time and
+        yielded as soon as they are extracted, so a long document is never
+        held in memory as a whole.
+
+        Args:
+            kind: File type, part of the cache key
+            pages: Iterable of pages (PDF pages, slides, image paths)
+            content: Function from a page to its raw content, used for the cache key
+            extract: Function from a page to its result (JSON serialisable)
+        """
+        if self.page_cache is None:
+            # Keys are only needed for lookups; hashing PDF pages includes their images
+            yield from self._iter_extracted_results(pages, extract)
+            return
+        pages = iter(pages)
+        while True:
+            chunk = list(islice(pages, PAGE_CHUNK))
+            if not chunk:
+                return
+            keys = [segment_key(kind, content(page)) for page in chunk]
+            cached = self.page_cache.get_many(keys)
+            new_pages = {}
+            done = 0
+            try:
+                for page, key in zip(chunk, keys):
+                    if key in cached or key in new_pages:
+                        result, seconds, hit = cached.get(key, new_pages.get(key)), 0.0, True
+                    else:
+                        check_cancelled(self.cancel_token)
+                        start = time.perf_counter()
+                        new_pages[key] = result = extract(page)
+                        seconds, hit = time.perf_counter() - start, False
+                    done += 1
+                    yield result, seconds, hit
+            finally:
+                self.page_cache.put_many(new_pages)
+                count_items("transcribe", "pages", done)
+                count_items("transcribe", "pages_cached", done - len(new_pages))
+
+    def _iter_extracted_results(self, pages, extract):
+        """_iter_cached_results without a page cache: extract every page"""
+        done = 0
+        try:
+            for page in pages:
+                check_cancelled(self.cancel_token)
+                start = time.perf_counter()
+                result = extract(page)
+                done += 1
+                yield result, time.perf_counter() - start, False
+        finally:
+            count_items("transcribe", "pages", done)
+
+    def _iter_cached_pages(self, kind, pages, content, extract):
+        """Text of each page, see _iter_cached_results"""
+        for result, _, _ in self._iter_cached_results(kind, pages, content, extract):
+            yield result
+
+    def _selected(self, pages):
+        """Select the requested pages from a lazily loaded page sequence"""
+        self.page_count = len(pages)
+        self.page_numbers = [index + 1 for index in parse_page_range(self.page_range, self.page_count)]
+        # Indexing only parses the pages that are asked for
+        return (pages[number - 1] for number in self.page_numbers)
+
+    def _pdf_results(self, pdf_file):
+        import PyPDF2
+        # PdfReader parses pages on access, so pages are read as they are consumed
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        # Pages extracted with and without the OCR fallback are cached apart
+        return self._iter_cached_results(
+            "pdf-ocr" if PDF_OCR_FALLBACK else "pdf-text", self._selected(pdf_reader.pages),
+            self._pdf_page_content, self._extract_pdf_page
+        )
+
+    def _pdf_pages(self, pdf_file):
+        for (text, _), _, _ in self._pdf_results(pdf_file):
+            yield text
+
+    @staticmethod
+    def _extract_pdf_page(page):
+        """[text, ocr]: the page's text layer, or the OCR text of its images when it has none"""
+        text = page.extract_text()
+        if text.strip() or not PDF_OCR_FALLBACK:
+            return [text, False]
+        from PIL import Image
+        from pytesseract import pytesseract
+        texts = []
+        try:
+            images = page.images
+        except Exception as e:
+            print(f"Warning: Could not read images of a PDF page: {e}")
+            images = []
+        for image in images:
+            try:
+                texts.append(pytesseract.image_to_string(Image.open(io.BytesIO(image.data))))
+            except Exception as e:
+                print(f"Warning: Could not OCR PDF image {image.name}: {e}")
+        if not texts:
+            return [text, False]
+        return ["\n".join(texts), True]
+
+    def _slide_texts(self, prs):
+        return self._iter_cached_pages(
+            "pptx", self._selected(prs.slides), lambda slide: slide.part.blob, self._extract_slide
+        )
+
+    @staticmethod
+    def _extract_slide(slide):
+        texts = []
+        for shape in slide.shapes:
+            if shape.has_text_frame:
+                text = shape.text.strip()
+                if text: 
+                    texts.append(text)
+        return texts
+
+    def _image_results(self):
+        from PIL import Image
+        from pytesseract import pytesseract
+        with open(self.file_path, "rb") as image_file:
+            content = image_file.read()
+        return self._iter_cached_results(
+            "image", self._selected([self.file_path]), lambda _: content, lambda path: pytesseract.image_to_string(Image.open(path))
+        )
+
+    def _image_pages(self):
+        for text, _, _ in self._image_results():
+            yield text
+
+    def _page_results(self, slide_separator="\n"):
+        """
+        (raw text, extraction seconds, ocr, cached) of each requested page,
+        read as it is consumed
+        """
+        if self.media_type == "pdf":
+            with open(self.file_path, "rb") as pdf_file:
+                for (text, ocr), seconds, cached in self._pdf_results(pdf_file):
+                    yield text, seconds, ocr, cached
+        elif self.media_type == "pptx":
+            from pptx import Presentation
+            slides = self._selected(Presentation(self.file_path).slides)
+            for texts, seconds, cached in self._iter_cached_results(
+                "pptx", slides, lambda slide: slide.part.blob, self._extract_slide
+            ):
+                yield slide_separator.join(texts), seconds, False, cached
+        elif self.media_type in IMAGE_TYPES:
+            for text, seconds, cached in self._image_results():
+                yield text, seconds, True, cached
+        else:
+            raise Exception(f"Unsupported file type: {self.media_type}")
+
+    def _page_texts(self, slide_separator="\n"):
+        """Raw text of each requested page, read as it is consumed"""
+        for text, _, _, _ in self._page_results(slide_separator):
+            yield text
+
+    def iter_pages(self):
+        """
+        Yield the cleaned text of each non-empty page, slide or image one at a
+        time, without joining them, so documents of any length can be fed to
+        QuestionGenerator.generate_stream() in bounded memory. The file is
+        removed once the pages are exhausted or the generator is closed.
+        """
+        try:
+            yield from self._clean_pages(self._page_texts())
+        except (PageRangeError, Cancelled):
+            raise
+        except Exception as e:
+            raise Exception(f"Error processing file: {str(e)}")
+        finally:
+            self._remove_file()
+
+    def iter_page_records(self):
+        """
+        Yield a record for every requested page, slide or image as soon as it
+        has been extracted, for streaming transcription. The file is removed
+        once the records are exhausted or the generator is closed.
+
+        Records have the 1-based page number, the cleaned text ("" for pages
+        without text), the seconds spent extracting it, whether OCR was used
+        and whether the text came from the page cache. Slides are joined with
+        spaces, like transcribe_pages() joins them.
+        """
+        separator = " " if self.media_type == "pptx" else "\n"
+        try:
+            for index, (text, seconds, ocr, cached) in enumerate(self._page_results(separator)):
+                yield {
+                    "page": self.page_numbers[index],
+                    "text": self._clean_text(text),
+                    "seconds": round(seconds, 4),
+                    "ocr": ocr,
+                    "cached": cached,
+                }
+        except (PageRangeError, Cancelled):
+            raise
+        except Exception as e:
+            raise Exception(f"Error processing file: {str(e)}")
+        finally:
+            self._remove_file()
+
+    def transcribe_pages(self):
+        """
+        Transcribe the requested pages and record where each one starts and
+        ends in the transcript, so large files can be transcribed a chunk at
+        a time
+
+        Returns:
+            Dict with the transcript, the document's page_count and pages:
+            the 1-based page number and start/end character offsets of every
+            non-empty requested page. Pages are joined like the *_transcribe
+            methods join them (newlines for PDFs, spaces for slides).
+        """
+        separator = " " if self.media_type == "pptx" else "\n"
+        file_type = "image" if self.media_type in IMAGE_TYPES else self.media_type
+        try:
+            with TRANSCRIPTION_SECONDS.time(file_type=file_type):
+                texts = list(self._page_texts(separator))
+
+            parts = []
+            pages = []
+            offset = 0
+            with stage("normalize"):
+                for number, text in zip(self.page_numbers, texts):
+                    text = self._clean_text(text)
+                    if not text:
+                        continue
+                    if parts:
+                        offset += len(separator)
+                    pages.append({"page": number, "start": offset, "end": offset + len(text)})
+                    parts.append(text)
+                    offset += len(text)
+            return {"transcript": separator.join(parts), "page_count": self.page_count, "pages": pages}
+        except (PageRangeError, Cancelled):
+            raise
+        except Exception as e:
+            raise Exception(f"Error processing {file_type} file: {str(e)}")
+        finally:
+            self._remove_file()
+
+    def _clean_pages(self, pages):
+        for text in pages:
+            text = self._clean_text(text)
+            if text:
+                yield text
+
+    def _remove_file(self):
+        if self.cleanup and os.path.exists(self.file_path):
+            os.remove(self.file_path)
         
     def _clean_text(self, text):
         """Clean and normalize text output"""
@@ -34,58 +352,106 @@ class Transcriber:
     def image_transcribe(self):
         """Extract text from images using OCR"""
         try:
-            img = Image.open(self.file_path) 
-            text = pytesseract.image_to_string(img)
-            return self._clean_text(text)
+            with TRANSCRIPTION_SECONDS.time(file_type="image"):
+                text = next(self._image_pages())
+            with stage("normalize"):
+                return self._clean_text(text)
         except Exception as e:
             raise Exception(f"Error processing image: {str(e)}")
         finally:
             # Clean up temp file
-            if os.path.exists(self.file_path):
-                os.remove(self.file_path)
+            self._remove_file()
 
     def ppt_transcribe(self):
         """Extract text from PowerPoint presentations"""
+        from pptx import Presentation
         try:
-            prs = Presentation(self.file_path)
-            slide_texts = []
-            
-            for slide in prs.slides: 
-                for shape in slide.shapes:
-                    if shape.has_text_frame:
-                        text = shape.text.strip()
-                        if text: 
-                            slide_texts.append(text)
+            with TRANSCRIPTION_SECONDS.time(file_type="pptx"):
+                slide_texts = []
+                for texts in self._slide_texts(Presentation(self.file_path)):
+                    slide_texts.extend(texts)
             
-            return self._clean_text(slide_texts)  # Return as cleaned list
+            with stage("normalize"):
+                return self._clean_text(slide_texts)  # Return as cleaned list
         except Exception as e:
             raise Exception(f"Error processing PowerPoint: {str(e)}")
         finally:
             # Clean up temp file
-            if os.path.exists(self.file_path):
-                os.remove(self.file_path)
+            self._remove_file()
 
     def pdf_transcribe(self):
         """Extract text from PDF files"""
         try:
-            with open(self.file_path, "rb") as pdf_file:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
+            with open(self.file_path, "rb") as pdf_file, TRANSCRIPTION_SECONDS.time(file_type="pdf"):
                 text_pages = []
                 
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    page_text = page.extract_text()
+                for page_text in self._pdf_pages(pdf_file):
                     if page_text.strip():  # Only add non-empty pages
                         text_pages.append(page_text)
                 
                 full_text = "\n".join(text_pages)
+            with stage("normalize"):
                 return self._clean_text(full_text)
         except Exception as e:
             raise Exception(f"Error processing PDF: {str(e)}")
         finally:
             # Clean up temp file
-            if os.path.exists(self.file_path):
-                os.remove(self.file_path)
+            self._remove_file()
+
+    @staticmethod
+    def _pdf_page_content(page):
+        """Content stream, fonts and drawn images of a PDF page, which determine its (OCR) text"""
+        contents = page.get_contents()
+        data = contents.get_data() if contents is not None else b""
+        # Resolve font names rather than object references, which shift
+        # whenever pages are added before this one
+        fonts = []
+        resources = page.get("/Resources")
+        font_dict = resources.get_object().get("/Font") if resources is not None else None
+        if font_dict is not None:
+            for name, font in sorted(font_dict.get_object().items()):
+                font = font.get_object()
+                fonts.append(f"{name}={font.get('/BaseFont')}/{font.get('/Encoding')}")
+        # Scanned pages share the same "/Im0 Do" content stream, so the
+        # images themselves are part of the key
+        xobjects = Transcriber._xobject_digests(resources)
+        return data + "|".join(fonts).encode("utf-8") + "|".join(xobjects).encode("utf-8")
+
+    @staticmethod
+    def _xobject_digests(resources, seen=None):
+        """name=subtype:sha256 of every image and form XObject in a resource dict, recursing into forms"""
+        seen = set() if seen is None else seen
+        xobject_dict = resources.get_object().get("/XObject") if resources is not None else None
+        if xobject_dict is None:
+            return []
+        digests = []
+        for name, xobject in sorted(xobject_dict.get_object().items()):
+            xobject = xobject.get_object()
+            # The raw (still encoded) stream, so images are not decompressed just for the key
+            raw = getattr(xobject, "_data", b"")
+            digests.append(f"{name}={xobject.get('/Subtype')}:{hashlib.sha256(raw).hexdigest()}")
+            if xobject.get("/Subtype") == "/Form" and id(xobject) not in seen:
+                seen.add(id(xobject))
+                digests.extend(f"{name}/{digest}"
+                               for digest in Transcriber._xobject_digests(xobject.get("/Resources"), seen))
+        return digests
+
+EXTENSION_MEDIA_TYPES = {
+    "pdf": ["application", "pdf"],
+    "pptx": ["application", "vnd.openxmlformats-officedocument.presentationml.presentation"],
+    "png": ["image", "png"],
+    "jpg": ["image", "jpeg"],
+    "jpeg": ["image", "jpeg"],
+}
+
+def media_type_for_path(file_path):
+    """
+    Return the split media type runner() expects for a file, based on its extension
+    """
+    extension = file_path.split(".")[-1].lower()
+    if extension not in EXTENSION_MEDIA_TYPES:
+        raise Exception(f"Unsupported file extension: {extension}")
+    return EXTENSION_MEDIA_TYPES[extension]
 
 def runner(media, media_type):
     """
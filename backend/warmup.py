@@ -0,0 +1,133 @@
+"""
+Background warm-up and readiness
+
+The API accepts traffic as soon as main is imported: heavy libraries are
+imported on first use (benchmarks/import_time.py checks this) and models are
+loaded by models.manager when a request first needs them. With
+WARMUP_MODELS set, a background thread loads those models at startup and runs
+one dummy inference on each, so the first real request does not pay for
+importing torch, loading weights and allocating buffers. /readyz answers 503
+until the warm-up is done, while /healthz only reports that the process is
+alive.
+
+Environment variables:
+    WARMUP_MODELS: Comma-separated models to warm up (names as registered in
+        models.py), or "all". Empty (the default) skips the warm-up: the API
+        is ready at once and models load on first use.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+import models
+
+SAMPLE_TEXT = (
+    "Photosynthesis is the process by which plants convert sunlight, water and carbon dioxide into "
+    "glucose and oxygen. It takes place in the chloroplasts of plant cells, which contain chlorophyll."
+)
+
+
+# Dummy inferences bypass the segment cache, so the models really run
+def _run_question_generator(qg: Any) -> None:
+    qg._generate_question(f"{qg.ANSWER_TOKEN} the chloroplasts {qg.CONTEXT_TOKEN} {SAMPLE_TEXT}", "fast")
+
+
+def _run_qa_evaluator(evaluator: Any) -> None:
+    evaluator.get_raw_scores(evaluator.encode_qa_pairs(["Where does photosynthesis take place?"], ["In the chloroplasts"]))
+
+
+def _run_pipeline(nlp: Any) -> None:
+    nlp(SAMPLE_TEXT)
+
+
+def _run_glove(glove: Any) -> None:
+    glove.most_similar("plant", topn=3)
+
+
+DUMMY_INFERENCE = {
+    "question_generator": _run_question_generator,
+    "question_generator_small": _run_question_generator,
+    "qa_evaluator": _run_qa_evaluator,
+    "spacy_sm": _run_pipeline,
+    "ner_tagger": _run_pipeline,
+    "glove": _run_glove,
+}
+
+
+class WarmUp:
+    def __init__(self, names: List[str]) -> None:
+        """
+        Args:
+            names: Models to load and run once, in order. The summarizer's
+                libraries are imported first whenever the list is non-empty.
+        """
+        self.names = names
+        self.state = "pending" if names else "ready"
+        self.error = None
+        self.seconds = {}  # step -> seconds spent loading and running it
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start warming up in a daemon thread (once)"""
+        with self._lock:
+            if self.state != "pending":
+                return
+            self.state = "running"
+        threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready(),
+            "state": self.state,
+            "models": self.names,
+            "seconds": dict(self.seconds),
+            "loaded_models": models.loaded_models(),
+            "error": self.error,
+        }
+
+    def _run(self) -> None:
+        try:
+            self._step("summarize", self._run_summarizer)
+            for name in self.names:
+                self._step(name, lambda: self._run_model(name))
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+            print(f"Warning: Warm-up failed: {e}")
+
+    def _step(self, name: str, function) -> None:
+        start = time.perf_counter()
+        function()
+        self.seconds[name] = round(time.perf_counter() - start, 3)
+        print(f"Warmed up {name} in {self.seconds[name]:.1f}s")
+
+    @staticmethod
+    def _run_summarizer() -> None:
+        from summarize import get_keywords
+        get_keywords(SAMPLE_TEXT)
+
+    @staticmethod
+    def _run_model(name: str) -> None:
+        if name not in models.manager.status()["registered"]:
+            raise Exception(f"Unknown model {name}")
+        with models.manager.use(name) as model:
+            inference = DUMMY_INFERENCE.get(name)
+            if inference is not None:
+                inference(model)
+
+
+def warmup_from_env() -> WarmUp:
+    spec = os.environ.get("WARMUP_MODELS", "").strip()
+    if spec == "all":
+        names = models.manager.status()["registered"]
+    else:
+        names = [name.strip() for name in spec.split(",") if name.strip()]
+    return WarmUp(names)
+
+
+warmup = warmup_from_env()